@@ -0,0 +1,74 @@
+"""This script measures the cold-start time of each pipeline.py command: the wall time
+of a fresh `python src/pipeline.py <command> --help`, which imports the command's
+module and parses its arguments but does no work. It also lists which heavy
+libraries each command loads on import.
+
+Usage: bench_cold_start.py [--repeat=<repeat>]
+
+Options:
+--repeat=<repeat>    Number of timed starts per command [default: 5]
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+from docopt import docopt
+
+SRC_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_PATH)
+from pipeline import COMMANDS
+
+HEAVY_MODULES = ["numpy", "pandas", "pyarrow", "scipy", "sklearn", "joblib", "matplotlib", "altair", "seaborn"]
+
+# imports a command's module and prints which heavy modules it loaded
+PROBE = """
+import importlib, json, sys
+sys.path.insert(0, {src!r})
+try:
+    importlib.import_module({module!r})
+    error = None
+except ImportError as e:
+    error = str(e)
+print(json.dumps({{"loaded": [m for m in {heavy!r} if m in sys.modules], "error": error}}))
+"""
+
+
+def start_times(command, repeat):
+    """
+    Returns the wall times in seconds of `repeat` fresh starts of the command.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, os.path.join(SRC_PATH, "pipeline.py"), command, "--help"],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def loaded_modules(module):
+    probe = PROBE.format(src=SRC_PATH, module=module, heavy=HEAVY_MODULES)
+    output = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True).stdout
+    return json.loads(output)
+
+
+def main(repeat):
+    baseline = np.median(start_times("--help", repeat))
+    print(f"{'command':<14}{'best s':>8}{'median s':>10}  loads")
+    print(f"{'(none)':<14}{'':>8}{baseline:>10.3f}  interpreter and docopt only")
+    for command, module in COMMANDS.items():
+        timings = start_times(command, repeat)
+        probe = loaded_modules(module)
+        loads = ", ".join(probe["loaded"]) or "-"
+        if probe["error"]:
+            loads += f"  (import failed: {probe['error']})"
+        print(f"{command:<14}{min(timings):>8.3f}{np.median(timings):>10.3f}  {loads}")
+
+
+# script entry point
+if __name__ == '__main__':
+    opt = docopt(__doc__)
+    main(int(opt["--repeat"]))
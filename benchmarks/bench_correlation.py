@@ -0,0 +1,75 @@
+"""This script benchmarks the streamed correlation matrix of correlation.py against
+loading the whole training set and calling DataFrame.corr(), as eda.py used to. The
+training set is tiled into a directory of Parquet parts with the requested number
+of rows. It reports wall time and peak RSS for a full pass, for an update after one
+more part is appended, and the largest difference from pandas.
+
+Usage: bench_correlation.py <data_file_path> <work_dir> [--n_rows=<n_rows>] [--n_parts=<n_parts>] [--n_jobs=<n_jobs>]
+
+Arguments:
+<data_file_path>        File path of a wrangled data set (e.g. data/data_train.parquet)
+<work_dir>              Directory to write the tiled data set and state file to
+
+Options:
+--n_rows=<n_rows>       Number of rows in the tiled data set [default: 2000000]
+--n_parts=<n_parts>     Number of Parquet part files, one of which is appended last [default: 10]
+--n_jobs=<n_jobs>       Number of part files read at the same time [default: 2]
+"""
+import os
+import shutil
+import sys
+import time
+
+import numpy as np
+from docopt import docopt
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from correlation import dataset_correlation
+from data_store import read_dataset
+from instrument import read_peak_rss, reset_peak_rss
+
+
+def measure(fn):
+    """
+    Returns fn()'s result, wall time in seconds and peak RSS in MB above the RSS at the start.
+    """
+    reset_peak_rss()
+    base = read_peak_rss()
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start, (read_peak_rss() - base) / 2**20
+
+
+def main(data_file_path, work_dir, n_rows, n_parts, n_jobs):
+    data = read_dataset(data_file_path)
+    data = data.iloc[np.arange(n_rows) % len(data)].reset_index(drop=True)
+    dataset_path = os.path.join(work_dir, "data_train.parquet")
+    state_file_path = os.path.join(work_dir, ".correlation_state.json")
+    shutil.rmtree(dataset_path, ignore_errors=True)
+    if os.path.exists(state_file_path):
+        os.remove(state_file_path)
+    os.makedirs(dataset_path)
+    bounds = np.linspace(0, n_rows, n_parts + 1).astype(int)
+    for i in range(n_parts):
+        data.iloc[bounds[i]:bounds[i + 1]].to_parquet(os.path.join(dataset_path, f"part-{i:05d}.parquet"))
+    # the last part is held back, to be appended after the first pass
+    last_part = os.path.join(dataset_path, f"part-{n_parts - 1:05d}.parquet")
+    os.replace(last_part, os.path.join(work_dir, "last_part.parquet"))
+    del data
+
+    print(f"rows: {n_rows} in {n_parts} parts, n_jobs={n_jobs}")
+    print(f"{'method':<34}{'wall (s)':>9}{'peak RSS (MB)':>15}")
+    _, wall, rss = measure(lambda: dataset_correlation(dataset_path, state_file_path, n_jobs=n_jobs))
+    print(f"{'streamed, first pass':<34}{wall:>9.2f}{rss:>15.0f}")
+    os.replace(os.path.join(work_dir, "last_part.parquet"), last_part)
+    streamed, wall, rss = measure(lambda: dataset_correlation(dataset_path, state_file_path, n_jobs=n_jobs))
+    print(f"{'streamed, after appending a part':<34}{wall:>9.2f}{rss:>15.0f}")
+    full, wall, rss = measure(lambda: read_dataset(dataset_path).corr(numeric_only=True))
+    print(f"{'read whole, DataFrame.corr()':<34}{wall:>9.2f}{rss:>15.0f}")
+    print(f"largest difference from pandas: {np.nanmax(np.abs(streamed - full).to_numpy()):.2e}")
+
+
+# script entry point
+if __name__ == '__main__':
+    opt = docopt(__doc__)
+    main(opt["<data_file_path>"], opt["<work_dir>"], int(opt["--n_rows"]), int(opt["--n_parts"]), int(opt["--n_jobs"]))
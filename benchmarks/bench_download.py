@@ -0,0 +1,155 @@
+"""This script benchmarks and checks the raw-data fetcher (src/fetcher.py) against a
+local stand-in for the data host. The stand-in serves the files of a directory with
+ETag/Last-Modified validators and Range support, throttled to a per-connection
+bandwidth, and can fail requests on purpose. It compares the original sequential
+pd.read_csv/to_csv download with the concurrent fetcher, then checks that a
+second run skips every file, that a dropped connection is resumed, and that
+server errors are retried.
+
+Usage: bench_download.py <raw_data_path> [--bandwidth=<bandwidth>] [--n_jobs=<n_jobs>]
+
+Arguments:
+<raw_data_path>          Directory of raw .csv files to serve (e.g. data/raw_files)
+
+Options:
+--bandwidth=<bandwidth>  Bandwidth per connection in MB/s [default: 20]
+--n_jobs=<n_jobs>        Concurrent downloads for the fetcher [default: 5]
+"""
+import email.utils
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+from docopt import docopt
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from fetcher import Fetcher, file_sha256
+
+
+class StandInHandler(SimpleHTTPRequestHandler):
+    """
+    Serves files with validators and byte ranges. Class attributes control throttling
+    and fault injection: fail_next maps a file name to a list of faults to apply to
+    its next requests, either an HTTP status or "drop" (close the connection halfway).
+    """
+    bandwidth = 20e6
+    fail_next = {}
+    requests = []
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        path = self.translate_path(self.path)
+        name = os.path.basename(path)
+        if not os.path.isfile(path):
+            return self.send_error(404)
+        StandInHandler.requests.append((name, self.headers.get("Range")))
+
+        faults = StandInHandler.fail_next.get(name, [])
+        fault = faults.pop(0) if faults else None
+        if isinstance(fault, int):
+            return self.send_error(fault)
+
+        stat = os.stat(path)
+        etag = f'"{stat.st_size:x}-{int(stat.st_mtime):x}"'
+        last_modified = email.utils.formatdate(stat.st_mtime, usegmt=True)
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        start, status = 0, 200
+        range_header = self.headers.get("Range")
+        if range_header and self.headers.get("If-Range") in (etag, last_modified, None):
+            start, status = int(range_header.split("=")[1].rstrip("-")), 206
+            if start >= stat.st_size:
+                return self.send_error(416)
+
+        self.send_response(status)
+        self.send_header("Content-Length", str(stat.st_size - start))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", last_modified)
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{stat.st_size - 1}/{stat.st_size}")
+        self.end_headers()
+
+        with open(path, "rb") as f:
+            f.seek(start)
+            sent, block_size = 0, 64 * 1024
+            for block in iter(lambda: f.read(block_size), b""):
+                if fault == "drop" and sent >= (stat.st_size - start) // 2:
+                    self.close_connection = True
+                    return
+                self.wfile.write(block)
+                sent += len(block)
+                time.sleep(len(block) / self.bandwidth)
+
+
+def start_server(directory, bandwidth):
+    StandInHandler.bandwidth = bandwidth
+
+    def handler(*args, **kwargs):
+        return StandInHandler(*args, directory=directory, **kwargs)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def legacy_download(url, names, file_path):
+    """
+    The original download path: each file parsed with pd.read_csv in turn, then written back out.
+    """
+    for name in names:
+        pd.read_csv(f"{url}/{name}", index_col=0).to_csv(os.path.join(file_path, name))
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def main(raw_data_path, bandwidth, n_jobs):
+    names = sorted(name for name in os.listdir(raw_data_path) if name.endswith(".csv"))
+    server, url = start_server(raw_data_path, bandwidth * 1e6)
+    print(f"serving {len(names)} files ({sum(os.path.getsize(os.path.join(raw_data_path, n)) for n in names) / 1e6:.1f} MB) "
+          f"at {bandwidth} MB/s per connection\n")
+
+    with tempfile.TemporaryDirectory() as legacy_path, tempfile.TemporaryDirectory() as file_path:
+        legacy, _ = timed(lambda: legacy_download(url, names, legacy_path))
+        print(f"sequential read_csv/to_csv:   {legacy:.2f} s")
+
+        fetcher = Fetcher(url, file_path, backoff=0.1)
+        fetched, statuses = timed(lambda: fetcher.fetch_all(names, n_jobs=n_jobs))
+        print(f"fetcher, {n_jobs} threads:           {fetched:.2f} s  {sorted(set(statuses.values()))}")
+        for name in names:
+            assert file_sha256(os.path.join(file_path, name)) == file_sha256(os.path.join(raw_data_path, name))
+
+        skipped, statuses = timed(lambda: Fetcher(url, file_path).fetch_all(names, n_jobs=n_jobs))
+        assert set(statuses.values()) == {"unchanged"}, statuses
+        print(f"fetcher, second run:          {skipped:.2f} s  {sorted(set(statuses.values()))}")
+
+        # drop the connection halfway through the largest file, then fail once with a 503
+        largest = max(names, key=lambda n: os.path.getsize(os.path.join(raw_data_path, n)))
+        os.remove(os.path.join(file_path, largest))
+        StandInHandler.fail_next = {largest: ["drop", 503]}
+        StandInHandler.requests = []
+        resumed, status = timed(lambda: Fetcher(url, file_path, backoff=0.1).fetch(largest))
+        assert status == "resumed", status
+        assert file_sha256(os.path.join(file_path, largest)) == file_sha256(os.path.join(raw_data_path, largest))
+        print(f"fetcher, dropped + 503:       {resumed:.2f} s  {largest} requests {StandInHandler.requests}")
+
+    server.shutdown()
+    server.server_close()
+
+
+# script entry point
+if __name__ == '__main__':
+    opt = docopt(__doc__)
+    main(opt["<raw_data_path>"], float(opt["--bandwidth"]), int(opt["--n_jobs"]))
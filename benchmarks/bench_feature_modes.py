@@ -0,0 +1,68 @@
+"""This script compares the feature matrix modes of preprocessing.py (float64,
+float32 and sparse, with and without standardized inputs) on a wrangled training
+set. For each mode it reports the size of the transformed matrix, the time and
+peak RSS of fitting the preprocessing, the time and peak RSS of the cross-validated
+RFE path search that grid_search.py runs, and the best cross-validated r2.
+
+Usage: bench_feature_modes.py <training_data_file_path> [--n_features=<n_features>] [--modes=<modes>]
+
+Arguments:
+<training_data_file_path>   File path of a wrangled training set (e.g. data/data_train.parquet)
+
+Options:
+--n_features=<n_features>   Numbers of features to select, as for grid_search.py [default: 10,12,15,18,20,22,25,28,30]
+--modes=<modes>             Comma separated modes: dtype, with "+sparse" and/or "+standardize"
+                            [default: float64,float64+standardize,float32,float64+sparse,float32+sparse]
+"""
+import os
+import sys
+import time
+
+from docopt import docopt
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from finishtime import load_model_data
+from grid_search import parse_n_features
+from instrument import read_peak_rss, reset_peak_rss
+from preprocessing import fit_preprocessor
+from rfe_path import rfe_path_search
+
+
+def matrix_bytes(X):
+    if hasattr(X, "indptr"):
+        return X.data.nbytes + X.indices.nbytes + X.indptr.nbytes
+    return X.nbytes
+
+
+def measure(fn):
+    """
+    Returns fn()'s result, wall time in seconds and peak RSS in MB above the RSS at the start.
+    """
+    reset_peak_rss()
+    base = read_peak_rss()
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start, (read_peak_rss() - base) / 2**20
+
+
+def main(training_data_file_path, n_features, modes):
+    X_train, y_train = load_model_data(training_data_file_path)
+    print(f"training rows: {len(y_train)}")
+    print(f"{'mode':<24}{'matrix MB':>10}{'fit s':>8}{'fit MB':>8}{'search s':>10}{'search MB':>11}{'best r2':>10}")
+    for mode in modes:
+        dtype, *flags = mode.split("+")
+        _, fit_time, fit_rss = measure(lambda: fit_preprocessor(X_train, dtype=dtype, sparse="sparse" in flags,
+                                                                 standardize="standardize" in flags))
+        # fitted again so the matrix is not counted in the search's peak
+        _, X, _ = fit_preprocessor(X_train, dtype=dtype, sparse="sparse" in flags, standardize="standardize" in flags)
+        grid = parse_n_features(n_features, X.shape[1])
+        results, search_time, search_rss = measure(lambda: rfe_path_search(X, y_train, grid, cv=5))
+        print(f"{mode:<24}{matrix_bytes(X) / 2**20:>10.0f}{fit_time:>8.2f}{fit_rss:>8.0f}{search_time:>10.2f}"
+              f"{search_rss:>11.0f}{results['mean_test_score'].max():>10.4f}")
+        del X
+
+
+# script entry point
+if __name__ == '__main__':
+    opt = docopt(__doc__)
+    main(opt["<training_data_file_path>"], opt["--n_features"], opt["--modes"].split(","))
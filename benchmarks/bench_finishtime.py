@@ -0,0 +1,69 @@
+"""This script benchmarks the vectorized finishtime parser against the original
+per-row parsing path used by grid_search.py and linear_model.py. The finishtime
+column of the input file is tiled up to the requested number of rows.
+
+Usage: bench_finishtime.py <data_file_path> [--n_rows=<n_rows>] [--repeat=<repeat>]
+
+Arguments:
+<data_file_path>        File path of a wrangled data set with a finishtime column (e.g. data/data_test.csv)
+
+Options:
+--n_rows=<n_rows>       Number of rows to parse [default: 1000000]
+--repeat=<repeat>       Number of timed repetitions per parser [default: 3]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from docopt import docopt
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from finishtime import parse_finishtime, time_parser
+
+
+def legacy_parse(finishtime):
+    """
+    The original per-row parsing path: fill with the "0.00.00" sentinel, a separate
+    str.contains pass, then time_parser mapped over every value.
+    """
+    y = finishtime.fillna("0.00.00")
+    y[~y.str.contains(r"\d\.\d{2}\.\d{2}")] = "0.00.00"
+    y = np.array(list(map(lambda x: time_parser(x), y)))
+    return np.where(y == 0.0, np.nan, y)
+
+
+def best_time(fn, finishtime, repeat):
+    """
+    Returns the best wall time in seconds over `repeat` runs of fn(finishtime).
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(finishtime.copy())
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main(data_file_path, n_rows, repeat):
+    finishtime = pd.read_csv(data_file_path, usecols=["finishtime"])["finishtime"]
+    reps = int(np.ceil(n_rows / len(finishtime)))
+    finishtime = pd.Series(np.tile(finishtime.to_numpy(dtype=object), reps)[:n_rows], name="finishtime")
+
+    # both parsers must agree before timing them
+    np.testing.assert_allclose(legacy_parse(finishtime.copy()), parse_finishtime(finishtime).to_numpy())
+
+    legacy = best_time(legacy_parse, finishtime, repeat)
+    vectorized = best_time(parse_finishtime, finishtime, repeat)
+
+    print(f"rows parsed:           {n_rows}")
+    print(f"per-row time_parser:   {legacy:.3f} s")
+    print(f"parse_finishtime:      {vectorized:.3f} s")
+    print(f"speedup:               {legacy / vectorized:.1f}x")
+
+
+# script entry point
+if __name__ == '__main__':
+    opt = docopt(__doc__)
+    main(opt["<data_file_path>"], int(opt["--n_rows"]), int(opt["--repeat"]))
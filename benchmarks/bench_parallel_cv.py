@@ -0,0 +1,43 @@
+"""This script benchmarks the cross-validated RFE path search used by grid_search.py
+at several worker counts, and reports wall time and peak resident set size for each.
+The design matrix is random data with the shape of the preprocessed training set.
+
+Usage: bench_parallel_cv.py [--n_rows=<n_rows>] [--n_columns=<n_columns>] [--n_jobs=<n_jobs>] [--engine=<engine>]
+
+Options:
+--n_rows=<n_rows>           Number of rows in the design matrix [default: 50000]
+--n_columns=<n_columns>     Number of columns in the design matrix [default: 268]
+--n_jobs=<n_jobs>           Comma separated worker counts to compare [default: 1,2,5]
+--engine=<engine>           Feature elimination engine, "sklearn" [default: sklearn]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+from docopt import docopt
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from rfe_path import rfe_path_search
+
+
+def main(n_rows, n_columns, n_jobs_list, engine):
+    rng = np.random.RandomState(1)
+    X = rng.randn(n_rows, n_columns)
+    y = X[:, :30] @ rng.randn(30) + rng.randn(n_rows)
+    grid = list(range(1, n_columns + 1))
+
+    print(f"design matrix: {n_rows} x {n_columns} ({X.nbytes / 2**20:.0f} MB), engine={engine}")
+    print(f"{'n_jobs':>6}  {'wall (s)':>9}  {'peak RSS per worker (MB)':>24}")
+    for n_jobs in n_jobs_list:
+        start = time.perf_counter()
+        results = rfe_path_search(X, y, grid, cv=5, engine=engine, n_jobs=n_jobs)
+        wall = time.perf_counter() - start
+        print(f"{n_jobs:>6}  {wall:>9.2f}  {results['peak_rss'] / 2**20:>24.0f}")
+
+
+# script entry point
+if __name__ == '__main__':
+    opt = docopt(__doc__)
+    main(int(opt["--n_rows"]), int(opt["--n_columns"]),
+         [int(n) for n in opt["--n_jobs"].split(",")], opt["--engine"])
@@ -0,0 +1,92 @@
+"""This script benchmarks single-race prediction latency: the full design matrix
+(model_artifact.predict), the compiled predictor called in-process, and the
+compiled predictor behind serve.py's local HTTP endpoint. Races are sampled from
+the runners in the data file.
+
+Usage: bench_predictor.py <model_file_path> <data_file_path> [--race_size=<race_size>] [--n_races=<n_races>] [--skip_http]
+
+Arguments:
+<model_file_path>        File path of a saved model artifact (from linear_model.py --model_out)
+<data_file_path>         File path of a wrangled data set (e.g. data/data_test.parquet)
+
+Options:
+--race_size=<race_size>  Runners per race [default: 14]
+--n_races=<n_races>      Number of timed races per method [default: 2000]
+--skip_http              Do not benchmark the HTTP endpoint
+"""
+import http.client
+import json
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+from docopt import docopt
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from data_store import read_dataset
+from model_artifact import load_artifact, predict
+from predictor import CompiledPredictor
+from serve import make_server
+
+
+def latencies(fn, races):
+    """
+    Returns the wall time in microseconds of fn(race) for each race, after a warm-up call.
+    """
+    fn(races[0])
+    timings = []
+    for race in races:
+        start = time.perf_counter()
+        fn(race)
+        timings.append(time.perf_counter() - start)
+    return np.array(timings) * 1e6
+
+
+def report(name, timings):
+    p50, p99 = np.percentile(timings, [50, 99])
+    print(f"{name:<28} p50 {p50:8.1f} us   p99 {p99:8.1f} us")
+
+
+def main(model_file_path, data_file_path, race_size, n_races, skip_http):
+    artifact = load_artifact(model_file_path)
+    predictor = CompiledPredictor(artifact)
+    columns = predictor.numeric_features + predictor.categorical_features
+    runners = read_dataset(data_file_path, columns)
+
+    rng = np.random.default_rng(0)
+    frames = [runners.iloc[rng.choice(len(runners), race_size, replace=False)] for _ in range(n_races)]
+    records = [json.loads(frame.astype(object).where(frame.notnull(), None).to_json(orient="records"))
+               for frame in frames]
+
+    # the compiled predictor must agree with the full design matrix before timing it
+    for frame, race in zip(frames[:100], records[:100]):
+        np.testing.assert_allclose(predictor.predict_records(race), predict(artifact, frame), rtol=1e-9)
+
+    print(f"races of {race_size} runners, {n_races} per method")
+    report("full design matrix", latencies(lambda frame: predict(artifact, frame), frames))
+    report("compiled, DataFrame", latencies(predictor.predict, frames))
+    report("compiled, records", latencies(predictor.predict_records, records))
+
+    if not skip_http:
+        server = make_server(predictor, port=0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        connection = http.client.HTTPConnection("127.0.0.1", server.server_port)
+
+        def post(race):
+            connection.request("POST", "/predict", json.dumps({"runners": race}),
+                               {"Content-Type": "application/json"})
+            return json.loads(connection.getresponse().read())
+
+        report("compiled, local HTTP", latencies(post, records))
+        connection.close()
+        server.shutdown()
+        server.server_close()
+
+
+# script entry point
+if __name__ == '__main__':
+    opt = docopt(__doc__)
+    main(opt["<model_file_path>"], opt["<data_file_path>"], int(opt["--race_size"]), int(opt["--n_races"]),
+         opt["--skip_http"])
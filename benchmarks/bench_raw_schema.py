@@ -0,0 +1,55 @@
+"""This script compares loading the raw tables with an untyped pd.read_csv (as the
+pipeline used to) against the typed, column-pruned readers in raw_schema.py:
+load time and in-memory size per table.
+
+Usage: bench_raw_schema.py <raw_data_path> [--repeat=<repeat>]
+
+Arguments:
+<raw_data_path>      Directory of the raw .csv files (e.g. data/raw_files)
+
+Options:
+--repeat=<repeat>    Number of timed loads per reader [default: 3]
+"""
+import os
+import sys
+import time
+
+import pandas as pd
+from docopt import docopt
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from raw_schema import RAW_TABLES, read_raw
+
+
+def best_load(fn, repeat):
+    """
+    Returns the best wall time in seconds over `repeat` calls of fn, and its last result.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        data = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), data
+
+
+def main(raw_data_path, repeat):
+    print(f"{'table':<12}{'untyped s':>11}{'typed s':>10}{'untyped MB':>12}{'typed MB':>10}")
+    totals = [0.0, 0.0, 0.0, 0.0]
+    for name in RAW_TABLES:
+        if not os.path.exists(f"{raw_data_path}/{name}.csv"):
+            print(f"{name:<12} missing")
+            continue
+        untyped_time, untyped = best_load(lambda: pd.read_csv(f"{raw_data_path}/{name}.csv", index_col=0), repeat)
+        typed_time, typed = best_load(lambda: read_raw(raw_data_path, name), repeat)
+        row = [untyped_time, typed_time,
+               untyped.memory_usage(deep=True).sum() / 1e6, typed.memory_usage(deep=True).sum() / 1e6]
+        totals = [t + r for t, r in zip(totals, row)]
+        print(f"{name:<12}{row[0]:>11.3f}{row[1]:>10.3f}{row[2]:>12.1f}{row[3]:>10.1f}")
+    print(f"{'total':<12}{totals[0]:>11.3f}{totals[1]:>10.3f}{totals[2]:>12.1f}{totals[3]:>10.1f}")
+
+
+# script entry point
+if __name__ == '__main__':
+    opt = docopt(__doc__)
+    main(opt["<raw_data_path>"], int(opt["--repeat"]))
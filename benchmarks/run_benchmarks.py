@@ -0,0 +1,205 @@
+"""This script runs the pipeline benchmark suite on synthetic data (see
+synthetic_data.py) at one or more multiples of the bundled data size, and writes
+the timings as JSON so runs can be compared. For each scale it times:
+
+    generate          writing the synthetic raw tables
+    import_files      loading the raw tables (wrangle_data.import_files)
+    merge_results     merging them (wrangle_data.merge_results)
+    split_and_write   splitting and writing the train/test sets
+    parse_target      parsing finish times of the training set (finishtime.split_target)
+    preprocessing     fitting the preprocessing pipeline (preprocessing.fit_preprocessor)
+    grid_search       the cross-validated RFE grid search over grid_search.py's default grid
+    score             scoring the test set with the compiled predictor from a saved model
+    eda               rendering the EDA charts (src/eda.py, in a subprocess)
+
+Usage: run_benchmarks.py <raw_data_path> <results_file_path> [--scales=<scales>] [--stages=<stages>] [--work_dir=<work_dir>] [--n_jobs=<n_jobs>] [--compare=<baseline_file_path>]
+
+Arguments:
+<raw_data_path>          Directory of the bundled raw data (e.g. data/raw_files)
+<results_file_path>      File path to save the benchmark results (.json)
+
+Options:
+--scales=<scales>        Comma separated data sizes relative to the bundled data [default: 1,10]
+--stages=<stages>        Comma separated stages to run (see above), or "all" [default: all]
+--work_dir=<work_dir>    Directory for synthetic and wrangled data, reused across runs [default: benchmarks/work]
+--n_jobs=<n_jobs>        Worker processes for the grid search [default: 1]
+--compare=<baseline_file_path>  Results of an earlier run (.json) to print wall time ratios against
+"""
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import sklearn
+from docopt import docopt
+from sklearn.linear_model import LinearRegression
+
+SRC_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_PATH)
+from data_store import MODEL_COLUMNS, read_dataset
+from finishtime import split_target
+from grid_search import parse_n_features
+from model_artifact import export_artifact
+from predictor import CompiledPredictor
+from preprocessing import fit_preprocessor
+from rfe_path import elimination_ranking, rfe_path_search
+from synthetic_data import generate
+from wrangle_data import import_files, merge_results, split_and_write_data
+
+STAGES = ["generate", "import_files", "merge_results", "split_and_write", "parse_target",
+          "preprocessing", "grid_search", "score", "eda"]
+# grid_search.py's default grid
+N_FEATURES = "10,12,15,18,20,22,25,28,30"
+
+
+def max_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class StageTimer:
+    """
+    Times stages and collects one record per stage: wall and CPU time, rows processed,
+    and the process's peak RSS so far.
+    """
+
+    def __init__(self, scale, stages):
+        self.scale = scale
+        self.stages = stages
+        self.records = []
+
+    def run(self, stage, fn, rows=None, force=False):
+        """
+        Runs fn() as the named stage, if selected or forced, and returns its result.
+        rows is a function of the result giving the number of rows processed.
+        """
+        if stage not in self.stages and not force:
+            return None
+        wall, cpu = time.perf_counter(), time.process_time()
+        result = fn()
+        record = {"scale": self.scale, "stage": stage,
+                  "wall_s": round(time.perf_counter() - wall, 4), "cpu_s": round(time.process_time() - cpu, 4),
+                  "rows": rows(result) if rows is not None else None, "max_rss_mb": round(max_rss_mb(), 1)}
+        self.records.append(record)
+        print(f"  {stage:<16}{record['wall_s']:>9.3f} s  {record['rows'] or '':>9} rows  "
+              f"{record['max_rss_mb']:>8.0f} MB max RSS", flush=True)
+        return result
+
+
+def run_eda(data_path, img_path):
+    """
+    Renders the EDA charts in a subprocess; returns its exit status and last line of output.
+    """
+    os.makedirs(img_path, exist_ok=True)
+    process = subprocess.run([sys.executable, os.path.join(SRC_PATH, "eda.py"), data_path, img_path],
+                             capture_output=True, text=True)
+    output = (process.stderr or process.stdout).strip().splitlines()
+    return process.returncode, output[-1] if output else ""
+
+
+def run_scale(raw_data_path, work_dir, scale, stages, n_jobs):
+    """
+    Runs the selected stages on data of the given scale, regenerating or re-wrangling
+    the data in work_dir only when the stages producing it are selected or it is missing.
+    Stages that have to run for a selected stage are timed as well.
+    """
+    raw_path = os.path.join(work_dir, f"scale_{scale:g}", "raw")
+    data_path = os.path.join(work_dir, f"scale_{scale:g}", "data")
+    os.makedirs(data_path, exist_ok=True)
+    timer = StageTimer(scale, stages)
+
+    if "generate" in stages or not os.path.exists(f"{raw_path}/results.csv"):
+        timer.run("generate", lambda: generate(raw_data_path, raw_path, scale),
+                  rows=lambda sizes: sum(sizes.values()), force=True)
+
+    wrangle = {"import_files", "merge_results", "split_and_write"}
+    if stages & wrangle or not os.path.exists(f"{data_path}/data_train.parquet"):
+        tables = timer.run("import_files", lambda: import_files(raw_path), rows=lambda t: sum(len(d) for d in t),
+                           force=True)
+        merged = timer.run("merge_results", lambda: merge_results(*tables), rows=len, force=True)
+        del tables
+        timer.run("split_and_write", lambda: split_and_write_data(merged, data_path),
+                  rows=lambda _: len(merged), force=True)
+        del merged
+
+    train_path, test_path = f"{data_path}/data_train.parquet", f"{data_path}/data_test.parquet"
+    training_data = read_dataset(train_path, MODEL_COLUMNS)
+    X_train, y_train = timer.run("parse_target", lambda: split_target(training_data), rows=lambda Xy: len(Xy[1]),
+                                 force=True)
+
+    if stages & {"preprocessing", "grid_search", "score"}:
+        full_pipeline, X, _ = timer.run("preprocessing", lambda: fit_preprocessor(X_train), rows=lambda _: len(y_train),
+                                        force=True)
+        n_features = parse_n_features(N_FEATURES, X.shape[1])
+        cv_results = timer.run("grid_search", lambda: rfe_path_search(X, y_train, n_features, cv=5, n_jobs=n_jobs),
+                               rows=lambda _: len(y_train))
+
+        if "score" in stages:
+            best = n_features[int(np.argmax(cv_results["mean_test_score"]))] if cv_results else n_features[-1]
+            support = elimination_ranking(X, y_train) <= best
+            lr = LinearRegression().fit(X[:, support], y_train)
+            model_path = os.path.join(data_path, "model.json")
+            export_artifact(full_pipeline, support, lr, model_path)
+
+            predictor = CompiledPredictor.from_file(model_path)
+            test_data = read_dataset(test_path, MODEL_COLUMNS)
+            timer.run("score", lambda: predictor.predict(test_data), rows=len)
+
+    if "eda" in stages:
+        status, message = timer.run("eda", lambda: run_eda(data_path, os.path.join(data_path, "img")))
+        timer.records[-1].update({"status": status, "message": message})
+        if status != 0:
+            print(f"    eda exited with status {status}: {message}")
+    return timer.records
+
+
+def run_metadata():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {"created": datetime.now(timezone.utc).isoformat(), "git_commit": commit or None,
+            "python": platform.python_version(), "platform": platform.platform(), "cpu_count": os.cpu_count(),
+            "numpy": np.__version__, "pandas": pd.__version__, "sklearn": sklearn.__version__}
+
+
+def compare(records, baseline_file_path):
+    """
+    Prints the wall time of each stage relative to an earlier run.
+    """
+    with open(baseline_file_path) as f:
+        baseline = {(r["scale"], r["stage"]): r for r in json.load(f)["results"]}
+    print(f"\ncompared with {baseline_file_path}:")
+    for record in records:
+        before = baseline.get((record["scale"], record["stage"]))
+        if before and before["wall_s"] > 0:
+            print(f"  {record['scale']:>5g}x {record['stage']:<16}{before['wall_s']:>9.3f} s -> "
+                  f"{record['wall_s']:>9.3f} s  ({record['wall_s'] / before['wall_s']:.2f}x)")
+
+
+def main(raw_data_path, results_file_path, scales, stages, work_dir, n_jobs, baseline_file_path=None):
+    records = []
+    for scale in scales:
+        print(f"scale {scale:g}x")
+        records.extend(run_scale(raw_data_path, work_dir, scale, stages, n_jobs))
+
+    with open(results_file_path, "w") as f:
+        json.dump({"metadata": run_metadata(), "results": records}, f, indent=2)
+    print(f"\nwrote {len(records)} results to {results_file_path}")
+
+    if baseline_file_path is not None:
+        compare(records, baseline_file_path)
+
+
+# script entry point
+if __name__ == '__main__':
+    opt = docopt(__doc__)
+    stages = set(STAGES) if opt["--stages"] == "all" else set(opt["--stages"].split(","))
+    assert stages <= set(STAGES), f"stages must be among {STAGES}"
+    main(opt["<raw_data_path>"], opt["<results_file_path>"], [float(s) for s in opt["--scales"].split(",")],
+         stages, opt["--work_dir"], int(opt["--n_jobs"]), opt["--compare"])
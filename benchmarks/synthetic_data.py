@@ -0,0 +1,142 @@
+"""This script generates synthetic raw tables (results, barrier, horse_info, comments
+and trackwork) at a multiple of the size of the bundled data, with the same columns
+as the raw files (including the Chinese _ch columns).
+
+Races are resampled whole from the bundled results and barrier trials, so each
+synthetic race keeps a real race's runners, distances, odds, finish times and
+missing values. A scale of n gives n blocks of the bundled race calendar, each
+shifted by one calendar span. Every block fills the bundled (date, raceno) slots
+with randomly drawn races and runs its own copy of the horse population. Key
+cardinalities therefore grow with the scale the way a longer history would:
+horses, race days and comments do, while jockeys, trainers, venues and goings do
+not. The bundled data has no comments or trackwork, so those are derived from the
+synthetic results.
+
+Usage: synthetic_data.py <raw_data_path> <file_path_out> [--scale=<scale>] [--seed=<seed>]
+
+Arguments:
+<raw_data_path>     Directory of the bundled results.csv, barrier.csv and horse_info.csv (e.g. data/raw_files)
+<file_path_out>     Directory to write the five synthetic raw .csv files to
+
+Options:
+--scale=<scale>     Size relative to the bundled data, e.g. 1, 10 or 100 (fractions allowed) [default: 1]
+--seed=<seed>       Random seed [default: 0]
+"""
+import math
+import os
+
+import numpy as np
+import pandas as pd
+from docopt import docopt
+
+# share of results rows with a race comment, and of runners with a trackwork entry
+COMMENT_RATE = 0.7
+TRACKWORK_RATE = 0.5
+TRACKWORK_TYPES = ["Gallop", "Trotting", "Swimming", "Barrier Trial"]
+
+
+def block_horse(names, block):
+    """
+    Renames horses for block > 0, e.g. "NATURAL EIGHT(S243)" -> "NATURAL EIGHT(S243-2)".
+    """
+    if block == 0:
+        return names
+    suffixed = names.str.replace(r"\)$", f"-{block})", regex=True)
+    return suffixed.where(suffixed != names, names + f"-{block}")
+
+
+def resample_races(table, scale, rng):
+    """
+    Returns scale blocks of the table's race calendar, each (date, raceno) slot filled
+    with the runners of a race drawn at random from the table.
+    """
+    dates = pd.to_datetime(table["date"])
+    span = pd.Timedelta(days=(dates.max() - dates.min()).days + 1)
+    races = table.groupby(["date", "raceno"], sort=True).indices
+    slots = list(races.keys())
+    rows = list(races.values())
+    sizes = np.array([len(r) for r in rows])
+
+    blocks = []
+    for block in range(math.ceil(scale)):
+        n_slots = len(slots) if block < int(scale) else round((scale - int(scale)) * len(slots))
+        if n_slots == 0:
+            continue
+        drawn = rng.integers(len(rows), size=n_slots)
+        data = table.iloc[np.concatenate([rows[race] for race in drawn])].reset_index(drop=True)
+        slot_dates = pd.to_datetime([date for date, _ in slots[:n_slots]]) + block * span
+        data["date"] = np.repeat(slot_dates.strftime("%Y-%m-%d").to_numpy(), sizes[drawn])
+        data["raceno"] = np.repeat([raceno for _, raceno in slots[:n_slots]], sizes[drawn])
+        for column in ["horse", "horse_ch"]:
+            data[column] = block_horse(data[column], block)
+        blocks.append(data)
+    return pd.concat(blocks, ignore_index=True)
+
+
+def replicate_horses(horse_info, scale):
+    """
+    Returns one copy of horse_info per block, with the block's horse names.
+    """
+    return pd.concat([horse_info.assign(horse=block_horse(horse_info["horse"], block))
+                      for block in range(math.ceil(scale))], ignore_index=True)
+
+
+def make_comments(results, barrier, rng):
+    """
+    Derives race comments for a share of the results rows, with comment texts drawn
+    from the barrier trial comments.
+    """
+    rows = results[rng.random(len(results)) < COMMENT_RATE]
+    texts = barrier[["comment", "comment_ch"]].dropna()
+    drawn = texts.iloc[rng.integers(len(texts), size=len(rows))].reset_index(drop=True)
+    return pd.DataFrame({"horseno": rows["horseno"].to_numpy(), "date": rows["date"].to_numpy(),
+                         "raceno": rows["raceno"].to_numpy(), "plc": rows["plc"].to_numpy(),
+                         "horse": rows["horse"].to_numpy(), "comment": drawn["comment"],
+                         "horse_ch": rows["horse_ch"].to_numpy(), "comment_ch": drawn["comment_ch"]})
+
+
+def make_trackwork(results, rng):
+    """
+    Derives trackwork entries for a share of the results rows, dated up to two weeks before the race.
+    """
+    rows = results[rng.random(len(results)) < TRACKWORK_RATE]
+    dates = pd.to_datetime(rows["date"]) - pd.to_timedelta(rng.integers(1, 15, size=len(rows)), unit="D")
+    types = rng.choice(TRACKWORK_TYPES, size=len(rows))
+    return pd.DataFrame({"horse": rows["horse"].to_numpy(), "date": dates.dt.strftime("%Y-%m-%d").to_numpy(),
+                         "type": types, "venue": rows["venue"].to_numpy(),
+                         "workout": rng.choice(["1L", "2L", "3L"], size=len(rows)),
+                         "gear": rng.choice(["B", "H", "TT", "V"], size=len(rows)),
+                         "horse_ch": rows["horse_ch"].to_numpy(), "type_ch": types,
+                         "venue_ch": rows["venue"].to_numpy(), "workout_ch": "-"})
+
+
+def generate(raw_data_path, file_path_out, scale=1, seed=0):
+    """
+    Writes the five synthetic raw tables to file_path_out.
+
+    Returns
+    -------
+        dict of table name to number of rows
+    """
+    rng = np.random.default_rng(seed)
+    results = pd.read_csv(f"{raw_data_path}/results.csv", index_col=0)
+    barrier = pd.read_csv(f"{raw_data_path}/barrier.csv", index_col=0)
+    horse_info = pd.read_csv(f"{raw_data_path}/horse_info.csv", index_col=0)
+
+    tables = {"results": resample_races(results, scale, rng),
+              "barrier": resample_races(barrier, scale, rng),
+              "horse_info": replicate_horses(horse_info, scale)}
+    tables["comments"] = make_comments(tables["results"], barrier, rng)
+    tables["trackwork"] = make_trackwork(tables["results"], rng)
+
+    os.makedirs(file_path_out, exist_ok=True)
+    for name, data in tables.items():
+        data.to_csv(f"{file_path_out}/{name}.csv")
+    return {name: len(data) for name, data in tables.items()}
+
+
+# script entry point
+if __name__ == '__main__':
+    opt = docopt(__doc__)
+    sizes = generate(opt["<raw_data_path>"], opt["<file_path_out>"], float(opt["--scale"]), int(opt["--seed"]))
+    print(", ".join(f"{name}: {n} rows" for name, n in sizes.items()))
@@ -0,0 +1,129 @@
+"""Summaries of the training data behind the EDA charts in eda.py.
+
+The charts are drawn from these summaries, not from the rows of the training set.
+Their size depends on the number of bins, categories and distinct values, not on
+the number of rows, so chart specs and rendering time stay the same as the data
+grows. It also keeps the charts under Altair's 5000-row limit. Only pandas and
+NumPy are used; the charting libraries are not needed to compute them.
+"""
+
+import numpy as np
+import pandas as pd
+
+# rows of the training set are grouped into this many bands for the missing values heatmap
+NULL_ROW_BINS = 100
+# the most bins a histogram gets, as with Altair's bin=True
+MAX_BINS = 10
+# whiskers reach the furthest values within this many IQRs of the box, as in Altair's boxplots
+WHISKER_IQR = 1.5
+
+
+def nice_bin_edges(values, max_bins=MAX_BINS):
+    """
+    Returns at most max_bins + 1 evenly spaced bin edges covering the values, with a
+    step of 1, 2 or 5 times a power of ten and edges on multiples of the step.
+    """
+    low, high = np.nanmin(values), np.nanmax(values)
+    span = max(high - low, 1e-12)
+    magnitude = 10 ** np.floor(np.log10(span / max_bins))
+    step = next(magnitude * factor for factor in (1, 2, 5, 10) if span / (magnitude * factor) <= max_bins)
+    start = np.floor(low / step) * step
+    n_bins = max(int(np.ceil((high - start) / step)), 1)
+    # a value on the last edge belongs to the last bin, as in np.histogram
+    return start + step * np.arange(n_bins + 1)
+
+
+def histogram(values, max_bins=MAX_BINS):
+    """
+    Counts the non-missing values in nice bins (see nice_bin_edges()).
+
+    Parameters
+    ----------
+    values
+        a numeric Pandas Series
+    max_bins
+        the most bins to use
+
+    Returns
+    -------
+        a Pandas DataFrame with columns bin_start, bin_end and count, one row per bin
+    """
+    values = values.dropna().to_numpy(dtype="float64")
+    if len(values) == 0:
+        return pd.DataFrame({"bin_start": [], "bin_end": [], "count": []})
+    edges = nice_bin_edges(values, max_bins)
+    counts, edges = np.histogram(values, bins=edges)
+    return pd.DataFrame({"bin_start": edges[:-1], "bin_end": edges[1:], "count": counts})
+
+
+def null_fractions(data, n_bins=NULL_ROW_BINS):
+    """
+    Returns the share of missing values of each column in each of n_bins bands of
+    consecutive rows: the binned version of data.isnull(), which has one cell per
+    row and column.
+
+    Parameters
+    ----------
+    data
+        a Pandas DataFrame
+    n_bins
+        the number of row bands; fewer if there are fewer rows
+
+    Returns
+    -------
+        a Pandas DataFrame with one row per band, labelled by its first row number,
+        and one column per column of data
+    """
+    n_bins = max(min(n_bins, len(data)), 1)
+    starts = np.linspace(0, len(data), n_bins, endpoint=False).astype(int)
+    sizes = np.diff(np.append(starts, len(data)))
+    fractions = {}
+    for column in data.columns:
+        missing = data[column].isna().to_numpy(dtype=np.int64)
+        fractions[column] = np.add.reduceat(missing, starts) / sizes if len(data) else np.zeros(n_bins)
+    return pd.DataFrame(fractions, index=pd.Index(starts, name="row"))
+
+
+def boxplot_summary(data, category, value):
+    """
+    Computes the boxplot of a numeric column in each category: quartiles, whiskers
+    reaching the furthest values within WHISKER_IQR interquartile ranges of the box,
+    and the values beyond the whiskers. Quartiles interpolate linearly, as Vega-Lite's do.
+
+    Parameters
+    ----------
+    data
+        a Pandas DataFrame
+    category
+        the column to group by; rows where it is missing are dropped
+    value
+        the column to summarise. Text is read as numbers where it can be, e.g. places,
+        and the rest treated as missing
+
+    Returns
+    -------
+    summary, outliers
+        (pd.DataFrame, pd.DataFrame) - one row per category with columns lower, q1,
+        median, q3, upper and count, and the distinct outlying (category, value) pairs
+    """
+    frame = pd.DataFrame({category: data[category].astype("object"),
+                          value: pd.to_numeric(data[value], errors="coerce")}).dropna()
+    if len(frame) == 0:
+        return (pd.DataFrame(columns=[category, "lower", "q1", "median", "q3", "upper", "count"]),
+                pd.DataFrame(columns=[category, value]))
+    grouped = frame.groupby(category)[value]
+    summary = grouped.quantile([0.25, 0.5, 0.75]).unstack()
+    summary.columns = ["q1", "median", "q3"]
+    summary["count"] = grouped.size()
+
+    iqr = summary["q3"] - summary["q1"]
+    low = frame[category].map(summary["q1"] - WHISKER_IQR * iqr)
+    high = frame[category].map(summary["q3"] + WHISKER_IQR * iqr)
+    inside = frame[value].between(low, high)
+    within = frame[inside].groupby(category)[value]
+    summary["lower"] = within.min()
+    summary["upper"] = within.max()
+
+    outliers = frame[~inside].drop_duplicates().reset_index(drop=True)
+    summary = summary[["lower", "q1", "median", "q3", "upper", "count"]].reset_index()
+    return summary, outliers
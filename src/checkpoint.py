@@ -0,0 +1,151 @@
+"""Checkpoints of grid_search.py's cross-validation, one (candidate, fold) cell at a time.
+
+A search scores every number of features of a degree from one RFE elimination path
+per fold (see rfe_path.py), so its unit of work is a fold. When a fold finishes,
+the validation r2 and fit time of each of its grid sizes are appended to a JSON
+lines checkpoint file and flushed to disk. A search restarted with resume=True
+reads the file back and only runs the folds that still have cells missing, for
+just those grid sizes. Extending the grid therefore only scores the new sizes,
+though each fold that gains a size runs its elimination path again.
+
+Cells are filed under a key of everything that determines their value: the
+training rows, the folds, the degree and the preprocessing and engine settings
+(see search_key()). Cells of a different search in the same file are ignored, not
+reused.
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from feature_cache import cache_key, hash_data
+
+
+def search_key(X, y, folds, **settings):
+    """
+    Returns the checkpoint key of a cross-validated search of the rows X, y over
+    folds (a list of (train_idx, val_idx)), with settings such as the degree and engine.
+    """
+    digest = hashlib.sha256()
+    for train_idx, val_idx in folds:
+        digest.update(np.asarray(train_idx, dtype="int64").tobytes())
+        digest.update(b"|")
+        digest.update(np.asarray(val_idx, dtype="int64").tobytes())
+        digest.update(b"||")
+    return cache_key("cv_cells", hash_data(X), hash_data(pd.DataFrame({"y": np.asarray(y)})), digest.hexdigest(),
+                     settings)
+
+
+class SearchCheckpoint:
+    """
+    Append-only JSON lines file of finished cross-validation cells.
+
+    Parameters
+    ----------
+    path
+        the checkpoint file
+    resume
+        read the cells already in the file; otherwise the file is started afresh
+    fresh
+        start afresh even if the file already holds cells; without it, an existing
+        non-empty checkpoint is only opened with resume=True
+    """
+
+    def __init__(self, path, resume=False, fresh=False):
+        self.path = path
+        self.cells = {}
+        if resume and os.path.exists(path):
+            complete = 0
+            with open(path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        # the last line of a run killed mid-write
+                        break
+                    cell = json.loads(line)
+                    self.cells[(cell["key"], cell["fold"], cell["n_features"])] = (cell["score"], cell["fit_time"])
+                    complete += len(line)
+            # drop the partial line so that new cells are appended after a complete one
+            with open(path, "r+b") as f:
+                f.truncate(complete)
+        else:
+            assert fresh or not os.path.exists(path) or os.path.getsize(path) == 0, \
+                "Checkpoint file " + path + " already holds cells; resume it or start a fresh search"
+            open(path, "w").close()
+
+    def get(self, key, fold, n_features):
+        """
+        Returns the (score, fit_time) of a cell, or None if it has not been recorded.
+        """
+        return self.cells.get((key, fold, int(n_features)))
+
+    def record(self, key, fold, n_features_grid, test_scores, fit_times):
+        """
+        Appends the cells of a finished fold and flushes them to disk.
+        """
+        lines = []
+        for n_features, score, fit_time in zip(n_features_grid, test_scores, fit_times):
+            self.cells[(key, fold, int(n_features))] = (float(score), float(fit_time))
+            lines.append(json.dumps({"key": key, "fold": fold, "n_features": int(n_features), "score": float(score),
+                                     "fit_time": float(fit_time)}) + "\n")
+        with open(self.path, "a") as f:
+            f.writelines(lines)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class FoldCells:
+    """
+    The validation r2 and fit time of each (fold, grid size) cell of one search,
+    filled from a checkpoint and as folds finish.
+
+    Parameters
+    ----------
+    n_folds
+        the number of folds
+    n_features_grid
+        the numbers of features to select
+    checkpoint, key
+        the SearchCheckpoint to read and record cells in, and the search's key
+        (see search_key()), or None not to checkpoint
+    """
+
+    def __init__(self, n_folds, n_features_grid, checkpoint=None, key=None):
+        self.n_folds = n_folds
+        self.n_features_grid = [int(n_features) for n_features in n_features_grid]
+        self.checkpoint = checkpoint
+        self.key = key
+        self.cells = {}
+        if checkpoint is not None:
+            for fold in range(n_folds):
+                for n_features in self.n_features_grid:
+                    cell = checkpoint.get(key, fold, n_features)
+                    if cell is not None:
+                        self.cells[(fold, n_features)] = cell
+
+    def pending(self):
+        """
+        Returns (fold, grid sizes) pairs of the folds with cells still to score.
+        """
+        jobs = []
+        for fold in range(self.n_folds):
+            missing = sorted({n_features for n_features in self.n_features_grid if (fold, n_features) not in self.cells})
+            if missing:
+                jobs.append((fold, missing))
+        return jobs
+
+    def record(self, fold, n_features_grid, test_scores, fit_times):
+        for n_features, score, fit_time in zip(n_features_grid, test_scores, fit_times):
+            self.cells[(fold, int(n_features))] = (score, fit_time)
+        if self.checkpoint is not None:
+            self.checkpoint.record(self.key, fold, n_features_grid, test_scores, fit_times)
+
+    def results(self):
+        """
+        Returns the mean validation r2 and fit time over folds, aligned with the grid.
+        """
+        cells = np.array([[self.cells[(fold, n_features)] for n_features in self.n_features_grid]
+                          for fold in range(self.n_folds)])
+        return cells[:, :, 0].mean(axis=0), cells[:, :, 1].mean(axis=0)
@@ -0,0 +1,235 @@
+"""Pearson correlation matrices of the wrangled data, accumulated chunk by chunk.
+
+A CorrelationAccumulator keeps, for every pair of numeric columns, the number of
+rows where both are present, each column's mean over those rows, and the sums of
+squared deviations and cross-products about those means. These are the counts,
+sums and cross-products of the columns, kept centred so that columns with large
+values such as stake do not lose precision. Missing values are handled pairwise,
+as in DataFrame.corr(). Memory depends on the number of columns, not rows.
+
+Accumulators of separate chunks merge exactly, so chunks can be read in parallel,
+and an accumulator saved to a state file only needs the rows added since. The
+incremental ingests of wrangle_data.py add Parquet part files without touching the
+earlier ones, so dataset_correlation() reads just the new parts.
+"""
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from data_store import dataset_files
+
+# rows read from the data set at a time
+DEFAULT_BATCH_SIZE = 100000
+# accumulated correlation statistics, kept next to the wrangled data
+CORRELATION_STATE_NAME = ".correlation_state.json"
+
+
+class CorrelationAccumulator:
+    """
+    Pairwise correlation statistics of a fixed list of numeric columns. Entry [i, j]
+    of each array is over the rows where both column i and column j are present.
+
+    Attributes
+    ----------
+    count
+        the number of rows where both columns are present
+    mean
+        the mean of column i
+    m2
+        the sum of squared deviations of column i from that mean
+    comoment
+        the sum of products of the deviations of columns i and j (symmetric)
+    """
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        shape = (len(self.columns), len(self.columns))
+        self.count = np.zeros(shape)
+        self.mean = np.zeros(shape)
+        self.m2 = np.zeros(shape)
+        self.comoment = np.zeros(shape)
+
+    def update(self, chunk):
+        """
+        Adds the rows of a chunk: a data frame with the accumulator's columns, or a
+        2-D float array with one column per accumulator column, NaN where missing.
+        """
+        if isinstance(chunk, pd.DataFrame):
+            chunk = chunk[self.columns].apply(pd.to_numeric, errors="coerce").to_numpy(dtype="float64",
+                                                                                      na_value=np.nan)
+        self.merge(self.from_values(self.columns, chunk))
+        return self
+
+    @classmethod
+    def from_values(cls, columns, values):
+        """
+        Returns the accumulator of the rows of a 2-D float array.
+        """
+        accumulator = cls(columns)
+        if len(values) == 0:
+            return accumulator
+        present = ~np.isnan(values)
+        weights = present.astype("float64")
+        # centre each column on its mean in the chunk, so the sums below do not cancel
+        n_present = weights.sum(axis=0)
+        centre = np.divide(np.nansum(values, axis=0), n_present, out=np.zeros(len(columns)), where=n_present > 0)
+        x = np.where(present, values - centre, 0.0)
+
+        count = weights.T @ weights
+        # sums[i, j] is the sum of column i over the rows where column j is present too
+        sums = x.T @ weights
+        squares = (x * x).T @ weights
+        products = x.T @ x
+        mean = np.divide(sums, count, out=np.zeros_like(sums), where=count > 0)
+
+        accumulator.count = count
+        accumulator.mean = mean + centre[:, None]
+        accumulator.m2 = np.maximum(squares - sums * mean, 0.0)
+        accumulator.comoment = products - sums * mean.T
+        return accumulator
+
+    def merge(self, other):
+        """
+        Adds the statistics of another accumulator of the same columns, e.g. of a
+        chunk read in parallel. The result is as if its rows had been added here.
+        """
+        assert other.columns == self.columns, "accumulators must have the same columns"
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        weight = np.divide(self.count * other.count, count, out=np.zeros_like(count), where=count > 0)
+        share = np.divide(other.count, count, out=np.zeros_like(count), where=count > 0)
+
+        self.mean = self.mean + delta * share
+        self.m2 = self.m2 + other.m2 + delta ** 2 * weight
+        self.comoment = self.comoment + other.comoment + delta * delta.T * weight
+        self.count = count
+        return self
+
+    def correlation(self):
+        """
+        Returns the Pearson correlation matrix as a data frame, as DataFrame.corr()
+        would give for all the rows added. Pairs with fewer than two rows, or with a
+        constant column, are NaN.
+        """
+        scale = np.sqrt(self.m2 * self.m2.T)
+        defined = (self.count >= 2) & (scale > 0)
+        matrix = np.divide(self.comoment, scale, out=np.full_like(scale, np.nan), where=defined)
+        matrix = np.clip(matrix, -1.0, 1.0)
+        np.fill_diagonal(matrix, np.where(np.diag(defined), 1.0, np.nan))
+        return pd.DataFrame(matrix, index=self.columns, columns=self.columns)
+
+    def to_dict(self):
+        return {"columns": self.columns, "count": self.count.tolist(), "mean": self.mean.tolist(),
+                "m2": self.m2.tolist(), "comoment": self.comoment.tolist()}
+
+    @classmethod
+    def from_dict(cls, state):
+        accumulator = cls(state["columns"])
+        for name in ["count", "mean", "m2", "comoment"]:
+            setattr(accumulator, name, np.array(state[name], dtype="float64").reshape(accumulator.count.shape))
+        return accumulator
+
+
+def numeric_columns(filepath):
+    """
+    Returns the numeric columns of a wrangled data set, in file order, without its index.
+    The column types of a .csv file are only known once it has all been read.
+    """
+    path = dataset_files(filepath)[0]
+    if path.endswith(".parquet"):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = pq.read_schema(path)
+        index_columns = (schema.pandas_metadata or {}).get("index_columns", [])
+        return [field.name for field in schema if field.name not in index_columns and
+                (pa.types.is_integer(field.type) or pa.types.is_floating(field.type) or
+                 pa.types.is_boolean(field.type))]
+
+    # a column read as text in any chunk is not numeric; one missing in a whole chunk can be either
+    columns, text = None, set()
+    for chunk in pd.read_csv(path, index_col=0, chunksize=DEFAULT_BATCH_SIZE, low_memory=False):
+        columns = list(chunk.columns)
+        text.update(column for column in columns if chunk[column].notna().any() and
+                    not pd.api.types.is_numeric_dtype(chunk[column]))
+    return [column for column in columns if column not in text]
+
+
+def file_accumulator(path, columns, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Returns the accumulator of the columns of one .parquet or .csv file, read batch_size rows at a time.
+    """
+    accumulator = CorrelationAccumulator(columns)
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size, columns=columns):
+            accumulator.update(batch.to_pandas())
+    else:
+        for chunk in pd.read_csv(path, usecols=columns, chunksize=batch_size):
+            accumulator.update(chunk)
+    return accumulator
+
+
+def file_signature(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def dataset_correlation(filepath, state_file_path=None, batch_size=DEFAULT_BATCH_SIZE, n_jobs=1):
+    """
+    Computes the Pearson correlation matrix of the numeric columns of a wrangled data
+    set, reading batch_size rows at a time.
+
+    With a state file, only the files of the data set not already in the saved
+    statistics are read. Files are recognised by size and modification time, so a
+    .parquet file moved into a directory of parts by an incremental ingest still
+    counts as read. If a file that was read has changed or gone, or the columns
+    differ, the statistics are accumulated again from scratch.
+
+    Parameters
+    ----------
+    filepath
+        path of the .parquet file, directory of Parquet parts or .csv file
+    state_file_path
+        the file to read and save the accumulated statistics in, if any
+    batch_size
+        the number of rows read at a time
+    n_jobs
+        the number of files read at the same time (their statistics are merged)
+
+    Returns
+    -------
+        a Pandas DataFrame with one row and column per numeric column
+    """
+    columns = numeric_columns(filepath)
+    signatures = {path: file_signature(path) for path in dataset_files(filepath)}
+
+    state = None
+    if state_file_path is not None and os.path.exists(state_file_path):
+        with open(state_file_path) as f:
+            state = json.load(f)
+    if (state is not None and state["accumulator"]["columns"] == columns and
+            all(signature in signatures.values() for signature in state["files"])):
+        accumulator = CorrelationAccumulator.from_dict(state["accumulator"])
+        read = state["files"]
+    else:
+        accumulator = CorrelationAccumulator(columns)
+        read = []
+
+    new_files = [path for path, signature in signatures.items() if signature not in read]
+    with ThreadPoolExecutor(max_workers=max(1, min(n_jobs, len(new_files) or 1))) as pool:
+        for partial in pool.map(lambda path: file_accumulator(path, columns, batch_size), new_files):
+            accumulator.merge(partial)
+
+    if state_file_path is not None:
+        temp_path = f"{state_file_path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump({"files": read + [signatures[path] for path in new_files],
+                       "accumulator": accumulator.to_dict()}, f)
+        os.replace(temp_path, state_file_path)
+    return accumulator.correlation()
@@ -0,0 +1,292 @@
+"""Typed storage for the wrangled train/test sets written by wrangle_data.py.
+
+The wrangled data is written as Parquet with stable dtypes, so downstream
+scripts load it without re-parsing text and can read only the columns they use.
+CSV copies are still supported for the R scripts and the report. Incremental
+ingests append to the CSV files and turn each Parquet file into a directory of
+part files (read the same way), so earlier rows are never rewritten.
+"""
+
+import os
+import shutil
+
+import pandas as pd
+
+# low-cardinality string columns stored as categoricals
+CATEGORICAL_COLUMNS = ["country", "venue", "going", "dataset"]
+DATE_COLUMNS = ["date"]
+# integer-valued measurements well inside float32's exact integer range (2**24).
+# stake (up to 25 million) and fractional odds stay float64.
+FLOAT32_COLUMNS = ["row", "horseno", "actualwt", "declarwt", "draw", "class",
+                   "current_rating", "start_rating", "age"]
+
+# columns used by grid_search.py and linear_model.py
+MODEL_COLUMNS = ["finishtime", "declarwt", "age", "winodds", "stake", "distance", "country", "dataset"]
+
+FORMATS = ["csv", "parquet"]
+
+
+def apply_dtypes(data):
+    """
+    Casts the columns of a wrangled data frame to their storage dtypes.
+
+    Parameters
+    ----------
+    data
+        the wrangled data frame (or a subset of its columns)
+
+    Returns
+    -------
+        the data frame with categorical, datetime, float32 and text columns converted
+    """
+    for column in data.columns:
+        if column in CATEGORICAL_COLUMNS:
+            data[column] = data[column].astype("category")
+        elif column in DATE_COLUMNS:
+            data[column] = pd.to_datetime(data[column])
+        elif column in FLOAT32_COLUMNS:
+            data[column] = data[column].astype("float32")
+        elif data[column].dtype == object:
+            # merged columns such as plc mix numbers and codes; store them as text, as in the CSV
+            data[column] = data[column].where(data[column].isnull(), data[column].astype(str))
+    return data
+
+
+def write_dataset(data, filepath, name, formats=("csv", "parquet")):
+    """
+    Writes a wrangled data set as <filepath>/<name>.<format> for each requested format.
+
+    Parameters
+    ----------
+    data
+        the data frame to write
+    filepath
+        the directory to write to
+    name
+        the file name without extension, e.g. "data_train"
+    formats
+        the formats to write, any of "csv" and "parquet"
+
+    Returns
+    -------
+        None
+    """
+    assert all(f in FORMATS for f in formats), f"formats must be among {FORMATS}"
+
+    if "csv" in formats:
+        data.to_csv(f"{filepath}/{name}.csv")
+    if "parquet" in formats:
+        remove_parquet(f"{filepath}/{name}.parquet")
+        apply_dtypes(data.copy()).to_parquet(f"{filepath}/{name}.parquet")
+
+
+def remove_parquet(path):
+    """
+    Removes a .parquet file, or a directory of part files left by incremental ingests.
+    """
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def parquet_parts(path):
+    """
+    Turns a .parquet file into a directory holding it as its first part file, so more
+    parts can be added without rewriting it, and returns the sorted part file paths.
+    """
+    if os.path.isfile(path):
+        os.replace(path, f"{path}.tmp")
+        os.makedirs(path)
+        os.replace(f"{path}.tmp", os.path.join(path, "part-00000.parquet"))
+    return sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith(".parquet"))
+
+
+def parquet_schema(template):
+    """
+    Returns the Arrow schema that write_dataset() would give a data frame with the
+    columns and dtypes of template, widened so that any chunk of such a frame fits:
+    text columns (all-null in an empty template) are strings, and categoricals use
+    32-bit dictionary indices.
+
+    Parameters
+    ----------
+    template
+        a data frame (typically empty) with the columns and dtypes of the data set
+
+    Returns
+    -------
+        a pyarrow Schema, including the row index
+    """
+    import pyarrow as pa
+
+    schema = pa.Schema.from_pandas(apply_dtypes(template.copy()), preserve_index=True)
+    for i, field in enumerate(schema):
+        if pa.types.is_dictionary(field.type):
+            schema = schema.set(i, field.with_type(pa.dictionary(pa.int32(), pa.string())))
+        elif pa.types.is_null(field.type) or pa.types.is_large_string(field.type):
+            schema = schema.set(i, field.with_type(pa.string()))
+    return schema
+
+
+class DatasetAppender:
+    """
+    Writes a wrangled data set chunk by chunk as <filepath>/<name>.<format>, so that
+    only one chunk needs to be in memory. Every chunk must have the columns of
+    template and dtypes that cast to its dtypes. Use as a context manager, or call
+    close() when done.
+
+    With append=True the rows are added to an existing data set instead: appended to
+    the CSV file, and written as a new part file of the Parquet directory (with the
+    schema of the existing parts). Nothing is written if no rows are appended.
+    """
+
+    def __init__(self, filepath, name, template, formats=("csv", "parquet"), append=False):
+        assert all(f in FORMATS for f in formats), f"formats must be among {FORMATS}"
+
+        self.template = template
+        self.csv_path = None
+        self.parquet_path = None
+        self.parquet_writer = None
+        if "csv" in formats:
+            self.csv_path = f"{filepath}/{name}.csv"
+            if not (append and os.path.exists(self.csv_path)):
+                template.to_csv(self.csv_path)
+        if "parquet" in formats:
+            import pyarrow.parquet as pq
+
+            path = f"{filepath}/{name}.parquet"
+            if append and os.path.exists(path):
+                parts = parquet_parts(path)
+                self.schema = pq.read_schema(parts[0])
+                self.parquet_path = os.path.join(path, f"part-{len(parts):05d}.parquet")
+            else:
+                remove_parquet(path)
+                self.schema = parquet_schema(template)
+                self.parquet_writer = pq.ParquetWriter(path, self.schema)
+
+    def append(self, chunk):
+        """
+        Appends the rows of chunk to every output file.
+        """
+        if len(chunk) == 0:
+            return
+        if self.csv_path is not None:
+            chunk.to_csv(self.csv_path, mode="a", header=False)
+        if self.parquet_path is not None or self.parquet_writer is not None:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            if self.parquet_writer is None:
+                self.parquet_writer = pq.ParquetWriter(self.parquet_path, self.schema)
+            table = pa.Table.from_pandas(apply_dtypes(chunk.astype(self.template.dtypes.to_dict())),
+                                         schema=self.schema, preserve_index=True)
+            self.parquet_writer.write_table(table)
+
+    def close(self):
+        if self.parquet_writer is not None:
+            self.parquet_writer.close()
+            self.parquet_writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def read_dataset(filepath, columns=None):
+    """
+    Reads a wrangled data set from a .parquet file (or directory of part files) or a
+    .csv file, returning typed columns.
+
+    Parameters
+    ----------
+    filepath
+        path of the .parquet or .csv file
+    columns
+        the columns to read; all columns if None
+
+    Returns
+    -------
+        a Pandas DataFrame
+    """
+    if filepath.endswith(".parquet"):
+        return pd.read_parquet(filepath, columns=columns)
+
+    if columns is None:
+        data = pd.read_csv(filepath, index_col=0)
+    else:
+        data = pd.read_csv(filepath, usecols=columns)[columns]
+    return apply_dtypes(data)
+
+
+def read_dataset_chunks(filepath, columns=None, chunksize=100000):
+    """
+    Reads a wrangled data set like read_dataset(), chunksize rows at a time, so that
+    only one chunk needs to be in memory.
+
+    Parameters
+    ----------
+    filepath
+        path of the .parquet file (or directory of part files) or .csv file
+    columns
+        the columns to read; all columns if None
+    chunksize
+        the number of rows per chunk (at most; part files end their last chunk early)
+
+    Returns
+    -------
+        generator of Pandas DataFrames with typed columns
+    """
+    if filepath.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        for path in dataset_files(filepath):
+            for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=columns):
+                yield batch.to_pandas()
+        return
+
+    reader = pd.read_csv(filepath, index_col=0, chunksize=chunksize) if columns is None else \
+        pd.read_csv(filepath, usecols=columns, chunksize=chunksize)
+    for chunk in reader:
+        yield apply_dtypes(chunk if columns is None else chunk[columns])
+
+
+def dataset_columns(filepath):
+    """
+    Returns the column names of a wrangled data set without reading its rows.
+    """
+    if filepath.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        return pq.read_schema(dataset_files(filepath)[0]).names
+    return list(pd.read_csv(filepath, index_col=0, nrows=0).columns)
+
+
+def dataset_files(filepath):
+    """
+    Returns the files of a wrangled data set: the part files of a Parquet directory, or the file itself.
+    """
+    if os.path.isdir(filepath):
+        return sorted(os.path.join(filepath, name) for name in os.listdir(filepath) if name.endswith(".parquet"))
+    return [filepath]
+
+
+def find_dataset(filepath, name):
+    """
+    Locates a wrangled data set in a directory, preferring Parquet over CSV.
+
+    Parameters
+    ----------
+    filepath
+        the directory holding the wrangled data
+    name
+        the file name without extension, e.g. "data_train"
+
+    Returns
+    -------
+        path of <name>.parquet if it exists, otherwise of <name>.csv
+    """
+    parquet_path = f"{filepath}/{name}.parquet"
+    return parquet_path if os.path.exists(parquet_path) else f"{filepath}/{name}.csv"
@@ -4,109 +4,98 @@
 # date: 2020-01-18
 #
 
-"""This script downloads .csv files for horse-racing data in Hong Kong from the user-defined URL
-then processes them and writes them to a user-specified location on the local machine
-as data_train.csv and data_test.csv. This script takes  the URL where the data is hosted
-and the location where the user would like the data to be written to locally.
+"""This script downloads the raw .csv files for horse-racing data in Hong Kong from the user-defined URL
+and writes them to a user-specified location on the local machine. The files are streamed to disk
+concurrently without being parsed; interrupted downloads are resumed, and files unchanged since the
+last run (same checksum, ETag or Last-Modified) are skipped. This script takes the URL where the data
+is hosted and the location where the user would like the data to be written to locally.
 
-Usage: download_data.py <url> <file_path>
+Usage: download_data.py <url> <file_path> [--n_jobs=<n_jobs>] [--retries=<retries>] [--force] [--trace=<trace_file_path>] [--profile=<profile_dir>]
 
 Arguments:
 <url>        Url where the data is hosted.
 <file_path>  Path where the data would be written to locally.
+
+Options:
+--n_jobs=<n_jobs>    Number of files downloaded at the same time [default: 5]
+--retries=<retries>  Retries per file on connection errors and server errors [default: 4]
+--force              Download every file, even if unchanged since the last run
+--trace=<trace_file_path>  Append the time, CPU time, peak memory and file count of the download to this
+                     JSON lines file (see instrument.py)
+--profile=<profile_dir>    Write a cProfile profile of the download to this directory
 """
 
-import pandas as pd
 import os
 from docopt import docopt
 
-opt = docopt(__doc__)
+from fetcher import Fetcher
+from instrument import configure, stage
+
+FILE_NAMES = ["horse_info.csv", "results.csv", "comments.csv", "trackwork.csv", "barrier.csv"]
 
 
-def main(url, file_path):
+def main(url, file_path, n_jobs=5, retries=4, force=False):
     """
     entry point for script. take in url_path and file_path from commandline,
-     and downloads/formats data for downstream use.
+     and downloads data for downstream use.
     Parameters
     ----------
     url
         the web link where the data is hosted. Assumes that the URL contains 5 files:
             - horse_info.csv
             - results.csv
-            - trackworks.csv
+            - trackwork.csv
             - barrier.csv
             - comments.csv
     file_path
-        - the desired filepath to put the wrangled data into.
+        - the desired filepath to put the raw data into.
+    n_jobs
+        - the number of files downloaded at the same time.
+    retries
+        - the number of retries per file.
+    force
+        - download every file, even if unchanged since the last run.
 
     Returns
     -------
         None if executed successfully, otherwise raises Exception.
     """
-    list_of_data = download_files(url)
-
-    write_data_to_file(list_of_data, file_path)
+    statuses = download_files(url, file_path, n_jobs, retries, force)
+    for name, status in statuses.items():
+        print(f"{name}: {status}")
     print(f"successfully written data to {file_path}!\n")
 
 
-def download_files(url):
+def download_files(url, file_path, n_jobs=5, retries=4, force=False):
     """
-    downloads the relevant csvs from the url specified.
+    downloads the relevant csvs from the url specified into file_path (see fetcher.py).
     Parameters
     ----------
     url
         the url where the csv files live at.
+    file_path
+        the directory to write the files to.
+    n_jobs
+        the number of files downloaded at the same time.
+    retries
+        the number of retries per file.
+    force
+        download every file, even if unchanged since the last run.
 
     Returns
     -------
-        a dictionary containing five Pandas DataFrames
-           "horse_info" - horse_info
-           "results" - results
-            "comments" - comments
-            "trackwork" - trackwork
-            "barrier" - barrier
+        a dictionary of file name to "downloaded", "resumed" or "unchanged"
     -------
 
     """
-    # the comments had a bunch of letter codes saying the horses weren't able to place for some reason; weed out here.
     print("==========\nstarting download...\n")
-    horse_info = pd.read_csv(f"{url}/horse_info.csv",
-                             index_col=0)
-    results = pd.read_csv(f"{url}/results.csv",
-                          index_col=0)
-    comments = pd.read_csv(f"{url}/comments.csv",
-                           index_col=0)
-    trackwork = pd.read_csv(f"{url}/trackwork.csv",
-                            index_col=0)
-    barrier = pd.read_csv(f"{url}/barrier.csv",
-                          index_col=0)
-
+    with stage("download_files", n_jobs=n_jobs) as current:
+        statuses = Fetcher(url, file_path, retries=retries).fetch_all(FILE_NAMES, n_jobs=n_jobs, force=force)
+        current.rows_out = sum(status != "unchanged" for status in statuses.values())
+        current.set(statuses=statuses,
+                    bytes=sum(os.path.getsize(os.path.join(file_path, name)) for name in FILE_NAMES))
     print("==========\nsuccessfully downloaded CSV data!\n")
-    return {"horse_info": horse_info,
-            "results": results,
-            "comments": comments,
-            "trackwork": trackwork,
-            "barrier": barrier}
-
-
-def write_data_to_file(dict_of_data, filepath):
-    """
-    splits the data into a train and test sets with a 8/2 split, then writes them to the specified file path.
-    Parameters
-    ----------
-    dict_of_data
-        the tuple contaiing the five dataframes
-    filepath
-        the user-specified filepath
-
-    Returns
-    -------
-        None
-    """
-    print("==========\nstarting write to disk\n")
-    for name, data in dict_of_data.items():
-        data.to_csv(f"{filepath}/{name}.csv")
-    print("==========\nfinished writing files to disk\n")
+    return statuses
 
 
 def test(url, file_path):
@@ -128,8 +117,16 @@ def test(url, file_path):
         raise Exception("the filepath input is invalid!")
 
 
-test(opt["<url>"], opt["<file_path>"])
+def cli(argv=None):
+    """
+    Runs the script with command line arguments (sys.argv[1:] if argv is None).
+    """
+    opt = docopt(__doc__, argv=argv)
+    test(opt["<url>"], opt["<file_path>"])
+    configure(opt["--trace"], opt["--profile"], script="download_data")
+    main(opt["<url>"], opt["<file_path>"], int(opt["--n_jobs"]), int(opt["--retries"]), opt["--force"])
+
 
 # script entry point
 if __name__ == '__main__':
-    main(opt["<url>"], opt["<file_path>"])
+    cli()
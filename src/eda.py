@@ -2,42 +2,94 @@
 # date: 2020-01-23
 
 """This script creates exploratory data visualiztions and tables that help readers understand the Hong Kong horse racing data. 
+The charts are drawn from binned and summarised data (see chart_data.py) rather than every row, so they render in the same time at any data size.
 
-Usage: eda.py <file_path_in> <file_path_out>
+Usage: eda.py <file_path_in> <file_path_out> [--n_jobs=<n_jobs>] [--trace=<trace_file_path>] [--profile=<profile_dir>]
 
 Arguments:
-<file_path_in>  Name of cleaned .csv files to download that were preprocessed from the wrangle_data_py, must be within the /data directory.
+<file_path_in>  Directory of the cleaned data_train .parquet (or .csv) file that was preprocessed by wrangle_data.py, must be within the /data directory.
 <file_path_out> Name of directory for figures to be saved in, 'img' folder recommended.
 
+Options:
+--n_jobs=<n_jobs>          Number of charts rendered at the same time, each in a worker process that shares the loaded data [default: 1]
+--trace=<trace_file_path>  Append the time, CPU time, peak memory and rows of each chart to this JSON lines file (see instrument.py)
+--profile=<profile_dir>    Write a cProfile profile of each chart to this directory
+
 """
+import multiprocessing
 import os
-import pandas as pd
-import altair as alt
-import numpy as np
-import pandas_profiling as pandas_profiling
-import seaborn as sns
+import time
+from concurrent.futures import ProcessPoolExecutor
+
 from docopt import docopt
 
-opt = docopt(__doc__)
+from chart_data import boxplot_summary, histogram, null_fractions
+from correlation import CORRELATION_STATE_NAME, dataset_correlation
+from data_store import find_dataset, read_dataset
+from instrument import configure, stage
+
 
-def main(file_path_in, file_path_out):
+def main(file_path_in, file_path_out, n_jobs=1):
+    """
+    Renders the EDA charts of the training data in file_path_in to file_path_out.
 
+    Parameters
+    ----------
+    file_path_in
+        directory of the data_train file
+    file_path_out
+        directory to save the charts in
+    n_jobs
+        number of charts rendered at the same time, each in its own worker process
+
+    Returns
+    -------
+        dict of chart name to the seconds it took to render and save
+    """
     # import training dataset for plotting
     
-    data_train = pd.read_csv(f"{file_path_in}/data_train.csv", index_col=0)
-    
-    
-    #Checking to see the null values in the data set, to be preprocessed in the analysis
+    with stage("load_data") as current:
+        data_train = read_dataset(find_dataset(file_path_in, "data_train"))
+        current.rows_out = len(data_train)
+
+    # imported once here, so chart timings leave out the import and forked workers inherit the libraries
+    with stage("import_charting"):
+        import altair  # noqa: F401
+        import seaborn  # noqa: F401
+
+    if n_jobs <= 1:
+        timings = dict(render_chart(name, file_path_in, file_path_out, data_train) for name in CHARTS)
+    else:
+        timings = render_charts(data_train, file_path_in, file_path_out, n_jobs)
+
+    print(f"{'chart':<20}{'seconds':>8}")
+    for name, seconds in timings.items():
+        print(f"{name:<20}{seconds:>8.2f}")
+    return timings
+
+
+def heatmap_null(data_train, file_path_in, file_path_out):
+    import seaborn as sns
+
+    #Checking to see the null values in the data set, to be preprocessed in the analysis.
+    #Rows are binned into bands, each cell showing the share of missing values in its band
     
+    null_bands = null_fractions(data_train)
     heat_map= sns.set(rc= {'figure.figsize':(10, 9)})
-    heat_map = sns.heatmap(data_train.isnull(), cmap='viridis', cbar=False)
+    heat_map = sns.heatmap(null_bands, cmap='viridis', vmin=0, vmax=1, cbar_kws={'label': 'share missing'})
     heat_map.figure.savefig(f"{file_path_out}/heatmap_null.png")
-    
-    
-    
+
+
+def correlation_plot(data_train, file_path_in, file_path_out):
+    import altair as alt
+
     #Create correlation plot to look at features 
+    #The correlations are accumulated from the data set in chunks and saved, so after an
+    #incremental ingest only the new rows are read (see correlation.py)
     
-    vehicles_corr = data_train.corr().reset_index().rename(columns ={'index':'Var1'}).melt(id_vars = ['Var1'],
+    correlation = dataset_correlation(find_dataset(file_path_in, "data_train"),
+                                      f"{file_path_in}/{CORRELATION_STATE_NAME}")
+    vehicles_corr = correlation.reset_index().rename(columns ={'index':'Var1'}).melt(id_vars = ['Var1'],
                                                                                     value_name = 'Correlation',
                                                                                     var_name = 'Var2')
     base = alt.Chart(vehicles_corr).encode(
@@ -55,26 +107,30 @@ def main(file_path_in, file_path_out):
         width = 500, height = 500,
         title = "Pearson's correlation")
     total_heatmap.save(f"{file_path_out}/correlation_plot.png")
-    
-    
+
+
+def age_dist(data_train, file_path_in, file_path_out):
+    import altair as alt
+
     #Distribution of Age of horses
     
-    age_dist= alt.Chart(data_train).mark_bar().encode(
-        alt.X("age", bin=True),
-        y='count()', ).properties(
+    age_dist= alt.Chart(histogram(data_train["age"])).mark_bar().encode(
+        alt.X("bin_start:Q", bin="binned", title="age (binned)"),
+        alt.X2("bin_end:Q"),
+        alt.Y("count:Q", title="Count of Records")).properties(
         title= 'Distribution of Age')
     
     age_dist.save(f"{file_path_out}/age_dist.png")
 
-    
+
+def country_dist(data_train, file_path_in, file_path_out):
     # Country where horses are from distribution plot
     
     #remove null values
     data_train = data_train[~data_train['country'].isnull()]
 
-    country_dist= alt.Chart(data_train).mark_boxplot().encode(
-        x=alt.X('country:N', title = "Country"),
-        y=alt.Y('plc:Q', title = "Placement")
+    country_dist= boxplot_chart(*boxplot_summary(data_train, 'country', 'plc'), 'country', 'plc',
+                                category_title="Country", value_title="Placement"
         ).properties(height=300, width= 500, 
                      title="Distribution of numerical placement values of horses by Country"
                     ).configure_axis(titleFontSize=15, labelFontSize=15
@@ -82,29 +138,109 @@ def main(file_path_in, file_path_out):
     
     country_dist.save(f"{file_path_out}/country_dist.png")
 
+
+def weight_dist(data_train, file_path_in, file_path_out):
+    #Horse Weight Distribution plot, of the horses with a country as in country_dist
     
-    #Horse Weight Distribution plot
-    
-    weight_dist = alt.Chart(data_train).mark_boxplot().encode(
-        x=alt.X('declarwt:Q', scale=alt.Scale(zero=False), title="Weight"),
-        y=alt.Y('plc:N', title="Placement")
+    data_train = data_train[~data_train['country'].isnull()]
+
+    weight_dist = boxplot_chart(*boxplot_summary(data_train, 'plc', 'declarwt'), 'plc', 'declarwt',
+                                category_title="Placement", value_title="Weight", horizontal=True, zero=False
         ).properties(height=750, width= 500, title="Distribution of all placement values of horses by weight"
         ).configure_axis(titleFontSize=15, labelFontSize=15
     ).configure_title(fontSize=16)
     
     weight_dist.save(f"{file_path_out}/weight_dist.png")
 
+
+# chart name to the function that renders it from the training data (or its directory) and saves it as <name>.png
+CHARTS = {"heatmap_null": heatmap_null, "correlation_plot": correlation_plot, "age_dist": age_dist,
+          "country_dist": country_dist, "weight_dist": weight_dist}
+
+# the training data in a worker process, set before the pool starts (inherited on fork)
+# or by load_shared_data() in each worker
+shared_data = None
+
+
+def load_shared_data(file_path_in):
+    global shared_data
+    if shared_data is None:
+        shared_data = read_dataset(find_dataset(file_path_in, "data_train"))
+
+
+def render_chart(name, file_path_in, file_path_out, data_train=None):
+    """
+    Renders and saves one chart, from data_train or the worker's shared data.
+    Returns the chart name and the seconds it took.
+    """
+    data_train = shared_data if data_train is None else data_train
+    start = time.perf_counter()
+    with stage(name, rows_in=len(data_train)):
+        CHARTS[name](data_train, file_path_in, file_path_out)
+    return name, time.perf_counter() - start
+
+
+def render_charts(data_train, file_path_in, file_path_out, n_jobs):
+    """
+    Renders the charts in a pool of n_jobs worker processes, without sending the data to them.
+
+    Where processes fork (Linux), the workers share the parent's copy of data_train
+    read-only, copy on write. Elsewhere each worker reads the data set once when it
+    starts. Only chart names and timings pass between the processes.
+
+    Returns
+    -------
+        dict of chart name to the seconds it took, in CHARTS order
+    """
+    global shared_data
+    fork = "fork" in multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if fork else None)
+    shared_data = data_train if fork else None
+    try:
+        with ProcessPoolExecutor(max_workers=min(n_jobs, len(CHARTS)), mp_context=context,
+                                 initializer=load_shared_data, initargs=(file_path_in,)) as pool:
+            timings = dict(pool.map(render_chart, CHARTS, [file_path_in] * len(CHARTS), [file_path_out] * len(CHARTS)))
+    finally:
+        shared_data = None
+    return timings
+
+
+def boxplot_chart(summary, outliers, category, value, category_title, value_title, horizontal=False, zero=True):
+    """
+    Draws boxplots from a summary made by chart_data.boxplot_summary(), in the style
+    of Altair's mark_boxplot(): whiskers, interquartile box, median tick and outliers.
+    Categories go on the x axis, or on the y axis if horizontal.
+    """
+    import altair as alt
+
+    Value, Value2, Category = (alt.X, alt.X2, alt.Y) if horizontal else (alt.Y, alt.Y2, alt.X)
+    scale = alt.Scale(zero=zero)
+    base = alt.Chart(summary).encode(Category(f"{category}:N", title=category_title))
+    whiskers = base.mark_rule().encode(Value("lower:Q", scale=scale, title=value_title), Value2("upper:Q"))
+    boxes = base.mark_bar(size=14).encode(Value("q1:Q", scale=scale), Value2("q3:Q"))
+    medians = base.mark_tick(color="white", size=14).encode(Value("median:Q", scale=scale))
+    points = alt.Chart(outliers).mark_point().encode(Category(f"{category}:N"), Value(f"{value}:Q", scale=scale))
+    return alt.layer(whiskers, boxes, medians, points)
+
 #test
-def path_validation():
-    if (os.path.exists(opt["<file_path_in>"])) and (os.path.exists(opt["<file_path_out>"])):
+def path_validation(file_path_in, file_path_out):
+    if (os.path.exists(file_path_in)) and (os.path.exists(file_path_out)):
         pass
     else:
         raise ValueError("File paths do not exist")
 
-path_validation()
-    
+def cli(argv=None):
+    """
+    Runs the script with command line arguments (sys.argv[1:] if argv is None).
+    """
+    opt = docopt(__doc__, argv=argv)
+    path_validation(opt["<file_path_in>"], opt["<file_path_out>"])
+    configure(opt["--trace"], opt["--profile"], script="eda")
+    with stage("eda"):
+        main(opt["<file_path_in>"], opt["<file_path_out>"], int(opt["--n_jobs"]))
+
 # script entry point
 if __name__ == '__main__':
-    main(opt["<file_path_in>"], opt["<file_path_out>"])
+    cli()
 
 
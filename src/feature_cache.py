@@ -0,0 +1,123 @@
+"""Content-addressed on-disk cache for fitted preprocessing and transformed matrices.
+
+Entries are keyed by a hash of the input data and of the configuration that
+produced them, so a stage that needs the same features as an earlier one (e.g.
+linear_model.py after grid_search.py) loads them instead of refitting. The cache
+is bounded in size and evicts the least recently used entries first.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+
+import pandas as pd
+import sklearn
+from joblib import dump, load
+
+DEFAULT_MAX_BYTES = 2 * 2**30
+
+
+def hash_data(data):
+    """
+    Hashes the contents, column names and dtypes of a data frame.
+
+    Parameters
+    ----------
+    data
+        a Pandas DataFrame
+
+    Returns
+    -------
+        hex digest string
+    """
+    digest = hashlib.sha256()
+    digest.update(pd.util.hash_pandas_object(data, index=True).to_numpy().tobytes())
+    digest.update(json.dumps([[str(c), str(t)] for c, t in data.dtypes.items()]).encode())
+    return digest.hexdigest()
+
+
+def cache_key(*parts):
+    """
+    Combines data hashes and configuration into a cache key. The installed
+    scikit-learn version is always included, since fitted objects do not carry
+    across versions.
+
+    Parameters
+    ----------
+    parts
+        JSON-serializable values (hashes, parameter dicts, ...)
+
+    Returns
+    -------
+        hex digest string
+    """
+    payload = json.dumps([sklearn.__version__, *parts], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class FeatureCache:
+    """
+    Directory of joblib files named by cache key, evicted least recently used
+    first once their total size exceeds max_bytes.
+    """
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.joblib")
+
+    def get(self, key):
+        """
+        Returns the cached value for key, or None. Arrays are memory-mapped read-only,
+        so even large matrices load in milliseconds.
+        """
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        # the modification time doubles as the last access time for eviction
+        os.utime(path)
+        return load(path, mmap_mode="r")
+
+    def put(self, key, value):
+        """
+        Stores value under key, then evicts old entries to stay within max_bytes.
+        """
+        handle, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        os.close(handle)
+        dump(value, tmp_path)
+        os.replace(tmp_path, self._path(key))
+        self.evict(keep=key)
+
+    def evict(self, keep=None):
+        """
+        Deletes least recently used entries until the cache fits in max_bytes.
+        The entry named by keep is never deleted.
+        """
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".joblib"):
+                stat = os.stat(os.path.join(self.cache_dir, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if name == f"{keep}.joblib":
+                continue
+            os.remove(os.path.join(self.cache_dir, name))
+            total -= size
+
+    def get_or_compute(self, key, compute):
+        """
+        Returns the cached value for key, computing and storing it with compute() on a miss.
+        """
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
@@ -0,0 +1,194 @@
+"""Concurrent, resumable download of the raw data files.
+
+Files are streamed to disk as they arrive, without parsing. Each file is first
+written to <name>.part and renamed once complete, so an interrupted download is
+resumed with an HTTP Range request on the next run. A manifest next to the files
+records each file's ETag, Last-Modified and SHA-256; files whose local copy still
+matches its checksum are requested conditionally and skipped if the server
+reports them unchanged. Only the standard library is used, and the base URL can
+be any HTTP server (e.g. a local stand-in for testing).
+"""
+
+import hashlib
+import http.client
+import json
+import os
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+MANIFEST_NAME = ".download_manifest.json"
+CHUNK_SIZE = 1 << 20
+# HTTP statuses worth retrying; other client errors fail immediately
+RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+
+
+def file_sha256(path):
+    """
+    Returns the hex SHA-256 digest of a file, read in chunks.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class Fetcher:
+    """
+    Downloads files from a base URL into a directory, keeping a manifest of what
+    was fetched.
+
+    Parameters
+    ----------
+    url
+        base URL; file <name> is fetched from <url>/<name>
+    file_path
+        directory to write the files and the manifest to
+    retries
+        attempts after the first for each file, on connection errors and 408/429/5xx
+    backoff
+        seconds before the first retry, doubled (with jitter) for each further retry
+    timeout
+        socket timeout in seconds
+    """
+
+    def __init__(self, url, file_path, retries=4, backoff=1.0, timeout=60):
+        self.url = url.rstrip("/")
+        self.file_path = file_path
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.manifest_path = os.path.join(file_path, MANIFEST_NAME)
+        self.manifest = self._load_manifest()
+        self._lock = threading.Lock()
+
+    def _load_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {}
+        with open(self.manifest_path) as f:
+            return json.load(f)
+
+    def _update_manifest(self, name, entry):
+        with self._lock:
+            self.manifest[name] = entry
+            tmp_path = f"{self.manifest_path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.manifest, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.manifest_path)
+
+    def fetch_all(self, names, n_jobs=5, force=False):
+        """
+        Fetches several files concurrently.
+
+        Parameters
+        ----------
+        names
+            file names to fetch
+        n_jobs
+            number of concurrent downloads
+        force
+            download every file even if the local copy is unchanged
+
+        Returns
+        -------
+            dict of file name to status: "downloaded", "resumed" or "unchanged"
+        """
+        with ThreadPoolExecutor(max_workers=max(1, min(n_jobs, len(names)))) as pool:
+            statuses = pool.map(lambda name: self.fetch(name, force), names)
+            return dict(zip(names, statuses))
+
+    def fetch(self, name, force=False):
+        """
+        Fetches one file, retrying with exponential backoff. A partial download left by
+        a failed attempt (or an earlier run) is resumed rather than restarted.
+
+        Returns
+        -------
+            "downloaded", "resumed" or "unchanged"
+        """
+        for attempt in range(self.retries + 1):
+            try:
+                return self._fetch_once(name, force)
+            except urllib.error.HTTPError as e:
+                if e.code not in RETRY_STATUSES or attempt == self.retries:
+                    raise
+            except (urllib.error.URLError, http.client.HTTPException, OSError):
+                if attempt == self.retries:
+                    raise
+            time.sleep(self.backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+
+    def _fetch_once(self, name, force):
+        dest = os.path.join(self.file_path, name)
+        part = f"{dest}.part"
+        entry = self.manifest.get(name, {})
+        headers = {}
+
+        # conditional request if the local copy is still the one recorded in the manifest
+        local_valid = not force and os.path.exists(dest) and entry.get("sha256") == file_sha256(dest)
+        if local_valid:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        # resume a partial download, as long as the remote file has not changed since (If-Range)
+        partial = entry.get("partial", {})
+        offset = os.path.getsize(part) if os.path.exists(part) else 0
+        validator = partial.get("etag") or partial.get("last_modified")
+        if offset and validator:
+            headers["Range"] = f"bytes={offset}-"
+            headers["If-Range"] = validator
+        else:
+            offset = 0
+
+        request = urllib.request.Request(f"{self.url}/{name}", headers=headers)
+        try:
+            response = urllib.request.urlopen(request, timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                return "unchanged"
+            if e.code == 416:
+                # the partial file is not a prefix of the remote file; start over
+                os.remove(part)
+                self._update_manifest(name, {k: v for k, v in entry.items() if k != "partial"})
+                return self._fetch_once(name, force)
+            raise
+
+        with response:
+            resumed = response.status == 206
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+            length = response.headers.get("Content-Length")
+            # servers that ignore conditional requests still send the same validators
+            if local_valid and not resumed and ((etag and etag == entry.get("etag")) or
+                                                (last_modified and last_modified == entry.get("last_modified"))):
+                return "unchanged"
+            expected_size = offset + int(length) if resumed and length else int(length) if length else None
+
+            entry = {k: v for k, v in entry.items() if k != "partial"}
+            entry["partial"] = {"etag": etag, "last_modified": last_modified}
+            self._update_manifest(name, entry)
+
+            digest = hashlib.sha256()
+            if resumed:
+                with open(part, "rb") as f:
+                    for block in iter(lambda: f.read(CHUNK_SIZE), b""):
+                        digest.update(block)
+            with open(part, "ab" if resumed else "wb") as f:
+                for block in iter(lambda: response.read(CHUNK_SIZE), b""):
+                    f.write(block)
+                    digest.update(block)
+
+        size = os.path.getsize(part)
+        if expected_size is not None and size != expected_size:
+            # keep the partial file; the retry resumes from it
+            raise ConnectionError(f"{name}: got {size} of {expected_size} bytes")
+
+        os.replace(part, dest)
+        self._update_manifest(name, {"url": f"{self.url}/{name}", "etag": etag, "last_modified": last_modified,
+                                     "sha256": digest.hexdigest(), "size": size})
+        return "resumed" if resumed else "downloaded"
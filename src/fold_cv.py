@@ -0,0 +1,158 @@
+"""Cross-validation folds and fold-local preprocessing for grid_search.py.
+
+By default the preprocessing (imputer means, standardization, one-hot categories)
+is fitted once on all training rows and the folds are cut from the transformed
+matrix, so each validation fold has already contributed to the statistics it is
+transformed with. With fold-local preprocessing, the preprocessing is fitted on
+each training fold only and the validation fold transformed with it. That is one
+fit per fold and degree, not per candidate: every number of features of a degree
+is scored from the same fold matrices and the same RFE elimination path (see
+rfe_path.py). With a feature cache the fold matrices are kept on disk too, so
+later searches over the same rows and folds (a resumed or extended grid, or
+another engine) load them instead of refitting.
+
+Folds are either KFold's folds of the shuffled rows, as rfe_path_search() uses by
+default (see rfe_path.shuffled_kfold()), or time ordered: each validation fold is a later span of race
+dates than all of its training rows, as when the model is deployed on races
+after the ones it was fitted on.
+"""
+
+
+import numpy as np
+from joblib import Parallel, delayed, effective_n_jobs
+from sklearn.model_selection import TimeSeriesSplit
+
+from checkpoint import FoldCells
+from instrument import stage
+from preprocessing import DEFAULT_DEGREE, fit_preprocessor, transform_features
+from rfe_path import score_path, shuffled_kfold
+
+SPLITS = ["kfold", "time"]
+# column the time-ordered split orders rows by
+DATE_COLUMN = "date"
+
+
+def cv_folds(n_rows, cv=5, split="kfold", dates=None):
+    """
+    Splits rows into cross-validation folds.
+
+    Arguments:
+    ----------
+    n_rows
+        (int) - number of rows
+    cv
+        (int) - number of folds
+    split
+        (str) - "kfold" for KFold(cv) over the shuffled rows, or "time" for TimeSeriesSplit(cv)
+        over the distinct dates: fold i validates on the (i + 1)-th span of dates and
+        trains on every row before it, so rows of one date are never split
+    dates
+        (array-like) - the date of each row, for split="time"
+
+    Returns:
+    --------
+    list of (train_idx, val_idx) pairs of sorted row positions
+    """
+    assert split in SPLITS, f"split must be one of {SPLITS}"
+
+    if split == "kfold":
+        return list(shuffled_kfold(cv).split(np.zeros((n_rows, 1))))
+
+    assert dates is not None and len(dates) == n_rows, "The time-ordered split needs the date of every row"
+    days, day_of_row = np.unique(np.asarray(dates), return_inverse=True)
+    assert len(days) > cv, f"The time-ordered split needs more than {cv} distinct dates"
+    return [(np.flatnonzero(day_of_row <= train_days[-1]),
+             np.flatnonzero((day_of_row >= val_days[0]) & (day_of_row <= val_days[-1])))
+            for train_days, val_days in TimeSeriesSplit(cv).split(days)]
+
+
+def fold_matrices(X, train_idx, val_idx, degree=DEFAULT_DEGREE, cache=None, dtype="float64", sparse=False,
+                  standardize=False):
+    """
+    Fits the preprocessing on the training rows of a fold and transforms both sides.
+
+    Arguments:
+    ----------
+    X
+        (pd.DataFrame) - training features
+    train_idx, val_idx
+        (np.array) - row positions of the fold
+    degree, cache, dtype, sparse, standardize
+        - as for preprocessing.fit_preprocessor(). The cache keys the fold matrices by
+        the rows' contents, so the same fold of the same data is only fitted once
+
+    Returns:
+    --------
+    X_fold_train, X_fold_val
+        preprocessed training and validation features
+    """
+    full_pipeline, X_fold_train, fit_key = fit_preprocessor(X.iloc[train_idx], degree, cache=cache, dtype=dtype,
+                                                            sparse=sparse, standardize=standardize)
+    return X_fold_train, transform_features(full_pipeline, X.iloc[val_idx], fit_key, cache=cache)
+
+
+def score_local_fold(X, y, train_idx, val_idx, n_features_grid, degree, engine, fold=None, cache=None,
+                     dtype="float64", sparse=False, standardize=False):
+    """
+    Preprocesses one fold on its training rows, runs the elimination path and scores
+    every grid size on the validation rows. Returns the same as rfe_path.score_fold().
+    """
+    with stage("cv_fold", rows_in=len(train_idx), fold=fold, engine=engine, degree=degree,
+               preprocessing="fold") as current:
+        X_fold_train, X_fold_val = fold_matrices(X, train_idx, val_idx, degree, cache, dtype, sparse, standardize)
+        # a training fold can miss rare categories; a grid size above its columns keeps them all
+        n_features = np.minimum(n_features_grid, X_fold_train.shape[1])
+        test_scores, fit_times = score_path(X_fold_train, y[train_idx], X_fold_val, y[val_idx], n_features, engine)
+        current.rows_out = len(val_idx)
+
+    return test_scores, fit_times, current.peak_rss
+
+
+def fold_local_search(X, y, n_features_grid, folds, degree=DEFAULT_DEGREE, engine="sklearn", n_jobs=1, cache=None,
+                      dtype="float64", sparse=False, standardize=False, checkpoint=None, checkpoint_key=None):
+    """
+    Cross-validated scores of RFE with linear regression for every number of features
+    in n_features_grid, with the preprocessing fitted on each training fold.
+
+    Arguments:
+    ----------
+    X
+        (pd.DataFrame) - training features
+    y
+        (np.array) - targets
+    n_features_grid
+        (list of int) - numbers of features to select
+    folds
+        (list of (train_idx, val_idx)) - cross-validation folds, see cv_folds()
+    degree, cache, dtype, sparse, standardize
+        - preprocessing, see fold_matrices()
+    engine
+        (str) - elimination engine, see rfe_path.elimination_ranking()
+    n_jobs
+        (int) - number of worker processes, each preprocessing and scoring whole folds
+    checkpoint, checkpoint_key
+        - where to record and look up the scores of each cell, see rfe_path.rfe_path_search()
+
+    Returns:
+    --------
+    dict with arrays "mean_test_score" and "mean_fit_time", aligned with
+    n_features_grid, and "peak_rss", as rfe_path.rfe_path_search() returns
+    """
+    y = np.asarray(y)
+    cells = FoldCells(len(folds), n_features_grid, checkpoint, checkpoint_key)
+    jobs = cells.pending()
+    score = delayed(score_local_fold) if n_jobs != 1 else score_local_fold
+    tasks = (score(X, y, *folds[fold], np.asarray(grid), degree, engine, fold, cache, dtype, sparse, standardize)
+             for fold, grid in jobs)
+    results = tasks if n_jobs == 1 else \
+        Parallel(n_jobs=min(effective_n_jobs(n_jobs), max(len(jobs), 1)), return_as="generator")(tasks)
+
+    peak_rss = [0]
+    for (fold, grid), (test_scores, fit_times, rss) in zip(jobs, results):
+        cells.record(fold, grid, test_scores, fit_times)
+        peak_rss.append(rss)
+
+    mean_test_score, mean_fit_time = cells.results()
+    return {"mean_test_score": mean_test_score,
+            "mean_fit_time": mean_fit_time,
+            "peak_rss": max(peak_rss)}
@@ -0,0 +1,176 @@
+"""Centered Gram statistics of linear regression problems, for regularized.py and stream_fit.py.
+
+The ridge, lasso and elastic net paths only need X'X, X'y and y'y of the mean-centered
+columns. They are accumulated here in float64 from blocks of rows, or from chunks of a
+data set streamed from disk, so no centered or float64 copy of the design matrix is
+made. gram_factor() turns them into the upper triangular Cholesky factor of the
+augmented, column-scaled Gram matrix
+
+    [X y]^T [X y] = R_aug^T R_aug,    R_aug = [[R, z], [0, rho]]
+
+which has the same least squares objective as the n x p design matrix.
+"""
+
+import numpy as np
+from scipy.linalg import cho_factor
+
+# ridge term added to the unit diagonal of the scaled Gram matrix
+DEFAULT_RIDGE = 1e-12
+# rows of the design matrix converted to float64 at a time
+GRAM_BLOCK_ROWS = 16384
+
+
+def row_blocks(X, rows=None, block_rows=GRAM_BLOCK_ROWS):
+    """
+    Yields the rows of X (or the given rows of X) in consecutive blocks, each as a
+    dense float64 array. Only one block is converted at a time.
+    """
+    n_rows = X.shape[0] if rows is None else len(rows)
+    for start in range(0, n_rows, block_rows):
+        block = X[start:start + block_rows] if rows is None else X[rows[start:start + block_rows]]
+        if hasattr(block, "toarray"):
+            block = block.toarray()
+        yield start, np.asarray(block, dtype="float64")
+
+
+def accumulate_statistics(X, y, rows=None):
+    """
+    Accumulates the centered Gram statistics and column means of X in one pass over
+    blocks of rows. The blocks are centered on the means of the first block and the
+    result corrected to the overall means, which keeps the sums from cancelling.
+
+    Returns:
+    --------
+    XtX, Xty, yty, X_mean
+        see gram_statistics(), and the float64 column means of the rows used
+    """
+    y = np.asarray(y, dtype="float64")
+    y_centered = y - y.mean()
+
+    p = X.shape[1]
+    XtX, Xty, total = np.zeros((p, p)), np.zeros(p), np.zeros(p)
+    shift = None
+    for start, block in row_blocks(X, rows):
+        if shift is None:
+            shift = block.mean(axis=0)
+        # a block of a float64 array may be a view of X, so it is not shifted in place
+        block = block - shift
+        total += block.sum(axis=0)
+        XtX += block.T @ block
+        Xty += block.T @ y_centered[start:start + len(block)]
+
+    offset = total / len(y)
+    XtX -= len(y) * np.outer(offset, offset)
+    return XtX, Xty, float(y_centered @ y_centered), shift + offset
+
+
+def gram_statistics(X, y, rows=None):
+    """
+    Computes the centered Gram statistics needed for linear regression with an intercept.
+    The statistics are accumulated in float64 from blocks of rows, so X may be float32
+    or sparse, and neither a centered nor a float64 copy of X (or of its rows) is made.
+
+    Arguments:
+    ----------
+    X
+        (np.array or sparse matrix) - design matrix
+    y
+        (np.array) - targets, one per row of X (or per row in rows)
+    rows
+        (np.array) - row indices of X to use, e.g. a training fold; all rows if None
+
+    Returns:
+    --------
+    XtX, Xty, yty
+        (np.array, np.array, float) - cross products of the mean-centered columns
+        and targets
+    """
+    return accumulate_statistics(X, y, rows)[:3]
+
+
+class GramAccumulator:
+    """
+    Centered Gram statistics of a regression problem, accumulated from chunks of
+    rows so the design matrix never has to be held at once. Accumulators of
+    separate chunks (e.g. cross-validation folds) merge exactly, centering on the
+    combined means.
+    """
+
+    def __init__(self, n_columns):
+        self.count = 0
+        self.X_mean = np.zeros(n_columns)
+        self.y_mean = 0.0
+        self.XtX = np.zeros((n_columns, n_columns))
+        self.Xty = np.zeros(n_columns)
+        self.yty = 0.0
+
+    def update(self, X, y):
+        """
+        Adds the rows of a chunk of the design matrix (np.array or sparse) and their targets.
+        """
+        y = np.asarray(y, dtype="float64")
+        if len(y) == 0:
+            return self
+        chunk = GramAccumulator(X.shape[1])
+        chunk.XtX, chunk.Xty, chunk.yty, chunk.X_mean = accumulate_statistics(X, y)
+        chunk.count, chunk.y_mean = len(y), y.mean()
+        return self.merge(chunk)
+
+    def merge(self, other):
+        """
+        Adds the statistics of another accumulator, leaving it unchanged.
+        """
+        if other.count == 0:
+            return self
+        count = self.count + other.count
+        weight = self.count * other.count / count
+        dx, dy = other.X_mean - self.X_mean, other.y_mean - self.y_mean
+
+        self.XtX = self.XtX + other.XtX + weight * np.outer(dx, dx)
+        self.Xty = self.Xty + other.Xty + weight * dx * dy
+        self.yty = self.yty + other.yty + weight * dy * dy
+        self.X_mean = self.X_mean + dx * other.count / count
+        self.y_mean = self.y_mean + dy * other.count / count
+        self.count = count
+        return self
+
+    def statistics(self):
+        """
+        Returns XtX, Xty and yty, as gram_statistics() does.
+        """
+        return self.XtX, self.Xty, self.yty
+
+
+def gram_factor(XtX, Xty, yty, ridge=DEFAULT_RIDGE):
+    """
+    Factorizes the augmented, column-scaled Gram matrix of a regression problem.
+
+    Arguments:
+    ----------
+    XtX, Xty, yty
+        (np.array, np.array, float) - centered Gram statistics (see gram_statistics())
+    ridge
+        (float) - ridge term added to the unit diagonal of the scaled Gram matrix
+
+    Returns:
+    --------
+    R_aug, scale
+        (np.array, np.array) - upper triangular (p+1) x (p+1) factor, and the column
+        scale factors such that coefficients = (R^-1 z) / scale
+    """
+    p = XtX.shape[0]
+    scale = np.sqrt(np.diag(XtX))
+    # constant columns carry no information; leave them unscaled so they solve to 0
+    scale[scale == 0] = 1.0
+
+    gram = np.empty((p + 1, p + 1))
+    gram[:p, :p] = XtX / np.outer(scale, scale)
+    gram[:p, p] = gram[p, :p] = Xty / scale
+    gram[p, p] = yty
+    gram[np.arange(p), np.arange(p)] += ridge
+    # keep the augmented matrix positive definite when y is fit exactly
+    gram[p, p] += ridge * max(yty, 1.0)
+
+    R_aug, _ = cho_factor(gram, lower=False)
+    return np.triu(R_aug), scale
+
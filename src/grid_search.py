@@ -2,36 +2,80 @@
 # date: 2020-01-25
 #
 
-"""This script runs a grid search over number of features to select using linear
-regression and recursive feature elimination. It then outputs the results as a .csv
-in the desired directory.
+"""This script runs a grid search over number of features to select (and the degree of
+the polynomial features) using linear regression and recursive feature elimination.
+It then outputs the results as a .csv in the desired directory. With --search=halving,
+candidates are scored on stratified subsamples first and only the best of them on
+all rows (see halving_search.py). With --model=ridge, lasso or elasticnet, the
+features are shrunk instead of eliminated, and the search is over the penalty alpha
+(see regularized.py).
 
-Usage: grid_search.py <training_data_file_path> <gridsearch_results_file_path>
+Usage: grid_search.py <training_data_file_path> <gridsearch_results_file_path> [--n_features=<n_features>] [--degrees=<degrees>] [--search=<search>] [--eta=<eta>] [--min_rows=<min_rows>] [--model=<model>] [--alphas=<alphas>] [--l1_ratio=<l1_ratio>] [--split=<split>] [--fold_preprocessing] [--checkpoint=<checkpoint_file_path>] [--resume] [--fresh] [--engine=<engine>] [--n_jobs=<n_jobs>] [--cache_dir=<cache_dir>] [--dtype=<dtype>] [--sparse] [--standardize] [--trace=<trace_file_path>] [--profile=<profile_dir>]
 
 Arguments:
 <training_data_file_path>            File path where training data is stored
 <gridsearch_results_file_path>       File path to save table of grid search results
+
+Options:
+--n_features=<n_features>            Numbers of features to select: comma separated values and
+                                     ranges (e.g. "10,12,20-30"), or "all" [default: 10,12,15,18,20,22,25,28,30]
+--degrees=<degrees>                  Degrees of the polynomial features: comma separated values and
+                                     ranges (e.g. "2-6") [default: 5]
+--search=<search>                    "grid" to score every candidate on all rows, or "halving" for
+                                     successive halving on stratified subsamples [default: grid]
+--eta=<eta>                          Halving: keep the best 1/eta of the candidates at each rung, and
+                                     score them on eta times as many rows [default: 3]
+--min_rows=<min_rows>                Halving: least number of rows of the first rung [default: 2000]
+--model=<model>                      "linear" (RFE and linear regression), or "ridge", "lasso" or
+                                     "elasticnet" on all features, scored for every alpha from one
+                                     regularization path per degree and fold [default: linear]
+--alphas=<alphas>                    Regularized models: penalties, comma separated values or
+                                     "low:high:count" for count values from 10**low to 10**high
+                                     [default: -6:1:50]
+--l1_ratio=<l1_ratio>                Elastic net: share of the penalty on the l1 norm [default: 0.5]
+--split=<split>                      Cross-validation folds: "kfold" (KFold over the shuffled rows) or
+                                     "time" (each fold validates on later race dates than it trains on)
+                                     [default: kfold]
+--fold_preprocessing                 Fit the preprocessing on each training fold, not on all training rows
+                                     (see fold_cv.py)
+--checkpoint=<checkpoint_file_path>  Record the score and fit time of each (candidate, fold) in this JSON
+                                     lines file as soon as its fold finishes (see checkpoint.py)
+--resume                             Keep the scores already in the checkpoint file and only run the
+                                     folds with candidates still to score, e.g. after the run was killed
+                                     or with a wider grid
+--fresh                              Start the checkpoint file afresh even if it already holds scores
+--engine=<engine>                    Feature elimination engine: "sklearn" (sklearn's RFE) [default: sklearn]
+--n_jobs=<n_jobs>                    Number of worker processes for cross-validation folds
+                                     (use -1 for one per core). Each worker scores whole folds,
+                                     so at most 5 run at a time [default: 1]
+--cache_dir=<cache_dir>              Directory for cached fitted preprocessing and feature matrices
+--dtype=<dtype>                      Feature matrix dtype, "float64" or "float32" (float32 standardizes
+                                     the numeric features, see preprocessing.py) [default: float64]
+--sparse                             Keep the feature matrix sparse (scipy CSR)
+--standardize                        Standardize the numeric features before the polynomial expansion
+--trace=<trace_file_path>            Append the time, CPU time, peak memory and rows of each stage
+                                     (including each CV fold) to this JSON lines file (see instrument.py)
+--profile=<profile_dir>              Write a cProfile profile of each stage to this directory
 """
 from docopt import docopt
 
 import pandas as pd
 import numpy as np
 
-from sklearn.pipeline import Pipeline, FeatureUnion
-from sklearn.preprocessing import OneHotEncoder, PolynomialFeatures
-import re
-from sklearn.impute import SimpleImputer
-from sklearn.compose import ColumnTransformer
-
-from sklearn.model_selection import GridSearchCV, train_test_split
-from sklearn.feature_selection import RFE
-from sklearn.linear_model import LinearRegression
+from checkpoint import SearchCheckpoint
+from feature_cache import FeatureCache
+from finishtime import load_model_data
+from fold_cv import DATE_COLUMN
+from halving_search import halving_search, score_candidates
+from instrument import configure, stage
+from preprocessing import fit_preprocessor, n_output_columns
+from regularized import DEFAULT_ALPHAS, DEFAULT_L1_RATIO, MODELS, parse_alphas, score_regularized
 
-import matplotlib.pyplot as plt
 
-opt = docopt(__doc__)
-
-def main(training_data_file_path, gridsearch_results_file_path):
+def main(training_data_file_path, gridsearch_results_file_path, n_features="10,12,15,18,20,22,25,28,30", engine="sklearn", n_jobs=1, cache_dir=None,
+         dtype="float64", sparse=False, standardize=False, degrees="5", search="grid", eta=3,
+         min_rows=2000, split="kfold", fold_preprocessing=False, checkpoint_file_path=None, resume=False, fresh=False,
+         model="linear", alphas=DEFAULT_ALPHAS, l1_ratio=DEFAULT_L1_RATIO):
     """
     Entry point for script. Takes in training_data_file_path and image_plot_file_path from commandline, 
     and runs a  gridsearch using recusrive feature elimination and linear regression.
@@ -39,166 +83,260 @@ def main(training_data_file_path, gridsearch_results_file_path):
     Arguments:
     ----------
     training_data_file_path 
-        - file path where training data is located. Assumes data is a .csv file in same
-        format as data/data_train.csv (output of download_data.py script)
+        - file path where training data is located. Assumes data is a .parquet or .csv
+        file in same format as data/data_train.parquet (output of wrangle_data.py script)
     gridsearch_results_file_path
         - file path where image of results plot will be saved
+    n_features
+        - numbers of features to select, as comma separated values and ranges, or "all"
+    engine
+        - feature elimination engine, "sklearn"
+    n_jobs
+        - number of worker processes for cross-validation folds
+    cache_dir
+        - directory of the feature cache (see feature_cache.py), or None to disable caching
+    dtype, sparse, standardize
+        - feature matrix mode (see preprocessing.build_preprocessor())
+    degrees
+        - degrees of the polynomial features, as comma separated values and ranges
+    search, eta, min_rows
+        - "grid" or "halving", and the halving settings (see halving_search.py)
+    split, fold_preprocessing
+        - cross-validation folds, "kfold" or "time", and whether to fit the preprocessing
+        on each training fold (see fold_cv.py)
+    checkpoint_file_path, resume, fresh
+        - file to record each (candidate, fold) score in, or None, whether to reuse
+        the scores already in it and whether to overwrite them (see checkpoint.py)
+    model, alphas, l1_ratio
+        - "linear" for RFE and linear regression, or a regularized model and its
+        penalties (see regularized.py)
 
     Returns:
     -------
         None, but saves a table to the specified file path
     """
-    grid_search(training_data_file_path, gridsearch_results_file_path)
+    grid_search(training_data_file_path, gridsearch_results_file_path, n_features, engine, n_jobs, cache_dir,
+                dtype, sparse, standardize, degrees, search, eta, min_rows, split, fold_preprocessing,
+                checkpoint_file_path, resume, fresh, model, alphas, l1_ratio)
 
-def time_parser(input_time):
+def parse_n_features(n_features, n_columns):
     """
-    Function which converts a time string of form mm.ss.SS to seconds
-    
+    Parses the --n_features option into a sorted list of feature counts.
+
     Arguments:
     ----------
-    input_time 
-        (str) - input time as string of form "d.dd.dd" where d is a digit
+    n_features
+        (str) - comma separated values and ranges such as "10,12,20-30", or "all"
+    n_columns
+        (int) - number of columns in the preprocessed design matrix
 
     Returns:
     --------
-    float representing input time in seconds
+    list of int
     """
-    assert re.match("\d\.\d{2}\.\d{2}", input_time), "Only strings of format d.dd.dd can be parsed"
+    if n_features == "all":
+        return list(range(1, n_columns + 1))
 
-    parsed_time = input_time.split(".")
-    mins = int(parsed_time[0])
-    secs = int(parsed_time[1])
-    ss = int(parsed_time[2])
-    
-    time_in_sec = mins*60.0 + secs + ss/100
-    return time_in_sec
+    grid = set()
+    for item in n_features.split(","):
+        if "-" in item:
+            low, high = item.split("-")
+            grid.update(range(int(low), int(high) + 1))
+        else:
+            grid.add(int(item))
+
+    assert all(1 <= k <= n_columns for k in grid), f"Number of features must be between 1 and {n_columns}"
+    return sorted(grid)
 
-def load_and_parse_data(training_data_file_path):
+def parse_degrees(degrees):
     """
-    Data loading and cleaning function. Converts finishtime column to seconds
-    and drops rows where finishtime is 0. 
+    Parses the --degrees option, comma separated values and ranges such as "2-6",
+    into a sorted list of polynomial degrees.
+    """
+    parsed = set()
+    for item in str(degrees).split(","):
+        low, _, high = item.partition("-")
+        parsed.update(range(int(low), int(high or low) + 1))
+
+    assert all(degree >= 1 for degree in parsed), "Degrees must be at least 1"
+    return sorted(parsed)
+
+def search_candidates(n_features, n_columns):
+    """
+    Lists the (degree, number of features) candidates of a search.
 
     Arguments:
     ----------
-    training_data_file_path 
-        - file path where training data is located. Assumes data is a .csv file in same
-        format as data/data_train.csv (output of download_data.py script)
+    n_features
+        (str) - numbers of features to select, see parse_n_features()
+    n_columns
+        (dict) - number of columns of the design matrix of each degree. Numbers of
+        features above the columns of a degree are not candidates for that degree
 
     Returns:
-    -------
-    X_train, y_train 
-        (np.array) - Cleaned training set
+    --------
+    pd.DataFrame with columns "degree" and "n_features_to_select"
     """
+    grid = parse_n_features(n_features, max(n_columns.values()))
+    return pd.DataFrame([(degree, k) for degree, columns in n_columns.items() for k in grid if k <= columns],
+                        columns=["degree", "n_features_to_select"])
 
-    training_data = pd.read_csv(training_data_file_path)
-
-    assert "finishtime" in training_data.columns, "Missing column 'finishtime'"
-
-    y_train = training_data["finishtime"]
-    #fill nans with "0.00.00"
-    y_train.fillna("0.00.00", inplace=True)       
-    #replace anything not of format d.dd.dd to "0.00.00" with time_parser function
-    y_train[~y_train.str.contains("\d\.\d{2}\.\d{2}")] = '0.00.00'
-    #  apply time_parser on all values
-    y_train = np.array(list(map(lambda x: time_parser(x), y_train)))
-    #replace target column with converted values
-    training_data["finishtime"] = y_train
-    #drop all rows where finishtime is 0.0
-    training_data = training_data[training_data["finishtime"] != 0.0]
-    X_train = training_data.drop("finishtime", axis=1)
-    y_train = training_data["finishtime"]
-
-    return X_train, y_train
-
-def data_preprocessing(training_data_file_path):
+def data_preprocessing(training_data_file_path, cache_dir=None, dtype="float64", sparse=False, standardize=False):
     """
     Data preprocessing for linear regression. Applies imputer (mean), 
     and polynomial order 5 tranformation to numeric features. Applies 
     imputer (fill with "not_specified" constant value) and one-hot encoding
-    to categorical features. Uses output of load_and_parse_data() function.
+    to categorical features. Uses output of finishtime.load_model_data() function.
 
     Arguments:
     ----------
     training_data_file_path 
-        - file path where training data is located. Assumes data is a .csv file in same
-        format as data/data_train.csv (output of download_data.py script)
+        - file path where training data is located. Assumes data is a .parquet or .csv
+        file in same format as data/data_train.parquet (output of wrangle_data.py script)
+    cache_dir
+        - directory of the feature cache (see feature_cache.py), or None to disable caching
+    dtype, sparse, standardize
+        - feature matrix mode (see preprocessing.build_preprocessor())
 
     Returns
     -------
     X_train_preprocessed, y_train
-        (np.array) - Preprocessed training features and targets
+        (np.array or sparse matrix, np.array) - Preprocessed training features and targets
     """
 
-    X_train, y_train = load_and_parse_data(training_data_file_path)
+    X_train, y_train = load_model_data(training_data_file_path)
 
-    assert all([x in X_train.columns for x in ["country", "dataset"]]), "Must have colums 'country', 'dataset'"
-    assert all([x in X_train.columns for x in ["declarwt", "age", "winodds", "stake", "distance"]]), "Must have colums 'declarwt', 'age', 'winodds', 'stake', 'distance'"
-    
-    #define preprocessor for numeric features
-    numeric_transformer = Pipeline(steps=[('imputer', SimpleImputer(strategy='mean')),
-                                          ('poly', PolynomialFeatures(degree=5))
-                                         ])
-
-    #define preprocessor for categorical features
-    categorical_transformer = Pipeline(steps=[('imputer', SimpleImputer(strategy='constant', fill_value="not_specified")),
-                                              ('one_hot_encoder',  OneHotEncoder())
-                                             ])
-
-    #combine numeric and categorical pipelines
-    categorical_features = ["country", "dataset"]
-    numeric_features = ["declarwt", "age", "winodds", "stake", "distance"]
-
-    preprocessing = ColumnTransformer(
-                                 transformers=[
-                                    ('num', numeric_transformer, numeric_features),
-                                    ('cat', categorical_transformer, categorical_features)
-                                              ])
-
-    #combine preprocessing and model fitting steps into one pipeline 
-    full_pipeline = Pipeline([
-        ('data_preprocessing', preprocessing),
-    ])
-
-    X_train_preprocessed = full_pipeline.fit_transform(X_train)
+    cache = FeatureCache(cache_dir) if cache_dir is not None else None
+    _, X_train_preprocessed, _ = fit_preprocessor(X_train, cache=cache, dtype=dtype, sparse=sparse, standardize=standardize)
     
     return X_train_preprocessed, y_train
 
-def grid_search(training_data_file_path, gridsearch_results_file_path):
+def grid_search(training_data_file_path, gridsearch_results_file_path, n_features="10,12,15,18,20,22,25,28,30", engine="sklearn", n_jobs=1, cache_dir=None,
+                dtype="float64", sparse=False, standardize=False, degrees="5", search="grid", eta=3,
+                min_rows=2000, split="kfold", fold_preprocessing=False, checkpoint_file_path=None, resume=False, fresh=False,
+                model="linear", alphas=DEFAULT_ALPHAS, l1_ratio=DEFAULT_L1_RATIO):
     """
     Function which performs grid search for number of features to select using RFE and linear regression.
+    The elimination path is computed once per fold and every grid value is scored from it
+    (see rfe_path.py), so the grid can be widened to every feature count at little extra cost.
 
     Arguments:
     ----------
     training_data_file_path 
-        - file path where training data is located. Assumes data is a .csv file in same
-        format as data/data_train.csv (output of download_data.py script)
+        - file path where training data is located. Assumes data is a .parquet or .csv
+        file in same format as data/data_train.parquet (output of wrangle_data.py script)
     gridsearch_results_file_path
         - file path where image of results plot will be saved
+    n_features
+        - numbers of features to select, as comma separated values and ranges, or "all"
+    engine
+        - feature elimination engine, "sklearn" (see rfe_path.py)
+    n_jobs
+        - number of worker processes for cross-validation folds, at most one per fold
+        (5). Workers share one memory-mapped copy of the preprocessed training data
+    cache_dir
+        - directory of the feature cache (see feature_cache.py), or None to disable caching
+    dtype, sparse, standardize
+        - feature matrix mode (see preprocessing.build_preprocessor())
+    degrees
+        - degrees of the polynomial features, as comma separated values and ranges
+    search
+        - "grid" to cross-validate every (degree, number of features) candidate on all
+        rows, or "halving" for successive halving (see halving_search.py)
+    eta, min_rows
+        - halving settings, see halving_search.halving_search()
+    split
+        - cross-validation folds: "kfold", KFold over the shuffled rows, or "time",
+        each validating on later race dates than its training rows (see fold_cv.cv_folds())
+    fold_preprocessing
+        - fit the preprocessing on each training fold, so validation rows do not inform
+        the imputer, scaler and encoder they are transformed with. One fit per fold and
+        degree is shared by all its candidates (see fold_cv.py)
+    checkpoint_file_path
+        - JSON lines file to append the score and fit time of each (candidate, fold) to as
+        soon as its fold finishes, or None
+    resume
+        - reuse the scores already in the checkpoint file, running only the folds with
+        candidates still to score; without it the file is started afresh
+    fresh
+        - overwrite a checkpoint file that already holds scores; without it (or resume)
+        such a file is refused rather than wiped
+    model
+        - "linear" for RFE and linear regression, or "ridge", "lasso" or "elasticnet" to
+        keep every feature and search over the penalty instead (see regularized.py). A
+        regularized model is scored for every alpha from one path per degree and fold,
+        with the exhaustive grid search; n_features, engine and the checkpoint do not apply
+    alphas
+        - penalties of the regularized models, see regularized.parse_alphas()
+    l1_ratio
+        - elastic net share of the penalty on the l1 norm
 
     Returns:
     -------
-        None, but saves a table to the specified file path
+        None, but saves a table to the specified file path. Its first row is the best
+        candidate; the degree column is last, after the columns linear_model.py and the
+        report read, followed for regularized models by the model, alpha and l1_ratio.
+        Their n_features_to_select is the mean number of nonzero coefficients. The last
+        columns record engine, dtype, sparse and standardize, which linear_model.py
+        reads back
     """
-
-    X_train_preprocessed, y_train = data_preprocessing(training_data_file_path)
-    
-    assert X_train_preprocessed.shape[0] > 30, "Training set must have at least 30 columns"
-
-    param_grid = [{
-    "n_features_to_select" : [10, 12, 15, 18, 20, 22, 25, 28, 30]
-    }]
-
-    gridsearch = GridSearchCV(RFE(LinearRegression()), param_grid=param_grid, cv=5, scoring="r2")
-    gridsearch.fit(X_train_preprocessed, y_train)
-    grid_search_results = pd.DataFrame({"n_features_to_select" : param_grid[0]["n_features_to_select"], 
-                                        "mean_val_score (r2)" : gridsearch.cv_results_["mean_test_score"],
-                                        "fit time per fold (s)" : gridsearch.cv_results_["mean_fit_time"]})
-    
+    assert search in ["grid", "halving"], 'search must be "grid" or "halving"'
+    assert model in MODELS, f"model must be one of {MODELS}"
+    degrees = parse_degrees(degrees)
+    columns = ["n_features_to_select", "mean_val_score (r2)", "fit time per fold (s)", "degree"]
+
+    if model != "linear":
+        assert search == "grid", "Regularized models score every alpha from one path, with the exhaustive grid search"
+        assert checkpoint_file_path is None, "Regularized models are not checkpointed"
+        X_train, y_train = load_model_data(training_data_file_path, [DATE_COLUMN] if split == "time" else [])
+        dates = X_train.pop(DATE_COLUMN).to_numpy() if split == "time" else None
+        assert len(y_train) > 30, "Training set must have at least 30 rows"
+        cache = FeatureCache(cache_dir) if cache_dir is not None else None
+        grid_search_results = score_regularized(X_train, y_train, degrees, model, parse_alphas(alphas), l1_ratio,
+                                                cv=5, split=split, dates=dates,
+                                                fold_preprocessing=fold_preprocessing, n_jobs=n_jobs, cache=cache,
+                                                dtype=dtype, sparse=sparse, standardize=standardize)
+        columns = columns + ["model", "alpha", "l1_ratio"]
+    else:
+        X_train, y_train = load_model_data(training_data_file_path, [DATE_COLUMN] if split == "time" else [])
+        dates = X_train.pop(DATE_COLUMN).to_numpy() if split == "time" else None
+        assert len(y_train) > 30, "Training set must have at least 30 rows"
+        candidates = search_candidates(n_features, {degree: n_output_columns(X_train, degree) for degree in degrees})
+        cache = FeatureCache(cache_dir) if cache_dir is not None else None
+        checkpoint = SearchCheckpoint(checkpoint_file_path, resume, fresh) if checkpoint_file_path is not None else None
+
+        if search == "halving":
+            grid_search_results = halving_search(X_train, y_train, candidates, cv=5, eta=eta, min_rows=min_rows,
+                                                 engine=engine, n_jobs=n_jobs, cache=cache, dtype=dtype,
+                                                 sparse=sparse, standardize=standardize, split=split, dates=dates,
+                                                 fold_preprocessing=fold_preprocessing, checkpoint=checkpoint)
+        else:
+            grid_search_results = score_candidates(X_train, y_train, candidates, cv=5, engine=engine, n_jobs=n_jobs,
+                                                   cache=cache, dtype=dtype, sparse=sparse, standardize=standardize,
+                                                   split=split, dates=dates, fold_preprocessing=fold_preprocessing,
+                                                   checkpoint=checkpoint)
+
+    # the settings the model was selected with, so linear_model.py refits it the same way
+    settings = {"engine": engine, "dtype": dtype, "sparse": sparse, "standardize": standardize}
+    grid_search_results = grid_search_results.assign(**settings)[columns + list(settings)].reset_index(drop=True)
     grid_search_results = grid_search_results.sort_values("mean_val_score (r2)", ascending=False)
 
     grid_search_results.to_csv(gridsearch_results_file_path)
 
 
+def cli(argv=None):
+    """
+    Runs the script with command line arguments (sys.argv[1:] if argv is None).
+    """
+    opt = docopt(__doc__, argv=argv)
+    configure(opt["--trace"], opt["--profile"], script="grid_search")
+    with stage("grid_search"):
+        main(opt["<training_data_file_path>"], opt["<gridsearch_results_file_path>"], opt["--n_features"], opt["--engine"], int(opt["--n_jobs"]), opt["--cache_dir"],
+             opt["--dtype"], opt["--sparse"], opt["--standardize"], opt["--degrees"], opt["--search"],
+             int(opt["--eta"]), int(opt["--min_rows"]), opt["--split"],
+             opt["--fold_preprocessing"], opt["--checkpoint"], opt["--resume"], opt["--fresh"], opt["--model"], opt["--alphas"],
+             float(opt["--l1_ratio"]))
+
 # script entry point
 if __name__ == '__main__':
-    main(opt["<training_data_file_path>"], opt["<gridsearch_results_file_path>"])
\ No newline at end of file
+    cli()
\ No newline at end of file
@@ -0,0 +1,205 @@
+"""Successive-halving search over polynomial degree and number of features, for grid_search.py.
+
+Scoring every (degree, n_features_to_select) candidate with 5-fold cross-validation
+on all training rows is dominated by the high degrees: degree 6 has 478 columns to
+eliminate against 37 for degree 2. Successive halving scores all candidates cheaply
+first and spends the full budget only on the best of them:
+
+1. every candidate is cross-validated on a small stratified subsample of the rows
+   (HALVING_CV folds)
+2. the best 1/eta of the candidates survive, and are scored again on eta times as
+   many rows
+3. the last rung scores the survivors on all rows with all folds, exactly as the
+   exhaustive grid search would
+
+Candidates of the same degree share one preprocessing fit and one RFE elimination
+path per fold (see rfe_path.py), so a rung costs one path search per surviving
+degree. The subsamples are nested and keep the share of each stratum (barrier
+trial or race, and decile of the finish time) of the full training set.
+"""
+
+import numpy as np
+import pandas as pd
+
+from checkpoint import FoldCells, search_key
+from fold_cv import cv_folds, fold_local_search
+from instrument import stage
+from preprocessing import fit_preprocessor, n_output_columns
+from rfe_path import rfe_path_search
+
+# folds scored on the subsamples; the last rung uses all of them
+HALVING_CV = 3
+# strata of the subsamples: categorical feature, and number of finish-time quantiles
+STRATIFY_FEATURE = "dataset"
+N_TARGET_BINS = 10
+
+
+def stratified_order(strata, seed=0):
+    """
+    Returns a random order of the rows in which every prefix holds each stratum in
+    proportion to its size (to within one row), so that the first n rows are a
+    stratified subsample of size n and smaller subsamples are nested in larger ones.
+
+    Arguments:
+    ----------
+    strata
+        (np.array) - the stratum of each row
+    seed
+        (int) - seed of the random order within each stratum
+
+    Returns:
+    --------
+    np.array of row positions
+    """
+    rng = np.random.default_rng(seed)
+    _, codes, counts = np.unique(strata, return_inverse=True, return_counts=True)
+    shuffled = rng.permutation(len(codes))
+    shuffled_codes = codes[shuffled]
+
+    # rank of each shuffled row within its stratum
+    by_stratum = np.argsort(shuffled_codes, kind="stable")
+    rank = np.empty(len(codes))
+    rank[by_stratum] = np.arange(len(codes)) - (np.cumsum(counts) - counts)[shuffled_codes[by_stratum]]
+
+    # the i-th row of a stratum of size m goes at (i + 0.5) / m of the way through
+    return shuffled[np.argsort((rank + 0.5) / counts[shuffled_codes], kind="stable")]
+
+
+def row_strata(X, y):
+    """
+    Returns the stratum of each training row: its STRATIFY_FEATURE value and the
+    N_TARGET_BINS-quantile of its finish time.
+    """
+    target_bin = pd.qcut(y, N_TARGET_BINS, labels=False, duplicates="drop")
+    return X[STRATIFY_FEATURE].astype(str).to_numpy() + "_" + np.asarray(target_bin).astype(str)
+
+
+def halving_schedule(n_rows, n_candidates, eta=3, min_rows=2000):
+    """
+    Returns the number of rows scored at each rung: n_rows at the last rung, and eta
+    times fewer at each rung before it. There are enough rungs to get from
+    n_candidates down to the last eta or fewer, but none on fewer than min_rows rows.
+    """
+    n_rungs = 1
+    while eta ** n_rungs < n_candidates and n_rows // eta ** n_rungs >= min_rows:
+        n_rungs += 1
+    return [n_rows // eta ** (n_rungs - 1 - rung) for rung in range(n_rungs)]
+
+
+def score_candidates(X, y, candidates, cv, engine="sklearn", n_jobs=1, cache=None, dtype="float64", sparse=False,
+                     standardize=False, split="kfold", dates=None, fold_preprocessing=False, checkpoint=None):
+    """
+    Cross-validates candidates on the rows of X and y, with one path search per
+    degree, and one preprocessing fit per degree (or per degree and fold).
+
+    Arguments:
+    ----------
+    X, y
+        (pd.DataFrame, np.array) - training features and targets
+    candidates
+        (pd.DataFrame) - columns "degree" and "n_features_to_select"
+    cv
+        (int) - number of cross-validation folds
+    engine, n_jobs
+        - as for rfe_path.rfe_path_search()
+    cache, dtype, sparse, standardize
+        - as for preprocessing.fit_preprocessor()
+    split, dates
+        - "kfold" or "time", and the date of each row for "time" (see fold_cv.cv_folds())
+    fold_preprocessing
+        (bool) - fit the preprocessing on each training fold rather than on all rows
+        (see fold_cv.py)
+    checkpoint
+        (checkpoint.SearchCheckpoint) - where to record each (candidate, fold) score as
+        its fold finishes, and to look up the scores of earlier runs, or None
+
+    Returns:
+    --------
+    candidates with columns "mean_val_score (r2)" and "fit time per fold (s)" added
+    """
+    folds = cv_folds(len(y), cv, split, dates)
+    scored = []
+    for degree, group in candidates.groupby("degree", sort=True):
+        degree = int(degree)
+        key = search_key(X, y, folds, degree=degree, engine=engine, dtype=dtype, sparse=sparse,
+                         standardize=standardize, fold_preprocessing=fold_preprocessing) \
+            if checkpoint is not None else None
+        # a subsample can miss rare categories; a candidate with more features than columns keeps them all
+        n_features = np.minimum(group["n_features_to_select"].to_numpy(), n_output_columns(X, degree))
+
+        if checkpoint is not None and not FoldCells(len(folds), n_features, checkpoint, key).pending():
+            # every cell was scored by an earlier run, so the degree is not even preprocessed
+            test_scores, fit_times = FoldCells(len(folds), n_features, checkpoint, key).results()
+            cv_results = {"mean_test_score": test_scores, "mean_fit_time": fit_times}
+        elif fold_preprocessing:
+            with stage("rfe_path_search", rows_in=len(y), engine=engine, n_jobs=n_jobs, degree=degree,
+                       n_candidates=len(group), split=split, preprocessing="fold"):
+                cv_results = fold_local_search(X, y, group["n_features_to_select"], folds, degree, engine,
+                                               n_jobs, cache, dtype, sparse, standardize, checkpoint, key)
+        else:
+            _, X_preprocessed, _ = fit_preprocessor(X, degree, cache=cache, dtype=dtype, sparse=sparse,
+                                                    standardize=standardize)
+            with stage("rfe_path_search", rows_in=len(y), engine=engine, n_jobs=n_jobs, degree=degree,
+                       n_candidates=len(group), split=split, preprocessing="global"):
+                cv_results = rfe_path_search(X_preprocessed, y, n_features, cv=folds, engine=engine, n_jobs=n_jobs,
+                                             checkpoint=checkpoint, checkpoint_key=key)
+            del X_preprocessed
+        scored.append(group.assign(**{"mean_val_score (r2)": cv_results["mean_test_score"],
+                                      "fit time per fold (s)": cv_results["mean_fit_time"]}))
+    return pd.concat(scored)
+
+
+def halving_search(X_train, y_train, candidates, cv=5, eta=3, min_rows=2000, engine="sklearn", n_jobs=1, cache=None,
+                   dtype="float64", sparse=False, standardize=False, split="kfold", dates=None,
+                   fold_preprocessing=False, checkpoint=None, seed=0):
+    """
+    Successive-halving search over (degree, n_features_to_select) candidates.
+
+    Arguments:
+    ----------
+    X_train, y_train
+        (pd.DataFrame, np.array) - training features and targets
+    candidates
+        (pd.DataFrame) - columns "degree" and "n_features_to_select"
+    cv
+        (int) - number of cross-validation folds of the last rung, on all rows
+    eta
+        (int) - factor by which the candidates shrink and the rows grow at each rung
+    min_rows
+        (int) - least number of rows of the first rung
+    engine, n_jobs
+        - as for rfe_path.rfe_path_search()
+    cache, dtype, sparse, standardize
+        - as for preprocessing.fit_preprocessor(); the cache is only used on all rows
+    split, dates, fold_preprocessing, checkpoint
+        - cross-validation folds, preprocessing and checkpoint, see score_candidates().
+        Each rung's cells are checkpointed, so a resumed search replays the finished
+        rungs from the checkpoint and picks the same survivors
+    seed
+        (int) - seed of the subsamples
+
+    Returns:
+    --------
+    pd.DataFrame of the candidates scored on all rows, with columns "degree",
+    "n_features_to_select", "mean_val_score (r2)" and "fit time per fold (s)"
+    """
+    assert eta >= 2, "eta must be at least 2"
+    y_train = np.asarray(y_train)
+    schedule = halving_schedule(len(y_train), len(candidates), eta, min_rows)
+    order = stratified_order(row_strata(X_train, y_train), seed)
+
+    survivors = candidates.reset_index(drop=True)
+    for rung, n_rows in enumerate(schedule):
+        last = rung == len(schedule) - 1
+        # the subsample is kept in file order, as all rows are; its folds are shuffled (see fold_cv.cv_folds())
+        rows = np.sort(order[:n_rows]) if not last else np.arange(len(y_train))
+        with stage("halving_rung", rows_in=n_rows, rung=rung, n_candidates=len(survivors),
+                   n_degrees=survivors["degree"].nunique()):
+            scored = score_candidates(X_train.iloc[rows], y_train[rows], survivors, cv if last else HALVING_CV,
+                                      engine, n_jobs, cache if last else None, dtype, sparse, standardize, split,
+                                      dates[rows] if dates is not None else None, fold_preprocessing, checkpoint)
+        if not last:
+            n_keep = int(np.ceil(len(scored) / eta))
+            survivors = scored.sort_values("mean_val_score (r2)", ascending=False).head(n_keep)[
+                ["degree", "n_features_to_select"]]
+    return scored
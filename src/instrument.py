@@ -0,0 +1,273 @@
+"""Per-stage timing and memory instrumentation shared by the pipeline scripts.
+
+Code wraps each named stage in a stage() block. Each stage records its wall time,
+its CPU time and its peak resident set size, plus rows in and out where the code
+sets them. Stages nest, e.g. cv_fold inside rfe_path_search. Every finished stage
+is logged (logger "instrument", level INFO) and, if a trace file is configured,
+appended to it as one JSON line. Worker processes started by joblib append to the
+same file, since the settings are passed on in environment variables.
+
+Peak RSS is per stage on Linux, where the kernel's high-water mark can be reset
+when a stage starts. On other platforms it falls back to the process's lifetime
+peak, and the record then says "peak_rss_scope": "process".
+
+With a profile directory set, stages are also profiled: with cProfile by default
+(one .prof file per stage, readable with pstats or snakeviz), or with py-spy if
+HORSE_PIPELINE_PROFILER=py-spy (one speedscope .json per stage, needs py-spy on
+the PATH and permission to attach to the process). HORSE_PIPELINE_PROFILE_STAGES
+picks the stages to profile, comma separated (by default, all of them). A stage
+inside a profiled stage is covered by its profile and not profiled on its own.
+
+Usage: instrument.py <trace_file_path>
+
+Arguments:
+<trace_file_path>   Trace written by the pipeline scripts' --trace option, to summarise per stage
+"""
+
+import cProfile
+import json
+import logging
+import os
+import resource
+import shutil
+import signal
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from docopt import docopt
+
+TRACE_ENV = "HORSE_PIPELINE_TRACE"
+PROFILE_ENV = "HORSE_PIPELINE_PROFILE"
+PROFILER_ENV = "HORSE_PIPELINE_PROFILER"
+PROFILE_STAGES_ENV = "HORSE_PIPELINE_PROFILE_STAGES"
+SCRIPT_ENV = "HORSE_PIPELINE_SCRIPT"
+PROFILERS = ["cprofile", "py-spy"]
+
+logger = logging.getLogger("instrument")
+# open stages of this process, innermost last
+_open_stages = []
+_write_lock = threading.Lock()
+
+
+def configure(trace_file_path=None, profile_dir=None, profiler=None, profile_stages=None, script=None):
+    """
+    Sets where stage records and profiles go, for this process and the worker
+    processes it starts. Arguments left as None keep their environment settings.
+
+    Parameters
+    ----------
+    trace_file_path
+        file to append one JSON line per finished stage to
+    profile_dir
+        directory to write a profile of each profiled stage to
+    profiler
+        "cprofile" or "py-spy"
+    profile_stages
+        list of stage names to profile, or None for the outermost stages
+    script
+        the script name recorded with each stage, by default that of the running file
+    """
+    assert profiler is None or profiler in PROFILERS, f"profiler must be one of {PROFILERS}"
+    if profiler == "py-spy" and shutil.which("py-spy") is None:
+        raise ValueError("py-spy is not on the PATH")
+    settings = {TRACE_ENV: trace_file_path, PROFILE_ENV: profile_dir, PROFILER_ENV: profiler,
+                PROFILE_STAGES_ENV: ",".join(profile_stages) if profile_stages is not None else None,
+                SCRIPT_ENV: script}
+    for name, value in settings.items():
+        if value is not None:
+            os.environ[name] = os.path.abspath(value) if name in (TRACE_ENV, PROFILE_ENV) else value
+    if profile_dir is not None:
+        os.makedirs(profile_dir, exist_ok=True)
+
+
+def script_name():
+    return os.environ.get(SCRIPT_ENV) or os.path.splitext(os.path.basename(sys.argv[0] or "python"))[0]
+
+
+def read_peak_rss():
+    """
+    Returns the peak resident set size in bytes since the last reset_peak_rss(), or
+    of the process's lifetime where it cannot be reset.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+
+def reset_peak_rss():
+    """
+    Resets the kernel's peak RSS (VmHWM) to the current RSS. Returns whether it could.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+class Stage:
+    """
+    A running stage. Code inside the stage sets rows_out, and may add fields to the
+    record with set().
+    """
+
+    def __init__(self, name, rows_in=None, **fields):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.fields = fields
+        self.peak_rss = 0
+        # stops the stage's profiler, if it is profiled
+        self.profiler = None
+
+    def set(self, **fields):
+        self.fields.update(fields)
+
+
+def profiled(name):
+    """
+    Returns whether a stage starting now should be profiled.
+    """
+    # only one profiler can be active at a time
+    if not os.environ.get(PROFILE_ENV) or any(open_stage.profiler is not None for open_stage in _open_stages):
+        return False
+    stages = os.environ.get(PROFILE_STAGES_ENV)
+    return not stages or name in stages.split(",")
+
+
+def start_profiler(name):
+    """
+    Starts profiling a stage; returns a function that stops it and writes the profile.
+    """
+    path = os.path.join(os.environ[PROFILE_ENV], f"{script_name()}-{name}-{os.getpid()}-{time.time_ns()}")
+    if os.environ.get(PROFILER_ENV) == "py-spy":
+        process = subprocess.Popen(["py-spy", "record", "--pid", str(os.getpid()), "--format", "speedscope",
+                                    "--output", path + ".json"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        def stop():
+            process.send_signal(signal.SIGINT)
+            process.wait()
+        return stop
+
+    profile = cProfile.Profile()
+    profile.enable()
+
+    def stop():
+        profile.disable()
+        profile.dump_stats(path + ".prof")
+    return stop
+
+
+def write_record(record):
+    logger.info(json.dumps(record))
+    trace_file_path = os.environ.get(TRACE_ENV)
+    if trace_file_path:
+        # one short write per record, so records of concurrent processes do not interleave
+        with _write_lock, open(trace_file_path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+
+@contextmanager
+def stage(name, rows_in=None, **fields):
+    """
+    Records wall time, CPU time (of the whole process, including its threads), peak
+    RSS and row counts of the code in the block as the named stage.
+
+    Parameters
+    ----------
+    name
+        the stage name, e.g. "merge_results"
+    rows_in
+        the number of input rows, if known
+    fields
+        other values to record, e.g. fold=2
+
+    Yields
+    ------
+        the Stage; set its rows_out to record the number of output rows
+    """
+    current = Stage(name, rows_in, **fields)
+    parent = _open_stages[-1] if _open_stages else None
+    if parent is not None:
+        parent.peak_rss = max(parent.peak_rss, read_peak_rss())
+    per_stage = reset_peak_rss()
+    current.peak_rss = read_peak_rss()
+    if profiled(name):
+        current.profiler = start_profiler(name)
+    _open_stages.append(current)
+
+    start_time, wall, cpu = time.time(), time.perf_counter(), time.process_time()
+    error = None
+    try:
+        yield current
+    except BaseException as e:
+        error = repr(e)
+        raise
+    finally:
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        if current.profiler is not None:
+            current.profiler()
+        _open_stages.pop()
+        current.peak_rss = max(current.peak_rss, read_peak_rss())
+        if parent is not None:
+            parent.peak_rss = max(parent.peak_rss, current.peak_rss)
+
+        record = {"stage": name, "parent": parent.name if parent is not None else None, "script": script_name(),
+                  "pid": os.getpid(), "start": round(start_time, 6), "wall_s": round(wall, 6),
+                  "cpu_s": round(cpu, 6), "peak_rss_mb": round(current.peak_rss / 2**20, 1),
+                  "rows_in": current.rows_in, "rows_out": current.rows_out, **current.fields}
+        if not per_stage:
+            record["peak_rss_scope"] = "process"
+        if error is not None:
+            record["error"] = error
+        write_record(record)
+
+
+def read_trace(trace_file_path):
+    """
+    Reads a trace into a data frame with one row per stage record.
+    """
+    import pandas as pd
+
+    with open(trace_file_path) as f:
+        return pd.DataFrame([json.loads(line) for line in f if line.strip()])
+
+
+def summarise(trace):
+    """
+    Returns the number of runs, total wall and CPU time, largest peak RSS and total
+    rows of each stage of each script, in order of first appearance.
+    """
+    def total(rows):
+        # missing when no run of the stage counted rows
+        return rows.sum(min_count=1)
+
+    trace = trace.assign(order=range(len(trace)))
+    return (trace.groupby(["script", "stage"], sort=False)
+            .agg(runs=("wall_s", "size"), wall_s=("wall_s", "sum"), cpu_s=("cpu_s", "sum"),
+                 peak_rss_mb=("peak_rss_mb", "max"), rows_in=("rows_in", total), rows_out=("rows_out", total),
+                 order=("order", "min"))
+            .sort_values("order").drop(columns="order"))
+
+
+def cli(argv=None):
+    """
+    Runs the script with command line arguments (sys.argv[1:] if argv is None).
+    """
+    opt = docopt(__doc__, argv=argv)
+    print(summarise(read_trace(opt["<trace_file_path>"])).round(3).to_string())
+
+
+# script entry point
+if __name__ == '__main__':
+    cli()
@@ -5,39 +5,60 @@
 """This script runs a pre-optimized linear regression model on training and test data.
 The linear regression model is trained with the training data, and then makes predictions
 on the test set. It then outputs as a .png plot in the desired directory showing predicted
-vs actual results.
+vs actual results. If the grid search chose a ridge, lasso or elastic net model
+(grid_search.py --model), that model is fitted with its alpha instead (see regularized.py).
+The engine and feature matrix mode are those the grid search recorded in its results,
+unless given here; options that differ from the search's are used with a warning.
 
 
-Usage: linear_model.py <training_data_file_path> <test_data_file_path> <grid_results_file_path> <image_plot_file_path>
+Usage: linear_model.py <training_data_file_path> <test_data_file_path> <grid_results_file_path> <image_plot_file_path> [--engine=<engine>] [--cache_dir=<cache_dir>] [--model_out=<model_file_path>] [--dtype=<dtype>] [--sparse] [--standardize] [--chunksize=<chunksize>] [--trace=<trace_file_path>] [--profile=<profile_dir>]
 
 Arguments:
 <training_data_file_path>   File path where training data is stored
 <test_data_file_path>       File path where test data is stored
 <grid_results_file_path>    File path where grid search results are saved
 <image_plot_file_path>      File path to save image of results plot
+
+Options:
+--engine=<engine>           Feature elimination engine: "sklearn" (the grid search's, or sklearn)
+--cache_dir=<cache_dir>     Directory for cached fitted preprocessing and feature matrices
+--model_out=<model_file_path>  File path to save the fitted model artifact (.json) for score.py
+--dtype=<dtype>             Feature matrix dtype, "float64" or "float32" (float32 standardizes the
+                            numeric features, see preprocessing.py) (the grid search's, or float64)
+--sparse                    Keep the feature matrix sparse (scipy CSR)
+--standardize               Standardize the numeric features before the polynomial expansion
+--chunksize=<chunksize>     Train a ridge, lasso or elastic net model out of core, reading this many
+                            rows at a time and accumulating the normal equations instead of building
+                            the feature matrix (see stream_fit.py). RFE and linear regression need
+                            the feature matrix
+--trace=<trace_file_path>   Append the time, CPU time, peak memory and rows of each stage to this
+                            JSON lines file (see instrument.py)
+--profile=<profile_dir>     Write a cProfile profile of each stage to this directory
 """
+import warnings
+
 from docopt import docopt
 
 import pandas as pd
 import numpy as np
 
-from sklearn.pipeline import Pipeline, FeatureUnion
-from sklearn.preprocessing import OneHotEncoder, PolynomialFeatures
-import re
-from sklearn.impute import SimpleImputer
-from sklearn.compose import ColumnTransformer
-
-from sklearn.model_selection import GridSearchCV, train_test_split
-from sklearn.feature_selection import RFE
 from sklearn.linear_model import LinearRegression
 
-import matplotlib.pyplot as plt
-
-opt = docopt(__doc__)
+from feature_cache import FeatureCache
+from finishtime import load_model_data
+from instrument import configure, stage
+from model_artifact import export_artifact, pipeline_parameters, predict, save_artifact
+from preprocessing import DEFAULT_DEGREE, fit_preprocessor, transform_features
+from regularized import model_l1_ratio, regularization_path
+from rfe_path import elimination_ranking
+from stream_fit import DEFAULT_CHUNKSIZE, model_chunks, stream_regularized_fit
 
+# settings grid_search.py records with its results, and their values when the results have none
+SEARCH_SETTINGS = {"engine": "sklearn", "dtype": "float64", "sparse": False, "standardize": False}
 
 
-def main(training_data_file_path, test_data_file_path, grid_results_file_path, image_plot_file_path):
+def main(training_data_file_path, test_data_file_path, grid_results_file_path, image_plot_file_path, engine=None, cache_dir=None, model_file_path=None,
+         dtype=None, sparse=False, standardize=False, chunksize=None):
     """
     Entry point for script. Takes in training_data_file_path, test_data_file_path
     and image_plot_file_path from commandline, and runs a pre-optimized linear regression
@@ -46,194 +67,277 @@ def main(training_data_file_path, test_data_file_path, grid_results_file_path, i
     Arguments:
     ----------
     training_data_file_path 
-        - file path where training data is located. Assumes data is a .csv file in same
-        format as data/data_train.csv (output of download_data.py script)
+        - file path where training data is located. Assumes data is a .parquet or .csv
+        file in same format as data/data_train.parquet (output of wrangle_data.py script)
     test_data_file_path 
-       - file path where training data is located. Assumes data is a .csv file in same
-        format as data/data_train.csv (output of download_data.py script)
+       - file path where test data is located. Assumes data is a .parquet or .csv
+        file in same format as data/data_test.parquet (output of wrangle_data.py script)
     grid_results_file_path
         - file path where grid search results are saved
     image_plot_file_path
         - file path where image of results plot will be saved
+    engine
+        - feature elimination engine, "sklearn" (see rfe_path.py), or None for the
+        grid search's (see search_settings())
+    cache_dir
+        - directory of the feature cache (see feature_cache.py), or None to disable caching
+    model_file_path
+        - file path to save the fitted model artifact to (see model_artifact.py), or None
+    dtype, sparse, standardize
+        - feature matrix mode (see preprocessing.build_preprocessor()); None and False for
+        the grid search's
+    chunksize
+        - rows read at a time to train a regularized model out of core (see stream_fit.py),
+        or None to build the feature matrix
 
     Returns
     -------
         None, but saves a plot to the specified file path
     """
-    plot_results(training_data_file_path, test_data_file_path, grid_results_file_path, image_plot_file_path)
+    plot_results(training_data_file_path, test_data_file_path, grid_results_file_path, image_plot_file_path, engine, cache_dir, model_file_path,
+                 dtype, sparse, standardize, chunksize)
 
-def time_parser(input_time):
+def data_preprocessing(training_data_file_path, test_data_file_path, cache_dir=None, dtype="float64", sparse=False, standardize=False,
+                       degree=DEFAULT_DEGREE):
     """
-    Function which converts a time string of form mm.ss.SS to seconds
-    
+    Data preprocessing for linear regression. Applies imputer (mean), 
+    and polynomial order 5 tranformation to numeric features. Applies 
+    imputer (fill with "not_specified" constant value) and one-hot encoding
+    to categorical features. Uses output of finishtime.load_model_data() function.
+
     Arguments:
     ----------
-    input_time 
-        (str) - input time as string of form "d.dd.dd" where d is a digit
+    training_data_file_path 
+        - file path where training data is located. Assumes data is a .parquet or .csv
+        file in same format as data/data_train.parquet (output of wrangle_data.py script)
+    test_data_file_path 
+       - file path where test data is located. Assumes data is a .parquet or .csv
+        file in same format as data/data_test.parquet (output of wrangle_data.py script)
+    cache_dir
+        - directory of the feature cache (see feature_cache.py), or None to disable caching
+    dtype, sparse, standardize
+        - feature matrix mode (see preprocessing.build_preprocessor())
+    degree
+        - degree of the polynomial features
 
-    Returns:
-    --------
-    float representing input time in seconds
+    Returns
+    -------
+    X_train_preprocessed, X_test_preprocessed, y_train, y_test 
+        (np.array or sparse matrix) - Preprocessed training/test features and targets
+    full_pipeline
+        - fitted preprocessing pipeline
     """
-    assert re.match("\d\.\d{2}\.\d{2}", input_time), "Only strings of format d.dd.dd can be parsed"
 
-    parsed_time = input_time.split(".")
-    mins = int(parsed_time[0])
-    secs = int(parsed_time[1])
-    ss = int(parsed_time[2])
+    X_train, y_train = load_model_data(training_data_file_path)
+    X_test, y_test = load_model_data(test_data_file_path)
+
+    cache = FeatureCache(cache_dir) if cache_dir is not None else None
+    full_pipeline, X_train_preprocessed, fit_key = fit_preprocessor(X_train, degree, cache=cache, dtype=dtype, sparse=sparse,
+                                                                     standardize=standardize)
+    X_test_preprocessed = transform_features(full_pipeline, X_test, fit_key, cache=cache)
     
-    time_in_sec = mins*60.0 + secs + ss/100
-    return time_in_sec
+    return X_train_preprocessed, X_test_preprocessed, y_train, y_test, full_pipeline
 
-def load_and_parse_data(training_data_file_path, test_data_file_path):
+def linear_model_results(training_data_file_path, test_data_file_path, grid_results_file_path, engine=None, cache_dir=None, model_file_path=None,
+                         dtype=None, sparse=False, standardize=False, chunksize=None):
     """
-    Data loading and cleaning function. Converts finishtime column to seconds
-    and drops rows where finishtime is 0. 
+    Fits pre-optimized linear regression model on training data,
+    and makes predictions on test data. Uses output of 
+    data_preprocessing() function.
 
     Arguments:
     ----------
     training_data_file_path 
-        - file path where training data is located. Assumes data is a .csv file in same
-        format as data/data_train.csv (output of download_data.py script)
+        - file path where training data is located. Assumes data is a .parquet or .csv
+        file in same format as data/data_train.parquet (output of wrangle_data.py script)
     test_data_file_path 
-       - file path where training data is located. Assumes data is a .csv file in same
-        format as data/data_train.csv (output of download_data.py script)
+       - file path where test data is located. Assumes data is a .parquet or .csv
+        file in same format as data/data_test.parquet (output of wrangle_data.py script)
+    grid_results_file_path
+        - file path where grid search results are saved
+    engine
+        - feature elimination engine, "sklearn" (see rfe_path.py), or None for the
+        grid search's (see search_settings())
+    cache_dir
+        - directory of the feature cache (see feature_cache.py), or None to disable caching
+    model_file_path
+        - file path to save the fitted model artifact to (see model_artifact.py), or None
+    dtype, sparse, standardize
+        - feature matrix mode (see preprocessing.build_preprocessor()); None and False for
+        the grid search's
+    chunksize
+        - rows read at a time to train a regularized model out of core (see stream_fit.py),
+        or None to build the feature matrix
 
     Returns
     -------
-    X_train, X_test, y_train, y_test 
-        (np.array) - Split training/test features and targets
+    test_results 
+        (pd.DataFrame) - Data frame containing test set predictions and actual values
     """
 
-    training_data = pd.read_csv(training_data_file_path)
-    test_data = pd.read_csv(test_data_file_path)
-
-    assert "finishtime" in training_data.columns and "finishtime" in test_data.columns, "Missing column 'finishtime'"
-
-    y_train = training_data["finishtime"]
-    #fill nans with "0.00.00"
-    y_train.fillna("0.00.00", inplace=True)       
-    #replace anything not of format d.dd.dd to "0.00.00" with time_parser function
-    y_train[~y_train.str.contains("\d\.\d{2}\.\d{2}")] = '0.00.00'
-    #  apply time_parser on all values
-    y_train = np.array(list(map(lambda x: time_parser(x), y_train)))
-    #replace target column with converted values
-    training_data["finishtime"] = y_train
-    #drop all rows where finishtime is 0.0
-    training_data = training_data[training_data["finishtime"] != 0.0]
-    X_train = training_data.drop("finishtime", axis=1)
-    y_train = training_data["finishtime"]
-
-
-    y_test = test_data["finishtime"]
-    #fill nans with "0.00.00"
-    y_test.fillna("0.00.00", inplace=True)       
-    #replace anything not of format d.dd.dd to "0.00.00" with time_parser function
-    y_test[~y_test.str.contains("\d\.\d{2}\.\d{2}")] = '0.00.00'
-    #  apply time_parser on all values
-    y_test = np.array(list(map(lambda x: time_parser(x), y_test)))
-    #replace target column with converted values
-    test_data["finishtime"] = y_test
-    #drop all rows where finishtime is 0.0
-    test_data = test_data[test_data["finishtime"] != 0.0]
-    X_test = test_data.drop("finishtime", axis=1)
-    y_test = test_data["finishtime"]
-
-    return X_train, X_test, y_train, y_test
-
-def data_preprocessing(training_data_file_path, test_data_file_path):
+    grid_results = pd.read_csv(grid_results_file_path)
+    n_features_to_select = grid_results["n_features_to_select"][0]
+    # results of searches over feature counts only have no degree column
+    degree = int(grid_results["degree"][0]) if "degree" in grid_results.columns else DEFAULT_DEGREE
+    # results of RFE and linear regression searches have no model column
+    model = grid_results["model"][0] if "model" in grid_results.columns else "linear"
+    settings = search_settings(grid_results, engine=engine, dtype=dtype, sparse=sparse, standardize=standardize)
+    engine, dtype, sparse, standardize = (settings[name] for name in SEARCH_SETTINGS)
+
+    if chunksize is not None:
+        assert model != "linear", \
+            "RFE ranks the features on the feature matrix; only regularized models are trained out of core"
+        return stream_model_results(training_data_file_path, test_data_file_path, model, *regularization(grid_results),
+                                    model_file_path, chunksize, standardize or dtype == "float32", degree)
+
+    X_train_preprocessed, X_test_preprocessed, y_train, y_test, full_pipeline = data_preprocessing(training_data_file_path, test_data_file_path, cache_dir,
+                                                                                                     dtype, sparse, standardize, degree)
+    if model != "linear":
+        return regularized_model_results(X_train_preprocessed, X_test_preprocessed, y_train, y_test, full_pipeline,
+                                         model, *regularization(grid_results), model_file_path,
+                                         metadata={"degree": degree, "dtype": dtype, "sparse": sparse,
+                                                   "standardize": standardize})
+
+    # keep the n_features_to_select features that survive longest in recursive feature elimination
+    with stage("elimination_ranking", rows_in=len(y_train), engine=engine):
+        support = elimination_ranking(X_train_preprocessed, y_train, engine) <= n_features_to_select
+
+    with stage("fit", rows_in=len(y_train), n_features=int(n_features_to_select)):
+        # the selected columns are already a copy, so LinearRegression may center them in place
+        lr = LinearRegression(copy_X=False)
+        lr.fit(X_train_preprocessed[:, support], y_train)
+
+    if model_file_path is not None:
+        with stage("export_artifact"):
+            export_artifact(full_pipeline, support, lr, model_file_path,
+                            metadata={"n_features_to_select": int(n_features_to_select), "degree": degree, "engine": engine,
+                                      "dtype": dtype, "sparse": sparse, "standardize": standardize})
+
+    with stage("predict", rows_in=len(y_test)) as current:
+        test_results = pd.DataFrame({"Actual finish time" : y_test,
+                                    "Predicted finish time" : lr.predict(X_test_preprocessed[:, support])})
+        current.rows_out = len(test_results)
+    return test_results
+
+def search_settings(grid_results, **options):
     """
-    Data preprocessing for linear regression. Applies imputer (mean), 
-    and polynomial order 5 tranformation to numeric features. Applies 
-    imputer (fill with "not_specified" constant value) and one-hot encoding
-    to categorical features. Uses output of load_and_parse_data() function.
+    Returns the settings to refit the selected model with: each of SEARCH_SETTINGS as
+    grid_search.py recorded it in grid_results, or as given in options if it is set
+    there (not None or False). An option that differs from the recorded setting is
+    used, with a warning, since the refit model is then not the one the search selected.
 
     Arguments:
     ----------
-    training_data_file_path 
-        - file path where training data is located. Assumes data is a .csv file in same
-        format as data/data_train.csv (output of download_data.py script)
-    test_data_file_path 
-       - file path where training data is located. Assumes data is a .csv file in same
-        format as data/data_train.csv (output of download_data.py script)
+    grid_results
+        (pd.DataFrame) - grid search results; results without a setting's column use
+        its SEARCH_SETTINGS value
+    options
+        the engine, dtype, sparse and standardize given to this script
 
     Returns
     -------
-    X_train_preprocessed, X_test_preprocessed, y_train, y_test 
-        (np.array) - Preprocessed training/test features and targets
+    dict of setting name to value
     """
+    settings = {}
+    for name, default in SEARCH_SETTINGS.items():
+        recorded = grid_results[name][0] if name in grid_results.columns else default
+        recorded = None if pd.isna(recorded) else recorded
+        if isinstance(default, bool):
+            recorded = bool(recorded)
+        option = options.get(name)
+        if option is None or option is False:
+            settings[name] = recorded
+            continue
+        if option != recorded and name in grid_results.columns:
+            warnings.warn(f"{name}={option!r} differs from the grid search's {name}={recorded!r}, so the refit "
+                          f"model is not the one the search selected")
+        settings[name] = option
+    return settings
+
+def regularization(grid_results):
+    """
+    Returns the alpha and l1_ratio of the best row of regularized grid search results.
+    """
+    if "alpha" not in grid_results.columns:
+        return None, None
+    return float(grid_results["alpha"][0]), float(grid_results["l1_ratio"][0])
 
-    X_train, X_test, y_train, y_test = load_and_parse_data(training_data_file_path, test_data_file_path)
-
-    assert all([x in X_train.columns for x in ["country", "dataset"]]), "Must have colums 'country', 'dataset'"
-    assert all([x in X_train.columns for x in ["declarwt", "age", "winodds", "stake", "distance"]]), "Must have colums 'declarwt', 'age', 'winodds', 'stake', 'distance'"
-    
-    #define preprocessor for numeric features
-    numeric_transformer = Pipeline(steps=[('imputer', SimpleImputer(strategy='mean')),
-                                          ('poly', PolynomialFeatures(degree=5))
-                                         ])
-
-    #define preprocessor for categorical features
-    categorical_transformer = Pipeline(steps=[('imputer', SimpleImputer(strategy='constant', fill_value="not_specified")),
-                                              ('one_hot_encoder',  OneHotEncoder())
-                                             ])
-
-    #combine numeric and categorical pipelines
-    categorical_features = ["country", "dataset"]
-    numeric_features = ["declarwt", "age", "winodds", "stake", "distance"]
-
-    preprocessing = ColumnTransformer(
-                                 transformers=[
-                                    ('num', numeric_transformer, numeric_features),
-                                    ('cat', categorical_transformer, categorical_features)
-                                              ])
-
-    #combine preprocessing and model fitting steps into one pipeline 
-    full_pipeline = Pipeline([
-        ('data_preprocessing', preprocessing),
-    ])
-
-    X_train_preprocessed = full_pipeline.fit_transform(X_train)
-    X_test_preprocessed = full_pipeline.transform(X_test)
-    
-    return X_train_preprocessed, X_test_preprocessed, y_train, y_test
-
-def linear_model_results(training_data_file_path, test_data_file_path, grid_results_file_path):
+def regularized_model_results(X_train_preprocessed, X_test_preprocessed, y_train, y_test, full_pipeline, model, alpha,
+                              l1_ratio, model_file_path=None, metadata=None):
     """
-    Fits pre-optimized linear regression model on training data,
-    and makes predictions on test data. Uses output of 
-    data_preprocessing() function.
+    Fits a ridge, lasso or elastic net model with the chosen alpha on all features
+    (see regularized.py) and makes predictions on the test set.
 
     Arguments:
     ----------
-    training_data_file_path 
-        - file path where training data is located. Assumes data is a .csv file in same
-        format as data/data_train.csv (output of download_data.py script)
-    test_data_file_path 
-       - file path where training data is located. Assumes data is a .csv file in same
-        format as data/data_train.csv (output of download_data.py script)
+    X_train_preprocessed, X_test_preprocessed, y_train, y_test, full_pipeline
+        - output of data_preprocessing()
+    model, alpha, l1_ratio
+        - the regularized model and its penalty, from the grid search results
+    model_file_path
+        - file path to save the fitted model artifact to (see model_artifact.py), or None.
+        The artifact keeps the columns with nonzero coefficients
+    metadata
+        (dict) - training settings to record in the artifact
 
     Returns
     -------
     test_results 
         (pd.DataFrame) - Data frame containing test set predictions and actual values
     """
+    l1_ratio = model_l1_ratio(model, l1_ratio)
+    with stage("fit", rows_in=len(y_train), model=model, alpha=alpha, l1_ratio=l1_ratio):
+        coef_path, intercept_path = regularization_path(X_train_preprocessed, y_train, np.array([alpha]), l1_ratio)
+        support = coef_path[0] != 0
+        coef, intercept = coef_path[0][support], intercept_path[0]
+
+    if model_file_path is not None:
+        with stage("export_artifact"):
+            save_artifact(pipeline_parameters(full_pipeline), support, coef, intercept, model_file_path,
+                          metadata={**(metadata or {}), "model": model, "alpha": alpha, "l1_ratio": l1_ratio,
+                                    "n_features_to_select": int(support.sum())})
+
+    with stage("predict", rows_in=len(y_test)) as current:
+        test_results = pd.DataFrame({"Actual finish time" : y_test,
+                                    "Predicted finish time" : X_test_preprocessed[:, support] @ coef + intercept})
+        current.rows_out = len(test_results)
+    return test_results
 
-    grid_results = pd.read_csv(grid_results_file_path)
-    n_features_to_select = grid_results["n_features_to_select"][0]
-    
-    X_train_preprocessed, X_test_preprocessed, y_train, y_test = data_preprocessing(training_data_file_path, test_data_file_path)
-    rfe = RFE(LinearRegression(), n_features_to_select=n_features_to_select)
-    rfe.fit(X_train_preprocessed, y_train)
-
-    lr = LinearRegression()
-    lr.fit(rfe.transform(X_train_preprocessed), y_train)
+def stream_model_results(training_data_file_path, test_data_file_path, model, alpha, l1_ratio, model_file_path=None,
+                         chunksize=DEFAULT_CHUNKSIZE, standardize=False, degree=DEFAULT_DEGREE):
+    """
+    Fits the regularized model with the given alpha and l1_ratio out of core (see
+    stream_fit.py) and predicts the test set chunksize rows at a time, from the
+    model's parameters as score.py would.
 
-    test_results = pd.DataFrame({"Actual finish time" : y_test,
-                                "Predicted finish time" : lr.predict(rfe.transform(X_test_preprocessed))})
+    Returns
+    -------
+    test_results 
+        (pd.DataFrame) - Data frame containing test set predictions and actual values
+    """
+    l1_ratio = model_l1_ratio(model, l1_ratio)
+    parameters, support, coef, intercept = stream_regularized_fit(training_data_file_path, alpha, l1_ratio, chunksize,
+                                                                  degree, standardize)
+    metadata = {"n_features_to_select": int(support.sum()), "model": model, "alpha": alpha, "l1_ratio": l1_ratio}
+    fitted = {**parameters, "support": support, "coef": coef, "intercept": intercept}
+
+    if model_file_path is not None:
+        with stage("export_artifact"):
+            save_artifact(parameters, support, coef, intercept, model_file_path,
+                          metadata={**metadata, "degree": degree, "standardize": standardize, "chunksize": chunksize})
+
+    with stage("predict") as current:
+        actual, predicted = [], []
+        for X_test, y_test in model_chunks(test_data_file_path, chunksize):
+            actual.append(y_test)
+            predicted.append(predict(fitted, X_test))
+        test_results = pd.DataFrame({"Actual finish time" : np.concatenate(actual),
+                                    "Predicted finish time" : np.concatenate(predicted)})
+        current.rows_in = current.rows_out = len(test_results)
     return test_results
 
-def plot_results(training_data_file_path, test_data_file_path, grid_results_file_path, image_plot_file_path):
+def plot_results(training_data_file_path, test_data_file_path, grid_results_file_path, image_plot_file_path, engine=None, cache_dir=None, model_file_path=None,
+                 dtype=None, sparse=False, standardize=False, chunksize=None):
     """
     Plots results from linear regression on test set. Uses output of 
     linear_model_results() function. Saves plot to specified file path.
@@ -241,33 +345,62 @@ def plot_results(training_data_file_path, test_data_file_path, grid_results_file
     Arguments:
     ----------
     training_data_file_path 
-        - file path where training data is located. Assumes data is a .csv file in same
-        format as data/data_train.csv (output of download_data.py script)
+        - file path where training data is located. Assumes data is a .parquet or .csv
+        file in same format as data/data_train.parquet (output of wrangle_data.py script)
     test_data_file_path 
-       - file path where training data is located. Assumes data is a .csv file in same
-        format as data/data_train.csv (output of download_data.py script)
+       - file path where test data is located. Assumes data is a .parquet or .csv
+        file in same format as data/data_test.parquet (output of wrangle_data.py script)
     image_plot_file_path
         - file path where image of results plot will be saved
+    engine
+        - feature elimination engine, "sklearn" (see rfe_path.py), or None for the
+        grid search's (see search_settings())
+    cache_dir
+        - directory of the feature cache (see feature_cache.py), or None to disable caching
+    model_file_path
+        - file path to save the fitted model artifact to (see model_artifact.py), or None
+    dtype, sparse, standardize
+        - feature matrix mode (see preprocessing.build_preprocessor()); None and False for
+        the grid search's
+    chunksize
+        - rows read at a time to train a regularized model out of core (see stream_fit.py),
+        or None to build the feature matrix
 
     Returns
     -------
     None
     """
     
-    test_results=linear_model_results(training_data_file_path, test_data_file_path, grid_results_file_path)
-
-    fig, ax = plt.subplots(1, 1, figsize = (8 ,8))
-    ax.scatter(test_results["Predicted finish time"], test_results["Actual finish time"], alpha=0.5)
-    ax.plot([min(test_results["Actual finish time"]), max(test_results["Actual finish time"])],
-            [min(test_results["Actual finish time"]), max(test_results["Actual finish time"])], 
-            linestyle = "--", color = "red")
-    ax.set_xlabel("Predicted finish time (s)", size=14)
-    ax.set_ylabel("Actual finish time (s)", size=14)
-    ax.set_title("Actual vs predicted finish times \non test set from optimized linear model", size = 15)
-    ax.spines['right'].set_visible(False) #HERE
-    ax.spines['top'].set_visible(False) #HERE
-    plt.savefig(image_plot_file_path)
+    # matplotlib is only needed for the plot
+    import matplotlib.pyplot as plt
+
+    test_results=linear_model_results(training_data_file_path, test_data_file_path, grid_results_file_path, engine, cache_dir, model_file_path,
+                                      dtype, sparse, standardize, chunksize)
+
+    with stage("plot_results", rows_in=len(test_results)):
+        fig, ax = plt.subplots(1, 1, figsize = (8 ,8))
+        ax.scatter(test_results["Predicted finish time"], test_results["Actual finish time"], alpha=0.5)
+        ax.plot([min(test_results["Actual finish time"]), max(test_results["Actual finish time"])],
+                [min(test_results["Actual finish time"]), max(test_results["Actual finish time"])], 
+                linestyle = "--", color = "red")
+        ax.set_xlabel("Predicted finish time (s)", size=14)
+        ax.set_ylabel("Actual finish time (s)", size=14)
+        ax.set_title("Actual vs predicted finish times \non test set from optimized linear model", size = 15)
+        ax.spines['right'].set_visible(False) #HERE
+        ax.spines['top'].set_visible(False) #HERE
+        plt.savefig(image_plot_file_path)
+
+def cli(argv=None):
+    """
+    Runs the script with command line arguments (sys.argv[1:] if argv is None).
+    """
+    opt = docopt(__doc__, argv=argv)
+    configure(opt["--trace"], opt["--profile"], script="linear_model")
+    with stage("linear_model"):
+        main(opt["<training_data_file_path>"], opt["<test_data_file_path>"], opt["<grid_results_file_path>"], opt["<image_plot_file_path>"], opt["--engine"], opt["--cache_dir"], opt["--model_out"],
+             opt["--dtype"], opt["--sparse"], opt["--standardize"],
+             int(opt["--chunksize"]) if opt["--chunksize"] is not None else None)
 
 # script entry point
 if __name__ == '__main__':
-    main(opt["<training_data_file_path>"], opt["<test_data_file_path>"], opt["<grid_results_file_path>"], opt["<image_plot_file_path>"])
\ No newline at end of file
+    cli()
\ No newline at end of file
@@ -0,0 +1,170 @@
+"""Versioned, portable artifact for the fitted finish-time model.
+
+linear_model.py exports the fitted preprocessing (imputer means, polynomial
+exponents, standardization and one-hot categories), the RFE support mask and the regression
+coefficients as a single JSON document. Scoring only needs this module, numpy
+and pandas: the preprocessing is re-applied from its parameters, so no
+scikit-learn objects are unpickled and no training code is imported.
+"""
+
+import json
+from datetime import datetime, timezone
+
+import numpy as np
+
+ARTIFACT_FORMAT = "hk-horse-race-finishtime-model"
+ARTIFACT_VERSION = 2
+# versions this code reads; version 1 artifacts have no standardization
+READABLE_VERSIONS = [1, 2]
+
+
+def export_artifact(full_pipeline, support, lr, model_file_path, metadata=None):
+    """
+    Saves a fitted model as a JSON artifact.
+
+    Arguments:
+    ----------
+    full_pipeline
+        fitted preprocessing pipeline from preprocessing.fit_preprocessor()
+    support
+        (np.array of bool) - columns of the preprocessed matrix the model uses
+    lr
+        fitted LinearRegression on the supported columns
+    model_file_path
+        - file path to write the artifact to
+    metadata
+        (dict) - extra JSON-serializable information to record (e.g. training settings)
+
+    Returns
+    -------
+    None
+    """
+    save_artifact(pipeline_parameters(full_pipeline), support, lr.coef_, lr.intercept_, model_file_path, metadata)
+
+
+def pipeline_parameters(full_pipeline):
+    """
+    Returns the parameters of a fitted preprocessing pipeline that design_matrix() needs,
+    as JSON-serializable values.
+    """
+    column_transformer = full_pipeline.named_steps["data_preprocessing"]
+    numeric = column_transformer.named_transformers_["num"]
+    categorical = column_transformer.named_transformers_["cat"]
+    numeric_features = [t[2] for t in column_transformer.transformers_ if t[0] == "num"][0]
+    categorical_features = [t[2] for t in column_transformer.transformers_ if t[0] == "cat"][0]
+    n_numeric = len(numeric_features)
+    scaler = numeric.named_steps["scaler"] if "scaler" in numeric.named_steps else None
+
+    return {
+        "numeric_features": list(numeric_features),
+        "numeric_means": numeric.named_steps["imputer"].statistics_.tolist(),
+        # standardization applied after imputation, before the polynomial terms
+        "numeric_center": scaler.mean_.tolist() if scaler is not None else [0.0] * n_numeric,
+        "numeric_scale": scaler.scale_.tolist() if scaler is not None else [1.0] * n_numeric,
+        "powers": numeric.named_steps["poly"].powers_.tolist(),
+        "categorical_features": list(categorical_features),
+        "categorical_fill_value": categorical.named_steps["imputer"].fill_value,
+        "categories": [c.tolist() for c in categorical.named_steps["one_hot_encoder"].categories_],
+    }
+
+
+def save_artifact(parameters, support, coef, intercept, model_file_path, metadata=None):
+    """
+    Saves a model given as preprocessing parameters (see pipeline_parameters()), the
+    support mask, and the coefficients and intercept of the supported columns.
+    """
+    artifact = {
+        "format": ARTIFACT_FORMAT,
+        "version": ARTIFACT_VERSION,
+        "created": datetime.now(timezone.utc).isoformat(),
+        "metadata": metadata or {},
+        **{key: np.asarray(value).tolist() if isinstance(value, np.ndarray) else value
+           for key, value in parameters.items()},
+        "support": np.asarray(support).tolist(),
+        "coef": np.asarray(coef, dtype="float64").tolist(),
+        "intercept": float(intercept),
+    }
+
+    with open(model_file_path, "w") as f:
+        json.dump(artifact, f)
+
+
+def load_artifact(model_file_path):
+    """
+    Loads a model artifact saved by export_artifact().
+
+    Arguments:
+    ----------
+    model_file_path
+        - file path of the artifact
+
+    Returns
+    -------
+    dict of model parameters, with numeric parameters as np.arrays
+    """
+    with open(model_file_path) as f:
+        artifact = json.load(f)
+
+    if artifact.get("format") != ARTIFACT_FORMAT:
+        raise ValueError(f"{model_file_path} is not a finish-time model artifact")
+    if artifact["version"] not in READABLE_VERSIONS:
+        raise ValueError(f"Unsupported model artifact version {artifact['version']} "
+                         f"(this code reads versions {READABLE_VERSIONS})")
+
+    n_numeric = len(artifact["numeric_features"])
+    artifact.setdefault("numeric_center", [0.0] * n_numeric)
+    artifact.setdefault("numeric_scale", [1.0] * n_numeric)
+    for key in ["numeric_means", "numeric_center", "numeric_scale", "coef"]:
+        artifact[key] = np.array(artifact[key], dtype="float64")
+    artifact["powers"] = np.array(artifact["powers"], dtype="int64")
+    artifact["support"] = np.array(artifact["support"], dtype=bool)
+    return artifact
+
+
+def design_matrix(artifact, data):
+    """
+    Applies the exported preprocessing to raw runner data, reproducing the fitted
+    pipeline's transform: mean imputation, standardization (if fitted) and polynomial
+    terms for the numeric features, then one-hot columns for the categorical features (unknown
+    categories encode as all zeros).
+
+    Arguments:
+    ----------
+    artifact
+        (dict) - model artifact from load_artifact()
+    data
+        (pd.DataFrame) - runners with the artifact's numeric and categorical features
+
+    Returns
+    -------
+    np.array of shape (len(data), len(artifact["support"]))
+    """
+    numeric = data[artifact["numeric_features"]].to_numpy(dtype="float64")
+    numeric = np.where(np.isnan(numeric), artifact["numeric_means"], numeric)
+    numeric = (numeric - artifact["numeric_center"]) / artifact["numeric_scale"]
+
+    columns = [np.prod(numeric ** powers, axis=1) for powers in artifact["powers"]]
+    for feature, categories in zip(artifact["categorical_features"], artifact["categories"]):
+        values = data[feature].astype(object).where(data[feature].notnull(), artifact["categorical_fill_value"])
+        values = values.to_numpy()
+        columns.extend((values == category).astype("float64") for category in categories)
+
+    return np.column_stack(columns)
+
+
+def predict(artifact, data):
+    """
+    Predicts finish times in seconds for raw runner data.
+
+    Arguments:
+    ----------
+    artifact
+        (dict) - model artifact from load_artifact()
+    data
+        (pd.DataFrame) - runners with the artifact's numeric and categorical features
+
+    Returns
+    -------
+    np.array of predicted finish times
+    """
+    return design_matrix(artifact, data)[:, artifact["support"]] @ artifact["coef"] + artifact["intercept"]
@@ -0,0 +1,55 @@
+"""This script is the single command line interface to the pipeline. Each command runs
+one of the scripts in src/ with the same arguments and options (see the script's own
+usage), and imports only that script and its dependencies, so e.g. downloading never
+loads pandas or sklearn and scoring never loads matplotlib. The scripts can also be
+imported as modules: none of them parses arguments or touches files on import.
+
+Usage: pipeline.py <command> [<args>...]
+       pipeline.py (-h | --help)
+
+Commands:
+download       download the raw data (download_data.py)
+wrangle        merge and split the raw data into train and test sets (wrangle_data.py)
+eda            render the exploratory data analysis charts (eda.py)
+grid_search    search over the number of features to select (grid_search.py)
+linear_model   fit the selected model, plot its test results and save it (linear_model.py)
+score          predict finish times for a file of runners (score.py)
+serve          serve single-race predictions over local HTTP (serve.py)
+trace          summarise a stage trace written with --trace (instrument.py)
+run            bring the pipeline up to date, skipping unchanged stages (runner.py)
+
+Run "pipeline.py <command> --help" for the arguments of a command.
+"""
+import importlib
+import sys
+
+from docopt import docopt
+
+# command name to the module that runs it
+COMMANDS = {
+    "download": "download_data",
+    "wrangle": "wrangle_data",
+    "eda": "eda",
+    "grid_search": "grid_search",
+    "linear_model": "linear_model",
+    "score": "score",
+    "serve": "serve",
+    "trace": "instrument",
+    "run": "runner",
+}
+
+
+def main(argv=None):
+    """
+    Runs a command with its arguments (sys.argv[1:] if argv is None).
+    """
+    opt = docopt(__doc__, argv=argv, options_first=True)
+    command = opt["<command>"]
+    if command not in COMMANDS:
+        sys.exit(f"unknown command {command!r}, expected one of: {', '.join(COMMANDS)}")
+    importlib.import_module(COMMANDS[command]).cli(opt["<args>"])
+
+
+# script entry point
+if __name__ == '__main__':
+    main()
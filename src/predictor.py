@@ -0,0 +1,114 @@
+"""Compiled single-race predictor built from a saved model artifact.
+
+The fitted pipeline expands every runner into all degree-5 monomials and the
+full one-hot block, but RFE keeps only ~30 of those columns. CompiledPredictor
+keeps just the surviving monomials (exponent tuples over the numeric features)
+and folds the surviving one-hot columns into per-category offsets, so scoring a
+race is a small power table, one gather and one dot product.
+"""
+
+import numpy as np
+
+from model_artifact import load_artifact
+
+
+class CompiledPredictor:
+    """
+    Predicts finish times from the columns selected in a model artifact
+    (see model_artifact.py), without building the full design matrix.
+    """
+
+    def __init__(self, artifact):
+        support = artifact["support"]
+        coef = artifact["coef"]
+        n_monomials = len(artifact["powers"])
+
+        # coefficients scattered back to the full column layout (zero where not selected)
+        full_coef = np.zeros(len(support))
+        full_coef[support] = coef
+
+        self.numeric_features = list(artifact["numeric_features"])
+        self.categorical_features = list(artifact["categorical_features"])
+        self.numeric_means = artifact["numeric_means"]
+        self.numeric_center = artifact["numeric_center"]
+        self.numeric_scale = artifact["numeric_scale"]
+        self.categorical_fill_value = artifact["categorical_fill_value"]
+
+        # surviving monomials; the constant term is folded into the intercept
+        monomial_support = np.flatnonzero(support[:n_monomials])
+        powers = artifact["powers"][monomial_support]
+        constant = powers.sum(axis=1) == 0
+        self.intercept = float(artifact["intercept"]) + full_coef[monomial_support[constant]].sum()
+        self.powers = powers[~constant]
+        self.monomial_coef = full_coef[monomial_support[~constant]]
+        self.degree = int(self.powers.max()) if len(self.powers) else 0
+
+        # surviving one-hot columns as {category: coefficient}, one dict per feature;
+        # unknown and unselected categories contribute nothing
+        self.category_offsets = []
+        column = n_monomials
+        for categories in artifact["categories"]:
+            coefs = full_coef[column:column + len(categories)]
+            self.category_offsets.append({c: w for c, w in zip(categories, coefs) if w != 0.0})
+            column += len(categories)
+
+        self._feature_index = np.arange(len(self.numeric_features))
+
+    @classmethod
+    def from_file(cls, model_file_path):
+        """
+        Builds a predictor from an artifact file written by linear_model.py --model_out.
+        """
+        return cls(load_artifact(model_file_path))
+
+    def predict_arrays(self, numeric, categorical):
+        """
+        Predicts finish times for a race given as arrays.
+
+        Arguments:
+        ----------
+        numeric
+            (np.array of shape (n_runners, n_numeric_features)) - numeric features in
+            the order of self.numeric_features; NaN for missing values
+        categorical
+            (sequence of sequences) - for each feature in self.categorical_features, its
+            value for every runner; None for missing values
+
+        Returns
+        -------
+        np.array of predicted finish times in seconds
+        """
+        numeric = np.asarray(numeric, dtype="float64")
+        numeric = np.where(np.isnan(numeric), self.numeric_means, numeric)
+        numeric = (numeric - self.numeric_center) / self.numeric_scale
+
+        # table[i, f, d] = numeric[i, f] ** d, then gather the exponents of each monomial
+        table = np.empty(numeric.shape + (self.degree + 1,))
+        table[:, :, 0] = 1.0
+        for d in range(1, self.degree + 1):
+            table[:, :, d] = table[:, :, d - 1] * numeric
+        monomials = table[:, self._feature_index, self.powers].prod(axis=2)
+
+        predictions = monomials @ self.monomial_coef + self.intercept
+        for offsets, column in zip(self.category_offsets, categorical):
+            if offsets:
+                predictions += [offsets.get(self.categorical_fill_value if v is None else v, 0.0) for v in column]
+        return predictions
+
+    def predict_records(self, runners):
+        """
+        Predicts finish times for a race given as a list of dicts (e.g. parsed JSON),
+        one per runner, keyed by feature name. Missing keys are treated as missing values.
+        """
+        numeric = [[np.nan if r.get(f) is None else r[f] for f in self.numeric_features] for r in runners]
+        categorical = [[r.get(f) for r in runners] for f in self.categorical_features]
+        return self.predict_arrays(np.array(numeric, dtype="float64").reshape(len(runners), -1), categorical)
+
+    def predict(self, data):
+        """
+        Predicts finish times for a Pandas DataFrame of runners.
+        """
+        numeric = data[self.numeric_features].to_numpy(dtype="float64")
+        categorical = [data[f].astype(object).fillna(self.categorical_fill_value).to_numpy()
+                       for f in self.categorical_features]
+        return self.predict_arrays(numeric, categorical)
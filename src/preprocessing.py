@@ -0,0 +1,192 @@
+"""Feature preprocessing shared by grid_search.py and linear_model.py.
+
+Applies imputer (mean) and a polynomial transformation to numeric features, and
+imputer (fill with "not_specified" constant value) and one-hot encoding to
+categorical features. Fitted preprocessors and transformed matrices can be kept
+in a FeatureCache (see feature_cache.py) so later stages reuse them.
+
+The feature matrix can be built in several modes. On 182k training rows at degree 5
+(268 columns; see benchmarks/bench_feature_modes.py), with the time and peak memory of
+fitting the preprocessing and of grid_search.py's 5-fold RFE path search:
+
+    mode                 matrix    fit             search
+    float64 (default)    372 MB    1.2 s, 763 MB   4.5 s, 151 MB
+    float32              186 MB    0.7 s, 368 MB   4.5 s, 126 MB
+    float64, sparse      530 MB    3.5 s, 1.8 GB   5.4 s, 210 MB
+    float32, sparse      243 MB    2.5 s, 1.0 GB   4.8 s, 137 MB
+
+float32 standardizes the numeric features before the polynomial expansion, so that
+degree-5 powers of e.g. stake (1e7 ** 5 = 1e35) stay far inside float32's range and
+precision; the expansion is then built in float32 directly. Standardizing can also be
+asked for on its own. It changes the polynomial basis, so RFE may keep different
+features (see the r2 column of the benchmark). The sparse mode keeps the one-hot block
+sparse but stores the dense polynomial block in CSR as well, so it only saves memory
+where many values are zero, e.g. standardized features imputed with their mean.
+"""
+
+from math import comb
+
+import numpy as np
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import FunctionTransformer, OneHotEncoder, PolynomialFeatures, StandardScaler
+from sklearn.impute import SimpleImputer
+from sklearn.compose import ColumnTransformer
+
+from feature_cache import cache_key, hash_data
+from instrument import stage
+
+CATEGORICAL_FEATURES = ["country", "dataset"]
+NUMERIC_FEATURES = ["declarwt", "age", "winodds", "stake", "distance"]
+DEFAULT_DEGREE = 5
+CATEGORICAL_FILL_VALUE = "not_specified"
+DTYPES = ["float64", "float32"]
+# part of the cache key of every fit: bump it whenever build_preprocessor() or
+# check_features() change what the preprocessing outputs, so cached fits are not reused
+PREPROCESSING_VERSION = 1
+
+
+def build_preprocessor(degree=DEFAULT_DEGREE, dtype="float64", sparse=False, standardize=False):
+    """
+    Builds the (unfitted) preprocessing pipeline for linear regression.
+
+    Arguments:
+    ----------
+    degree
+        (int) - degree of the polynomial expansion of the numeric features
+    dtype
+        (str) - "float64" or "float32", the dtype of the transformed matrix. float32
+        implies standardize
+    sparse
+        (bool) - output a scipy CSR matrix rather than a dense array
+    standardize
+        (bool) - scale the numeric features to zero mean and unit variance before
+        the polynomial expansion
+
+    Returns
+    -------
+    sklearn Pipeline
+    """
+    assert dtype in DTYPES, f"dtype must be one of {DTYPES}"
+
+    #define preprocessor for numeric features
+    numeric_steps = [('imputer', SimpleImputer(strategy='mean'))]
+    if standardize or dtype == "float32":
+        numeric_steps.append(('scaler', StandardScaler()))
+    if dtype == "float32":
+        # cast the few input columns, so the expansion is built in float32 without a float64 copy
+        numeric_steps.append(('cast', FunctionTransformer(np.asarray, kw_args={"dtype": dtype})))
+    numeric_steps.append(('poly', PolynomialFeatures(degree=degree)))
+    numeric_transformer = Pipeline(steps=numeric_steps)
+
+    #define preprocessor for categorical features. Categories only seen in rows
+    #dropped from the training set (e.g. with no finish time) are encoded as all zeros
+    categorical_transformer = Pipeline(steps=[('imputer', SimpleImputer(strategy='constant', fill_value=CATEGORICAL_FILL_VALUE)),
+                                              ('one_hot_encoder',  OneHotEncoder(handle_unknown="ignore", dtype=dtype))
+                                             ])
+
+    #combine numeric and categorical pipelines, as one sparse matrix or one dense array
+    preprocessing = ColumnTransformer(
+                                 transformers=[
+                                    ('num', numeric_transformer, NUMERIC_FEATURES),
+                                    ('cat', categorical_transformer, CATEGORICAL_FEATURES)
+                                              ],
+                                 sparse_threshold=1.0 if sparse else 0.0)
+
+    return Pipeline([
+        ('data_preprocessing', preprocessing),
+    ])
+
+
+def check_features(X):
+    """
+    Asserts that X has the columns the preprocessor needs, and returns it with the
+    numeric features as float64 (they may be stored as float32; the polynomial
+    terms are expanded in float64).
+    """
+    assert all([x in X.columns for x in CATEGORICAL_FEATURES]), "Must have colums 'country', 'dataset'"
+    assert all([x in X.columns for x in NUMERIC_FEATURES]), "Must have colums 'declarwt', 'age', 'winodds', 'stake', 'distance'"
+
+    return X.astype({feature: "float64" for feature in NUMERIC_FEATURES})
+
+
+def n_output_columns(X, degree=DEFAULT_DEGREE):
+    """
+    Returns the number of columns build_preprocessor(degree) outputs when fitted on
+    the features X, without fitting it: the polynomial terms of the numeric features
+    (including the constant), and one column per category, counting the fill value
+    if a feature has missing values.
+    """
+    n_categories = sum(X[feature].nunique() + int(X[feature].isna().any()) for feature in CATEGORICAL_FEATURES)
+    return comb(len(NUMERIC_FEATURES) + degree, degree) + n_categories
+
+
+def fit_preprocessor(X_train, degree=DEFAULT_DEGREE, cache=None, dtype="float64", sparse=False, standardize=False):
+    """
+    Fits the preprocessing pipeline on the training features and transforms them.
+
+    Arguments:
+    ----------
+    X_train
+        (pd.DataFrame) - training features
+    degree
+        (int) - degree of the polynomial expansion of the numeric features
+    dtype, sparse, standardize
+        the matrix mode, see build_preprocessor()
+    cache
+        (FeatureCache or None) - cache for the fitted pipeline and transformed matrix
+
+    Returns
+    -------
+    full_pipeline, X_train_preprocessed, fit_key
+        fitted pipeline, preprocessed training features, and the cache key of the fit
+        (used to key transforms of other data with this pipeline)
+    """
+    X_train = check_features(X_train)
+    mode = {"dtype": dtype, "sparse": sparse, "standardize": standardize}
+    fit_key = cache_key("fit", hash_data(X_train), {"version": PREPROCESSING_VERSION,
+                                                    "degree": degree,
+                                                    "numeric": NUMERIC_FEATURES,
+                                                    "categorical": CATEGORICAL_FEATURES,
+                                                    **mode})
+
+    with stage("fit_transform", rows_in=len(X_train), degree=degree, cached=True, **mode) as current:
+        def compute():
+            current.set(cached=False)
+            full_pipeline = build_preprocessor(degree, dtype, sparse, standardize)
+            return {"pipeline": full_pipeline, "X": full_pipeline.fit_transform(X_train)}
+
+        fitted = cache.get_or_compute(fit_key, compute) if cache is not None else compute()
+        current.rows_out = fitted["X"].shape[0]
+        current.set(n_columns=fitted["X"].shape[1])
+    return fitted["pipeline"], fitted["X"], fit_key
+
+
+def transform_features(full_pipeline, X, fit_key, cache=None):
+    """
+    Transforms features with a pipeline fitted by fit_preprocessor().
+
+    Arguments:
+    ----------
+    full_pipeline
+        fitted preprocessing pipeline
+    X
+        (pd.DataFrame) - features to transform
+    fit_key
+        (str) - cache key of the fit, as returned by fit_preprocessor()
+    cache
+        (FeatureCache or None) - cache for the transformed matrix
+
+    Returns
+    -------
+    preprocessed features
+    """
+    X = check_features(X)
+    with stage("transform", rows_in=len(X), cached=cache is not None) as current:
+        def compute():
+            current.set(cached=False)
+            return full_pipeline.transform(X)
+
+        X_preprocessed = compute() if cache is None else \
+            cache.get_or_compute(cache_key("transform", fit_key, hash_data(X)), compute)
+        current.rows_out = X_preprocessed.shape[0]
+    return X_preprocessed
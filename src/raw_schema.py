@@ -0,0 +1,97 @@
+"""Schemas of the five raw tables downloaded by download_data.py.
+
+Each table lists the columns the pipeline uses with their dtypes; repeated
+low-cardinality text is read as categoricals and date columns are parsed on
+read. The Chinese (_ch) columns, which are dropped by the merge anyway, are not
+listed, so they are never parsed or held in memory. All readers of the raw
+files go through read_raw().
+"""
+
+import pandas as pd
+
+RAW_TABLES = ["horse_info", "results", "comments", "trackwork", "barrier"]
+# dtype of the date columns, which are parsed on read
+DATE = "datetime64[ns]"
+
+# int64 columns must never be missing. Integers that can be missing (e.g. a race
+# without a class) are nullable Int64, so they stay integers in the wrangled data and
+# in the row keys; other numbers that can be missing are float64.
+# plc mixes places with codes (e.g. "DISQ") and is a merge key, so it is text everywhere.
+SCHEMAS = {
+    "horse_info": {
+        "horse": "str", "country": "category", "trainer": "category", "colour": "category",
+        "sex": "category", "owner": "str", "import_type": "category", "current_rating": "float64",
+        "start_rating": "float64", "sire": "str", "dam": "str", "age": "float64",
+    },
+    "results": {
+        "row": "int64", "plc": "str", "horseno": "float64", "horse": "str", "jockey": "category",
+        "trainer": "category", "actualwt": "float64", "declarwt": "float64", "draw": "float64",
+        "lbw": "str", "runningpos": "str", "finishtime": "str", "winodds": "float64", "date": DATE,
+        "raceno": "Int64", "class": "Int64", "distance": "Int64", "going": "category", "handicap": "str",
+        "course": "category", "stake": "Int64", "venue": "category",
+    },
+    "comments": {
+        "horseno": "float64", "date": DATE, "raceno": "Int64", "plc": "str", "horse": "str",
+        "comment": "str",
+    },
+    "trackwork": {
+        "horse": "str", "date": DATE, "type": "category", "venue": "category", "workout": "str",
+        "gear": "category",
+    },
+    "barrier": {
+        "plc": "str", "horse": "str", "jockey": "category", "trainer": "category", "draw": "float64",
+        "gear": "category", "lbw": "str", "runningpos": "str", "time": "str", "comment": "str",
+        "date": DATE, "distance": "Int64", "going": "category", "raceno": "Int64", "venue": "category",
+        "course": "category", "result": "category",
+    },
+}
+
+
+def raw_dtypes(name, categorical=True):
+    """
+    Returns the dtypes of a raw table's columns.
+
+    Parameters
+    ----------
+    name
+        the table name, one of RAW_TABLES
+    categorical
+        whether to keep categorical columns as categoricals; if False they are text
+
+    Returns
+    -------
+        dict of column name to dtype
+    """
+    dtypes = SCHEMAS[name]
+    if not categorical:
+        dtypes = {column: "str" if dtype == "category" else dtype for column, dtype in dtypes.items()}
+    return dtypes
+
+
+def read_raw(filepath, name, categorical=True, chunksize=None):
+    """
+    Reads a raw table with its declared dtypes, reading only the declared columns
+    and parsing its date columns.
+
+    Parameters
+    ----------
+    filepath
+        the directory holding the raw .csv files
+    name
+        the table name, one of RAW_TABLES
+    categorical
+        whether to read categorical columns as categoricals; chunks of a file get
+        different categories, so streamed chunks are usually read as text
+    chunksize
+        if given, return an iterator of data frames of this many rows
+
+    Returns
+    -------
+        a Pandas DataFrame, or an iterator of them
+    """
+    dtypes = raw_dtypes(name, categorical)
+    dates = [column for column, dtype in dtypes.items() if dtype == DATE]
+    return pd.read_csv(f"{filepath}/{name}.csv", index_col=0,
+                       usecols=lambda column: column in dtypes or column.startswith("Unnamed: 0"),
+                       dtype={column: dtype for column, dtype in dtypes.items() if column not in dates},
+                       parse_dates=dates, chunksize=chunksize)
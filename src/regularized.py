@@ -0,0 +1,251 @@
+"""Ridge, lasso and elastic net regularization paths for grid_search.py and linear_model.py.
+
+Instead of choosing the model size with recursive feature elimination, these models
+keep every column of the degree-5 design matrix and shrink the coefficients. The
+penalty follows sklearn's ElasticNet,
+
+    1 / (2 n) ||y - X w||^2 + alpha * l1_ratio ||w||_1 + alpha * (1 - l1_ratio) / 2 ||w||^2
+
+with l1_ratio = 0 for ridge and 1 for lasso, on columns centered and scaled to unit
+standard deviation (the raw degree-5 columns differ by dozens of orders of
+magnitude, so an unscaled penalty would only ever shrink the smallest of them).
+Coefficients are returned in the units of the unscaled columns.
+
+Everything is computed from the centered Gram statistics, accumulated block by block
+(see gram.py), so a fold costs one pass over its rows:
+
+- ridge: one eigendecomposition G = V diag(s) V^T of the scaled Gram matrix per
+  fold, after which the coefficients for every alpha are V diag(1 / (s + alpha)) V^T q,
+  a single matrix product for the whole alpha grid
+- lasso and elastic net: sklearn's coordinate descent path (enet_path), from the
+  largest alpha down with each solution warm starting the next. It runs on the
+  (p + 1) x p Cholesky factor of the augmented Gram matrix, which has the same
+  objective as the n x p design matrix, so the cost per sweep does not grow with
+  the number of rows
+"""
+
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed, effective_n_jobs
+from sklearn.linear_model import enet_path
+from sklearn.metrics import r2_score
+
+from fold_cv import cv_folds, fold_matrices
+from gram import accumulate_statistics, gram_factor
+from instrument import stage
+from preprocessing import fit_preprocessor
+from rfe_path import share_array
+
+MODELS = ["linear", "ridge", "lasso", "elasticnet"]
+# 50 alphas from 1e-6 to 10, as "log10 low:log10 high:count"
+DEFAULT_ALPHAS = "-6:1:50"
+DEFAULT_L1_RATIO = 0.5
+# coordinate descent sweeps per alpha; small alphas on collinear columns converge slowly
+ENET_MAX_ITER = 10000
+# duality gap relative to ||y||^2 at which coordinate descent stops (sklearn's default is 1e-4)
+ENET_TOL = 1e-6
+
+
+def parse_alphas(alphas):
+    """
+    Parses the --alphas option: comma separated values (e.g. "0.01,0.1,1"), or
+    "low:high:count" for count values evenly spaced from 10**low to 10**high.
+
+    Returns:
+    --------
+    np.array of alphas, largest first (the order of the regularization path)
+    """
+    if ":" in str(alphas):
+        low, high, count = str(alphas).split(":")
+        parsed = np.logspace(float(low), float(high), int(count))
+    else:
+        parsed = np.array([float(alpha) for alpha in str(alphas).split(",")])
+
+    assert (parsed > 0).all(), "Alphas must be positive"
+    return np.sort(np.unique(parsed))[::-1]
+
+
+def model_l1_ratio(model, l1_ratio=DEFAULT_L1_RATIO):
+    """
+    Returns the l1_ratio of a regularized model: 0 for ridge, 1 for lasso and
+    l1_ratio for elastic net.
+    """
+    assert model in MODELS[1:], f"model must be one of {MODELS[1:]}"
+    return {"ridge": 0.0, "lasso": 1.0}.get(model, float(l1_ratio))
+
+
+def statistics_path(XtX, Xty, yty, n_rows, alphas, l1_ratio):
+    """
+    Solves the regularization path from centered Gram statistics.
+
+    Arguments:
+    ----------
+    XtX, Xty, yty
+        (np.array, np.array, float) - centered Gram statistics (see gram.gram_statistics())
+    n_rows
+        (int) - number of rows the statistics were accumulated over
+    alphas
+        (np.array) - penalties, largest first
+    l1_ratio
+        (float) - share of the penalty on the l1 norm, 0 for ridge
+
+    Returns:
+    --------
+    np.array of shape (len(alphas), p) - coefficients of the unscaled columns
+    """
+    p = XtX.shape[0]
+    std = np.sqrt(np.diag(XtX) / n_rows)
+    std[std == 0] = 1.0
+
+    if l1_ratio == 0:
+        gram = XtX / np.outer(std, std) / n_rows
+        s, V = np.linalg.eigh(gram)
+        # the scaled Gram matrix is positive semi-definite; clip rounding below zero
+        s = np.maximum(s, 0.0)
+        coef_path = V @ ((V.T @ (Xty / std / n_rows))[:, None] / (s[:, None] + alphas[None, :]))
+        return coef_path.T / std
+
+    # a (p + 1) x p problem with the same objective as the n x p one: its Gram matrix,
+    # cross products and squared norm of y are the scaled statistics divided by n
+    R_aug, scale = gram_factor(XtX, Xty, yty)
+    n_factor = p + 1
+    X_factor = np.sqrt(n_factor) * R_aug[:, :p]
+    y_factor = np.sqrt(n_factor / n_rows) * R_aug[:, p]
+    _, coef_path, _ = enet_path(X_factor, y_factor, l1_ratio=l1_ratio, alphas=alphas, precompute=True,
+                                max_iter=ENET_MAX_ITER, tol=ENET_TOL)
+    # gram_factor() scales the columns by sqrt(n) standard deviations; the factor carries the sqrt(n)
+    return coef_path.T / scale * np.sqrt(n_rows)
+
+
+def regularization_path(X, y, alphas, l1_ratio, rows=None):
+    """
+    Fits the regularization path with an intercept, reading the rows of X in blocks.
+
+    Arguments:
+    ----------
+    X
+        (np.array or sparse matrix) - design matrix
+    y
+        (np.array) - targets, one per row of X (or per row in rows)
+    alphas
+        (np.array) - penalties, largest first
+    l1_ratio
+        (float) - see model_l1_ratio()
+    rows
+        (np.array) - row indices of X to use, e.g. a training fold; all rows if None
+
+    Returns:
+    --------
+    coef_path, intercept_path
+        (np.array, np.array) - coefficients and intercept for each alpha
+    """
+    y = np.asarray(y, dtype="float64")
+    XtX, Xty, yty, X_mean = accumulate_statistics(X, y, rows)
+    coef_path = statistics_path(XtX, Xty, yty, len(y), alphas, l1_ratio)
+    return coef_path, y.mean() - coef_path @ X_mean
+
+
+def score_regularized_fold(X_train, y_train, X_val, y_val, alphas, l1_ratio, rows=None, fold=None):
+    """
+    Fits the regularization path on a training fold and scores every alpha on the
+    validation fold (see rfe_path.score_path() for the arguments).
+
+    Returns:
+    --------
+    test_scores, fit_times, n_nonzero, peak_rss
+        r2, fit time and number of nonzero coefficients per alpha, and the peak
+        resident set size in bytes while the fold ran
+    """
+    with stage("cv_fold", rows_in=len(y_train), fold=fold, n_alphas=len(alphas), l1_ratio=l1_ratio) as current:
+        start = time.perf_counter()
+        coef_path, intercept_path = regularization_path(X_train, y_train, alphas, l1_ratio, rows)
+        fit_time = time.perf_counter() - start
+
+        predictions = X_val @ coef_path.T + intercept_path
+        test_scores = np.array([r2_score(y_val, predictions[:, j]) for j in range(len(alphas))])
+        current.rows_out = len(y_val)
+
+    return test_scores, np.full(len(alphas), fit_time), (coef_path != 0).sum(axis=1), current.peak_rss
+
+
+def score_local_regularized_fold(X, y, train_idx, val_idx, alphas, l1_ratio, degree, fold, cache, dtype, sparse,
+                                 standardize):
+    """
+    score_regularized_fold() with the preprocessing fitted on the training fold (see fold_cv.py).
+    """
+    X_fold_train, X_fold_val = fold_matrices(X, train_idx, val_idx, degree, cache, dtype, sparse, standardize)
+    return score_regularized_fold(X_fold_train, y[train_idx], X_fold_val, y[val_idx], alphas, l1_ratio, fold=fold)
+
+
+def score_regularized(X, y, degrees, model, alphas, l1_ratio=DEFAULT_L1_RATIO, cv=5, split="kfold", dates=None,
+                      fold_preprocessing=False, n_jobs=1, cache=None, dtype="float64", sparse=False,
+                      standardize=False):
+    """
+    Cross-validates a regularized model for every (degree, alpha) candidate, with one
+    regularization path per degree and fold.
+
+    Arguments:
+    ----------
+    X, y
+        (pd.DataFrame, np.array) - training features and targets
+    degrees
+        (list of int) - degrees of the polynomial features
+    model
+        (str) - "ridge", "lasso" or "elasticnet"
+    alphas
+        (np.array) - penalties, see parse_alphas()
+    l1_ratio
+        (float) - elastic net mixing, see model_l1_ratio()
+    cv, split, dates, fold_preprocessing
+        - cross-validation folds and preprocessing, see halving_search.score_candidates()
+    n_jobs
+        (int) - number of worker processes for the folds
+    cache, dtype, sparse, standardize
+        - as for preprocessing.fit_preprocessor()
+
+    Returns:
+    --------
+    pd.DataFrame with columns "n_features_to_select" (the mean number of nonzero
+    coefficients), "mean_val_score (r2)", "fit time per fold (s)", "degree", "model",
+    "alpha" and "l1_ratio", one row per candidate
+    """
+    y = np.asarray(y)
+    l1_ratio = model_l1_ratio(model, l1_ratio)
+    folds = cv_folds(len(y), cv, split, dates)
+    workers = min(effective_n_jobs(n_jobs), len(folds))
+
+    scored = []
+    for degree in degrees:
+        with stage("regularization_path_search", rows_in=len(y), model=model, degree=degree, n_alphas=len(alphas),
+                   split=split, preprocessing="fold" if fold_preprocessing else "global", n_jobs=n_jobs):
+            if fold_preprocessing:
+                score = delayed(score_local_regularized_fold) if workers > 1 else score_local_regularized_fold
+                tasks = [score(X, y, train_idx, val_idx, alphas, l1_ratio, degree, fold, cache, dtype, sparse,
+                               standardize) for fold, (train_idx, val_idx) in enumerate(folds)]
+                results = Parallel(n_jobs=workers)(tasks) if workers > 1 else tasks
+            else:
+                _, X_preprocessed, _ = fit_preprocessor(X, degree, cache=cache, dtype=dtype, sparse=sparse,
+                                                        standardize=standardize)
+                if workers > 1:
+                    with tempfile.TemporaryDirectory() as folder:
+                        X_shared = share_array(X_preprocessed, folder)
+                        results = Parallel(n_jobs=workers, max_nbytes=None)(
+                            delayed(score_regularized_fold)(X_shared, y[train_idx], X_shared[val_idx], y[val_idx],
+                                                            alphas, l1_ratio, train_idx, fold)
+                            for fold, (train_idx, val_idx) in enumerate(folds))
+                        del X_shared
+                else:
+                    results = [score_regularized_fold(X_preprocessed, y[train_idx], X_preprocessed[val_idx],
+                                                      y[val_idx], alphas, l1_ratio, train_idx, fold)
+                               for fold, (train_idx, val_idx) in enumerate(folds)]
+                del X_preprocessed
+
+        test_scores, fit_times, n_nonzero, _ = zip(*results)
+        scored.append(pd.DataFrame({"n_features_to_select": np.rint(np.mean(n_nonzero, axis=0)).astype(int),
+                                    "mean_val_score (r2)": np.mean(test_scores, axis=0),
+                                    "fit time per fold (s)": np.mean(fit_times, axis=0),
+                                    "degree": degree, "model": model, "alpha": alphas, "l1_ratio": l1_ratio}))
+    return pd.concat(scored)
@@ -0,0 +1,240 @@
+"""Path-based recursive feature elimination for grid_search.py.
+
+RFE with step=1 removes one feature at a time, and which feature goes next does
+not depend on where elimination will stop. The feature set RFE keeps for
+n_features_to_select=k is therefore exactly the k features that survive longest
+on the full elimination path. Running the elimination once per fold and reading
+every grid size off that single ranking replaces one full elimination per
+(candidate, fold) with one per fold.
+
+The elimination itself runs through sklearn's RFE, which refits LinearRegression
+on the full design matrix at every step.
+"""
+
+import os
+import tempfile
+import time
+
+import numpy as np
+from joblib import Parallel, delayed, dump, effective_n_jobs, load
+
+from sklearn.feature_selection import RFE
+from sklearn.linear_model import LinearRegression
+from sklearn.metrics import r2_score
+from sklearn.model_selection import KFold, check_cv
+
+from checkpoint import FoldCells
+from instrument import stage
+
+ENGINES = ["sklearn"]
+# seed of the shuffled KFold splits, so every search over the same rows uses the same folds
+CV_SEED = 0
+
+
+def shuffled_kfold(cv=5):
+    """
+    Returns the cross-validation splitter of a number of folds: KFold(cv) over rows
+    shuffled with CV_SEED. The wrangled data sets are written in merge order (race
+    results, then barrier trials), so unshuffled folds would split by source.
+    """
+    return KFold(cv, shuffle=True, random_state=CV_SEED)
+
+
+def elimination_ranking(X, y, engine="sklearn"):
+    """
+    Runs recursive feature elimination with linear regression all the way down to
+    a single feature and returns the resulting ranking.
+
+    Arguments:
+    ----------
+    X
+        (np.array or sparse matrix) - design matrix
+    y
+        (np.array) - targets
+    engine
+        (str) - "sklearn" to refit LinearRegression on X (densified, if sparse) at
+        every step
+
+    Returns:
+    --------
+    ranking
+        (np.array) - ranking[j] is the number of features left when feature j was
+        eliminated, so `ranking <= k` is the support RFE selects for k features
+    """
+    assert engine in ENGINES, f"engine must be one of {ENGINES}"
+
+    # LinearRegression solves sparse problems iteratively (lsqr), far slower than dense least squares
+    if hasattr(X, "toarray"):
+        X = X.toarray()
+    rfe = RFE(LinearRegression(), n_features_to_select=1, step=1)
+    rfe.fit(X, y)
+    return rfe.ranking_
+
+
+def share_array(X, folder):
+    """
+    Writes X once to a file in folder and returns a read-only memory-mapped view of it.
+    joblib passes memory-mapped arrays to worker processes by file name, so every
+    worker reads the same pages instead of unpickling its own copy.
+
+    Arguments:
+    ----------
+    X
+        (np.array or sparse matrix) - array to share
+    folder
+        (str) - directory for the backing file
+
+    Returns:
+    --------
+    memory-mapped copy of X
+    """
+    file_path = os.path.join(folder, "X.joblib")
+    dump(X, file_path)
+    return load(file_path, mmap_mode="r")
+
+
+def score_path(X_train, y_train, X_val, y_val, n_features_grid, engine, rows=None):
+    """
+    Runs the elimination path on training data and scores every grid size on
+    validation data.
+
+    Arguments:
+    ----------
+    X_train, y_train
+        (np.array or sparse matrix, np.array) - training design matrix and the targets of
+        the training rows
+    X_val, y_val
+        (np.array or sparse matrix, np.array) - validation design matrix and targets
+    n_features_grid
+        (list of int) - numbers of features to select
+    engine
+        (str) - elimination engine, see elimination_ranking()
+    rows
+        (np.array) - the training rows of X_train, or None for all of them
+
+    Returns:
+    --------
+    test_scores, fit_times
+        (np.array, np.array) - r2 and fit time per grid size
+    """
+    test_scores = np.zeros(len(n_features_grid))
+    fit_times = np.zeros(len(n_features_grid))
+
+    start = time.perf_counter()
+    X_fold_train = X_train[rows] if rows is not None else X_train
+    if hasattr(X_fold_train, "toarray"):
+        X_fold_train = X_fold_train.toarray()
+    ranking = elimination_ranking(X_fold_train, y_train, engine)
+    path_time = time.perf_counter() - start
+    for j, n_features in enumerate(n_features_grid):
+        support = ranking <= n_features
+
+        start = time.perf_counter()
+        lr = LinearRegression().fit(X_fold_train[:, support], y_train)
+        fit_times[j] = path_time + time.perf_counter() - start
+
+        test_scores[j] = r2_score(y_val, lr.predict(X_val[:, support]))
+    return test_scores, fit_times
+
+
+def score_fold(X, y, train_idx, val_idx, n_features_grid, engine, fold=None):
+    """
+    Runs the elimination path on one training fold and scores every grid size on the
+    validation fold.
+
+    Arguments:
+    ----------
+    X, y
+        (np.array or sparse matrix, np.array) - full design matrix and targets
+    train_idx, val_idx
+        (np.array) - row indices of the fold
+    n_features_grid
+        (list of int) - numbers of features to select
+    engine
+        (str) - elimination engine, see elimination_ranking()
+    fold
+        (int) - fold number, recorded with the fold's stage (see instrument.py)
+
+    Returns:
+    --------
+    test_scores, fit_times, peak_rss
+        (np.array, np.array, int) - r2 and fit time per grid size, and the peak resident
+        set size in bytes while the fold ran (see instrument.stage())
+    """
+    with stage("cv_fold", rows_in=len(train_idx), fold=fold, engine=engine) as current:
+        test_scores, fit_times = score_path(X, y[train_idx], X[val_idx], y[val_idx], n_features_grid, engine,
+                                            rows=train_idx)
+        current.rows_out = len(val_idx)
+
+    return test_scores, fit_times, current.peak_rss
+
+
+def rfe_path_search(X, y, n_features_grid, cv=5, engine="sklearn", n_jobs=1, checkpoint=None, checkpoint_key=None):
+    """
+    Cross-validated scores of RFE with linear regression for every number of
+    features in n_features_grid, computing the elimination path once per fold.
+    Uses the same splits and r2 scoring as GridSearchCV(RFE(LinearRegression()), cv=shuffled_kfold(cv)).
+
+    With n_jobs > 1 the folds run in parallel worker processes, which all read X
+    from a single memory-mapped file. At most cv workers are used.
+
+    With a checkpoint, the scores of each fold are recorded as it comes back, and
+    folds whose scores are already recorded are not run again (see checkpoint.py).
+
+    Arguments:
+    ----------
+    X
+        (np.array) - design matrix
+    y
+        (np.array) - targets
+    n_features_grid
+        (list of int) - numbers of features to select
+    cv
+        (int or list of (train_idx, val_idx)) - number of cross-validation folds (see
+        shuffled_kfold()), or the folds themselves (see fold_cv.cv_folds())
+    engine
+        (str) - elimination engine, see elimination_ranking()
+    n_jobs
+        (int) - number of worker processes, -1 for one per core
+    checkpoint, checkpoint_key
+        (checkpoint.SearchCheckpoint, str) - where to record and look up the scores
+        of each (fold, grid size) cell, and the key of this search, or None
+
+    Returns:
+    --------
+    dict with arrays "mean_test_score" and "mean_fit_time", aligned with
+    n_features_grid, and "peak_rss", the largest peak resident set size in bytes
+    while any fold ran (0 if none ran). The fit time of a candidate is the fold's
+    elimination time plus the refit on its selected features, averaged over folds.
+    """
+    y = np.asarray(y)
+    n_features_grid = list(n_features_grid)
+    assert all(1 <= k <= X.shape[1] for k in n_features_grid), \
+        f"n_features_to_select must be between 1 and {X.shape[1]}"
+
+    folds = list(check_cv(shuffled_kfold(cv) if isinstance(cv, int) else cv, y, classifier=False).split(X, y))
+    cells = FoldCells(len(folds), n_features_grid, checkpoint, checkpoint_key)
+    jobs = cells.pending()
+    peak_rss = [0]
+
+    if n_jobs == 1 or len(jobs) <= 1:
+        for fold, grid in jobs:
+            test_scores, fit_times, rss = score_fold(X, y, *folds[fold], grid, engine, fold)
+            cells.record(fold, grid, test_scores, fit_times)
+            peak_rss.append(rss)
+    else:
+        with tempfile.TemporaryDirectory() as folder:
+            X_shared = share_array(X, folder)
+            # max_nbytes=None: X is already memory-mapped, y and the indices are small.
+            # results come back in fold order as they finish, so each is recorded straight away
+            results = Parallel(n_jobs=min(effective_n_jobs(n_jobs), len(jobs)), max_nbytes=None, return_as="generator")(
+                delayed(score_fold)(X_shared, y, *folds[fold], grid, engine, fold) for fold, grid in jobs)
+            for (fold, grid), (test_scores, fit_times, rss) in zip(jobs, results):
+                cells.record(fold, grid, test_scores, fit_times)
+                peak_rss.append(rss)
+            del X_shared
+
+    mean_test_score, mean_fit_time = cells.results()
+    return {"mean_test_score": mean_test_score,
+            "mean_fit_time": mean_fit_time,
+            "peak_rss": max(peak_rss)}
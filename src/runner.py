@@ -0,0 +1,312 @@
+"""This script runs the pipeline as a graph of stages: download -> wrangle ->
+{eda, grid_search} -> linear_model. Each stage is a pipeline.py command.
+
+A stage is skipped when the content hashes of its input files, of its code and of
+its command line all match its last successful run, and its outputs are unchanged
+since then. Timestamps are never compared, so a fresh checkout or a `touch` does not
+rerun anything. A stage whose upstream reran but wrote the same bytes is skipped as
+well. The hashes are kept in a state file next to the data. File hashes are cached
+by size and modification time, so unchanged large files are not read again.
+Stages whose inputs are ready run at the same time, e.g. eda and grid_search.
+
+Usage: runner.py [<stages>...] [--url=<url>] [--n_jobs=<n_jobs>] [--force=<stages>] [--dry_run] [--state=<state_file_path>] [--trace=<trace_file_path>]
+
+Arguments:
+<stages>                    Stages to bring up to date, with their upstream stages [default: all]
+
+Options:
+--url=<url>                 Url where the raw data is hosted [default: https://raw.githubusercontent.com/v5y8/horse_race_data/master]
+--n_jobs=<n_jobs>           Number of stages run at the same time [default: 2]
+--force=<stages>            Comma separated stages to run even if up to date, e.g. "download" to
+                            check the data host for new files
+--dry_run                   Only print which stages would run
+--state=<state_file_path>   File recording the hashes of the last successful runs [default: data/.pipeline_state.json]
+--trace=<trace_file_path>   Passed on to every stage (see instrument.py)
+"""
+
+import ast
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from docopt import docopt
+
+from pipeline import COMMANDS
+
+SRC_PATH = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_URL = "https://raw.githubusercontent.com/v5y8/horse_race_data/master"
+RAW_FILES = [f"data/raw_files/{name}.csv" for name in ["barrier", "comments", "horse_info", "results", "trackwork"]]
+EDA_IMAGES = [f"img/{name}.png" for name in ["age_dist", "correlation_plot", "country_dist", "heatmap_null", "weight_dist"]]
+
+
+class Stage:
+    """
+    A pipeline stage: a pipeline.py command with the files it reads and writes.
+    """
+
+    def __init__(self, name, command, inputs, outputs, needs=()):
+        self.name = name
+        self.command = command
+        self.inputs = inputs
+        self.outputs = outputs
+        self.needs = list(needs)
+
+
+def pipeline_stages(url):
+    """
+    Returns the stages of the pipeline, in graph order: the same graph as the Makefile.
+    """
+    return [
+        Stage("download", ["download", url, "data/raw_files"], [], RAW_FILES),
+        Stage("wrangle", ["wrangle", "data/raw_files", "data"], RAW_FILES,
+              ["data/data_train.csv", "data/data_test.csv", "data/data_train.parquet", "data/data_test.parquet"],
+              needs=["download"]),
+        Stage("eda", ["eda", "data", "img"], ["data/data_train.parquet"], EDA_IMAGES, needs=["wrangle"]),
+        Stage("grid_search", ["grid_search", "data/data_train.parquet", "data/results_data/grid_search_results.csv",
+                              "--cache_dir=data/feature_cache"],
+              ["data/data_train.parquet"], ["data/results_data/grid_search_results.csv"], needs=["wrangle"]),
+        Stage("linear_model", ["linear_model", "data/data_train.parquet", "data/data_test.parquet",
+                               "data/results_data/grid_search_results.csv", "img/results_plot.png",
+                               "--cache_dir=data/feature_cache", "--model_out=data/results_data/model.json"],
+              ["data/data_train.parquet", "data/data_test.parquet", "data/results_data/grid_search_results.csv"],
+              ["img/results_plot.png", "data/results_data/model.json"], needs=["grid_search"]),
+    ]
+
+
+# printing from concurrent stages
+print_lock = threading.Lock()
+
+
+def code_modules(module):
+    """
+    Returns the modules in src/ that a module imports, directly or indirectly, itself included.
+    """
+    found, pending = set(), [module]
+    while pending:
+        name = pending.pop()
+        path = os.path.join(SRC_PATH, f"{name}.py")
+        if name in found or not os.path.exists(path):
+            continue
+        found.add(name)
+        with open(path) as f:
+            tree = ast.parse(f.read())
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                pending.extend(alias.name for alias in node.names)
+            elif isinstance(node, ast.ImportFrom) and node.module and node.level == 0:
+                pending.append(node.module)
+    return sorted(found)
+
+
+class FileHasher:
+    """
+    Content hashes of files and directories, cached by path, size and modification time.
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+        self.lock = threading.Lock()
+
+    def file_hash(self, path):
+        stat = os.stat(path)
+        signature = [stat.st_size, stat.st_mtime_ns]
+        with self.lock:
+            cached = self.cache.get(path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(2**20), b""):
+                digest.update(block)
+        with self.lock:
+            self.cache[path] = [signature, digest.hexdigest()]
+        return digest.hexdigest()
+
+    def hash(self, path):
+        """
+        Returns the hash of a file, of a directory's files (e.g. Parquet parts), or None if missing.
+        """
+        if os.path.isdir(path):
+            digest = hashlib.sha256()
+            for root, _, names in sorted(os.walk(path)):
+                for name in sorted(names):
+                    file_path = os.path.join(root, name)
+                    digest.update(f"{os.path.relpath(file_path, path)}:{self.file_hash(file_path)}".encode())
+            return digest.hexdigest()
+        return self.file_hash(path) if os.path.exists(path) else None
+
+
+def stage_key(stage, hasher):
+    """
+    Returns the hash of a stage's input contents, code and command line.
+    """
+    code = code_modules(COMMANDS[stage.command[0]])
+    parts = {"command": stage.command,
+             "inputs": {path: hasher.hash(path) for path in stage.inputs},
+             "code": {name: hasher.hash(os.path.join(SRC_PATH, f"{name}.py")) for name in code}}
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+
+def up_to_date(stage, key, state, hasher):
+    """
+    Returns whether the stage last succeeded with this key and its outputs are as it left them.
+    """
+    last = state["stages"].get(stage.name)
+    return (last is not None and last["key"] == key and
+            all(hasher.hash(path) == last["outputs"].get(path) for path in stage.outputs))
+
+
+def selected_stages(stages, targets):
+    """
+    Returns the target stages and everything upstream of them, in graph order.
+    """
+    by_name = {stage.name: stage for stage in stages}
+    assert all(target in by_name for target in targets), f"stages must be among {list(by_name)}"
+    selected, pending = set(), list(targets)
+    while pending:
+        name = pending.pop()
+        if name not in selected:
+            selected.add(name)
+            pending.extend(by_name[name].needs)
+    return [stage for stage in stages if stage.name in selected]
+
+
+def read_state(state_file_path):
+    if os.path.exists(state_file_path):
+        with open(state_file_path) as f:
+            return json.load(f)
+    return {"stages": {}, "file_hashes": {}}
+
+
+def write_state(state, state_file_path, hasher):
+    """
+    Writes the state atomically. Its file hashes are the hasher's cache, which stages
+    still running add to from other threads, so the state is serialized under its lock.
+    """
+    with hasher.lock:
+        text = json.dumps(state, indent=2, sort_keys=True)
+    os.makedirs(os.path.dirname(state_file_path) or ".", exist_ok=True)
+    temp_path = f"{state_file_path}.tmp"
+    with open(temp_path, "w") as f:
+        f.write(text)
+    os.replace(temp_path, state_file_path)
+
+
+def run_command(stage, extra_args):
+    """
+    Runs a stage's command, printing its output lines prefixed with the stage name.
+    Returns the exit status.
+    """
+    process = subprocess.Popen([sys.executable, os.path.join(SRC_PATH, "pipeline.py"), *stage.command, *extra_args],
+                               stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    for line in process.stdout:
+        if line.strip():
+            with print_lock:
+                print(f"[{stage.name}] {line}", end="", flush=True)
+    return process.wait()
+
+
+def run(targets=None, url=DEFAULT_URL, n_jobs=2, force=(), dry_run=False, state_file_path="data/.pipeline_state.json",
+        trace_file_path=None):
+    """
+    Brings the target stages up to date, running independent stages concurrently.
+
+    Parameters
+    ----------
+    targets
+        names of the stages to bring up to date, with their upstream stages; all if None
+    url
+        the url where the raw data is hosted
+    n_jobs
+        the number of stages run at the same time
+    force
+        names of stages to run even if up to date
+    dry_run
+        only report which stages would run. A stage downstream of one that would run
+        is reported as "pending", since its inputs are not known yet
+    state_file_path
+        the file recording the hashes of the last successful runs
+    trace_file_path
+        passed to every stage with --trace, if given
+
+    Returns
+    -------
+        dict of stage name to "skipped", "ran", "failed", "not run" (after an upstream
+        failure), or with dry_run, "up to date", "would run" or "pending"
+    """
+    stages = pipeline_stages(url)
+    stages = selected_stages(stages, targets or [stage.name for stage in stages])
+    extra_args = [f"--trace={trace_file_path}"] if trace_file_path else []
+    state = read_state(state_file_path)
+    hasher = FileHasher(state["file_hashes"])
+    statuses = {}
+
+    def process(stage):
+        # --trace does not change what a stage writes, so it is left out of the key
+        key = stage_key(stage, hasher)
+        if stage.name not in force and up_to_date(stage, key, state, hasher):
+            return "up to date" if dry_run else "skipped", None
+        if dry_run:
+            return "would run", None
+        with print_lock:
+            print(f"[{stage.name}] running pipeline.py {' '.join(stage.command)}", flush=True)
+        start = time.perf_counter()
+        if run_command(stage, extra_args) != 0:
+            return "failed", None
+        # hash the inputs again: the key must describe what the stage actually read
+        record = {"key": stage_key(stage, hasher),
+                  "outputs": {path: hasher.hash(path) for path in stage.outputs},
+                  "seconds": round(time.perf_counter() - start, 3)}
+        return "ran", record
+
+    with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+        running = {}
+        while len(statuses) < len(stages):
+            for stage in stages:
+                if stage.name in statuses or stage.name in running.values():
+                    continue
+                needs = [statuses.get(name) for name in stage.needs if name in {s.name for s in stages}]
+                if any(status in ("failed", "not run") for status in needs):
+                    statuses[stage.name] = "not run"
+                elif dry_run and any(status in ("would run", "pending") for status in needs):
+                    statuses[stage.name] = "pending"
+                elif all(status in ("skipped", "ran", "up to date") for status in needs):
+                    running[executor.submit(process, stage)] = stage.name
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                statuses[name], record = future.result()
+                if record is not None:
+                    state["stages"][name] = record
+                    write_state(state, state_file_path, hasher)
+                with print_lock:
+                    print(f"[{name}] {statuses[name]}", flush=True)
+
+    if not dry_run:
+        write_state(state, state_file_path, hasher)
+    return statuses
+
+
+def cli(argv=None):
+    """
+    Runs the script with command line arguments (sys.argv[1:] if argv is None).
+    """
+    opt = docopt(__doc__, argv=argv)
+    force = opt["--force"].split(",") if opt["--force"] else []
+    statuses = run(opt["<stages>"] or None, opt["--url"], int(opt["--n_jobs"]), force, opt["--dry_run"], opt["--state"],
+                   opt["--trace"])
+    if any(status in ("failed", "not run") for status in statuses.values()):
+        sys.exit(1)
+
+
+# script entry point
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,110 @@
+"""This script scores a file of runners with a saved finish-time model artifact
+(written by linear_model.py with --model_out). The runners are read and scored in
+chunks, so files of any size can be scored in bounded memory. Only numpy and pandas
+are needed; no training code or scikit-learn objects are loaded, and only the
+polynomial and one-hot columns the model selected are computed (see predictor.py).
+
+Usage: score.py <model_file_path> <runners_file_path> <predictions_file_path> [--chunksize=<chunksize>]
+
+Arguments:
+<model_file_path>          File path of the saved model artifact (.json)
+<runners_file_path>        File path of the runners to score (.csv, or .parquet file or directory of part files)
+<predictions_file_path>    File path to save the predictions (.csv)
+
+Options:
+--chunksize=<chunksize>    Number of runners scored at a time [default: 50000]
+"""
+from docopt import docopt
+
+import pandas as pd
+
+from data_store import dataset_files
+from predictor import CompiledPredictor
+
+
+def main(model_file_path, runners_file_path, predictions_file_path, chunksize=50000):
+    """
+    Entry point for script. Loads the model artifact and writes predicted finish
+    times for every runner in runners_file_path.
+
+    Arguments:
+    ----------
+    model_file_path
+        - file path of the saved model artifact
+    runners_file_path
+        - file path of the runners to score. Needs the model's feature columns
+        (declarwt, age, winodds, stake, distance, country, dataset); an optional
+        first index column is carried over to the output
+    predictions_file_path
+        - file path where the predictions .csv will be saved
+    chunksize
+        - number of runners scored at a time
+
+    Returns
+    -------
+        None, but saves a table to the specified file path
+    """
+    predictor = CompiledPredictor.from_file(model_file_path)
+    columns = predictor.numeric_features + predictor.categorical_features
+
+    n_scored = 0
+    for i, chunk in enumerate(read_chunks(runners_file_path, columns, chunksize)):
+        predictions = pd.DataFrame({"Predicted finish time": predictor.predict(chunk)}, index=chunk.index)
+        predictions.to_csv(predictions_file_path, mode="w" if i == 0 else "a", header=(i == 0))
+        n_scored += len(chunk)
+
+    print(f"scored {n_scored} runners to {predictions_file_path}\n")
+
+
+def read_chunks(runners_file_path, columns, chunksize):
+    """
+    Yields the model's feature columns of a runners file, chunksize rows at a time.
+
+    Arguments:
+    ----------
+    runners_file_path
+        - file path of a .csv or .parquet file, or of a .parquet directory of part files
+        (as incremental wrangling writes), read part by part
+    columns
+        (list of str) - columns to read
+    chunksize
+        (int) - rows per chunk
+
+    Returns
+    -------
+        generator of Pandas DataFrames
+    """
+    if runners_file_path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        start = 0
+        for path in dataset_files(runners_file_path):
+            parquet_file = pq.ParquetFile(path)
+            # read the stored index along with the features, so it carries over to the output
+            metadata = parquet_file.schema_arrow.pandas_metadata or {}
+            index_columns = [c for c in metadata.get("index_columns", []) if isinstance(c, str)]
+            for batch in parquet_file.iter_batches(batch_size=chunksize, columns=columns + index_columns):
+                chunk = batch.to_pandas()
+                if not index_columns:
+                    chunk.index += start
+                start += len(chunk)
+                yield chunk
+    else:
+        # carry over the unnamed index column written by to_csv, if there is one
+        has_index = pd.read_csv(runners_file_path, nrows=0).columns[0].startswith("Unnamed")
+        for chunk in pd.read_csv(runners_file_path, chunksize=chunksize, index_col=0 if has_index else None,
+                                 usecols=lambda c: c in columns or c.startswith("Unnamed: 0")):
+            yield chunk
+
+
+def cli(argv=None):
+    """
+    Runs the script with command line arguments (sys.argv[1:] if argv is None).
+    """
+    opt = docopt(__doc__, argv=argv)
+    main(opt["<model_file_path>"], opt["<runners_file_path>"], opt["<predictions_file_path>"], int(opt["--chunksize"]))
+
+
+# script entry point
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,112 @@
+"""This script serves finish-time predictions for single races over local HTTP,
+using a compiled predictor built from a saved model artifact (written by
+linear_model.py with --model_out).
+
+POST /predict with a JSON body {"runners": [{"declarwt": 1100, "age": 3, ...}, ...]}
+returns {"predictions": [...]} with one predicted finish time (seconds) per runner.
+
+Usage: serve.py <model_file_path> [--host=<host>] [--port=<port>]
+
+Arguments:
+<model_file_path>    File path of the saved model artifact (.json)
+
+Options:
+--host=<host>        Address to listen on [default: 127.0.0.1]
+--port=<port>        Port to listen on [default: 8000]
+"""
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from docopt import docopt
+
+from predictor import CompiledPredictor
+
+
+def make_server(predictor, host="127.0.0.1", port=8000):
+    """
+    Builds an HTTP server answering POST /predict with the given predictor.
+
+    Arguments:
+    ----------
+    predictor
+        (CompiledPredictor) - predictor to serve
+    host
+        - address to listen on
+    port
+        (int) - port to listen on; 0 picks a free port
+
+    Returns
+    -------
+    http.server.ThreadingHTTPServer (call serve_forever() to start it)
+    """
+
+    class PredictHandler(BaseHTTPRequestHandler):
+        # keep-alive, so a client scoring many races reuses one connection
+        protocol_version = "HTTP/1.1"
+        # headers and body go out in separate writes; without TCP_NODELAY the body
+        # waits on the client's delayed ACK (~40 ms)
+        disable_nagle_algorithm = True
+
+        def do_POST(self):
+            if self.path != "/predict":
+                return self._reply(404, {"error": f"unknown path {self.path}"})
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                predictions = predictor.predict_records(body["runners"])
+            except (ValueError, KeyError, TypeError) as e:
+                return self._reply(400, {"error": f"bad request: {e!r}"})
+            self._reply(200, {"predictions": predictions.tolist()})
+
+        def _reply(self, status, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # per-request logging costs more than scoring a race
+            pass
+
+    return ThreadingHTTPServer((host, port), PredictHandler)
+
+
+def main(model_file_path, host="127.0.0.1", port=8000):
+    """
+    Entry point for script. Loads the model artifact and serves predictions until interrupted.
+
+    Arguments:
+    ----------
+    model_file_path
+        - file path of the saved model artifact
+    host
+        - address to listen on
+    port
+        (int) - port to listen on
+
+    Returns
+    -------
+        None
+    """
+    server = make_server(CompiledPredictor.from_file(model_file_path), host, port)
+    print(f"serving predictions on http://{host}:{server.server_port}/predict\n")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def cli(argv=None):
+    """
+    Runs the script with command line arguments (sys.argv[1:] if argv is None).
+    """
+    opt = docopt(__doc__, argv=argv)
+    main(opt["<model_file_path>"], opt["--host"], int(opt["--port"]))
+
+
+# script entry point
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,172 @@
+"""Out-of-core training of the regularized finish-time models from accumulated normal equations.
+
+linear_model.py normally builds the whole preprocessed training matrix before
+fitting, and the degree-5 expansion of a long history is far larger than the
+wrangled data. With --chunksize it uses this module instead for the ridge, lasso
+and elastic net models of regularized.py. It streams the model columns of the
+wrangled data set and expands each chunk with model_artifact.design_matrix(), so at
+most one chunk of the design matrix is held at a time:
+
+1. one pass fits the preprocessing: imputer means, standardization (if asked for)
+   and one-hot categories, as preprocessing.fit_preprocessor() would on all rows
+2. one pass expands each chunk and accumulates X'X and X'y (gram.GramAccumulator)
+
+The regularization path is then solved from those statistics, as regularized.py
+solves it for an in-memory matrix.
+
+RFE and linear regression are not trained out of core. sklearn's RFE ranks the
+features by refitting LinearRegression on the design matrix, and on the collinear,
+badly scaled degree-5 columns no elimination on X'X reproduces its ranking.
+"""
+
+import numpy as np
+from sklearn.preprocessing import PolynomialFeatures
+
+from data_store import MODEL_COLUMNS, read_dataset_chunks
+from finishtime import split_target
+from gram import GramAccumulator
+from instrument import stage
+from model_artifact import design_matrix
+from preprocessing import (CATEGORICAL_FEATURES, CATEGORICAL_FILL_VALUE, DEFAULT_DEGREE, NUMERIC_FEATURES,
+                           check_features)
+from regularized import statistics_path
+
+DEFAULT_CHUNKSIZE = 50000
+
+
+def model_chunks(filepath, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Yields the features and finish times in seconds of a wrangled data set, chunksize
+    rows at a time, without the rows finishtime.split_target() drops.
+    """
+    for chunk in read_dataset_chunks(filepath, MODEL_COLUMNS, chunksize):
+        X, y = split_target(chunk)
+        if len(y):
+            yield check_features(X), y.to_numpy()
+
+
+def feature_parameters(filepath, chunksize=DEFAULT_CHUNKSIZE, degree=DEFAULT_DEGREE, standardize=False):
+    """
+    Fits the preprocessing of preprocessing.build_preprocessor() in one pass over a
+    wrangled data set.
+
+    Arguments:
+    ----------
+    filepath
+        (str) - a .parquet or .csv file in the same format as data/data_train.parquet
+    chunksize
+        (int) - rows read at a time
+    degree
+        (int) - degree of the polynomial expansion of the numeric features
+    standardize
+        (bool) - standardize the numeric features before the polynomial expansion
+
+    Returns:
+    --------
+    parameters, n_rows
+        (dict, int) - the preprocessing in the form of model_artifact.pipeline_parameters(),
+        and the number of training rows
+    """
+    n_numeric = len(NUMERIC_FEATURES)
+    count, mean, m2 = np.zeros(n_numeric), np.zeros(n_numeric), np.zeros(n_numeric)
+    categories = [set() for _ in CATEGORICAL_FEATURES]
+    n_rows = 0
+
+    with stage("feature_parameters", degree=degree, standardize=standardize) as current:
+        for X, y in model_chunks(filepath, chunksize):
+            values = X[NUMERIC_FEATURES].to_numpy(dtype="float64")
+            chunk_count = (~np.isnan(values)).sum(axis=0)
+            chunk_mean = np.divide(np.nansum(values, axis=0), chunk_count, out=np.zeros(n_numeric),
+                                   where=chunk_count > 0)
+            chunk_m2 = np.nansum((values - chunk_mean) ** 2, axis=0)
+
+            # merge the present values' counts, means and squared deviations
+            total = count + chunk_count
+            delta = chunk_mean - mean
+            share = np.divide(chunk_count, total, out=np.zeros(n_numeric), where=total > 0)
+            m2 = m2 + chunk_m2 + delta ** 2 * count * share
+            mean = mean + delta * share
+            count = total
+
+            for feature, seen in zip(CATEGORICAL_FEATURES, categories):
+                column = X[feature].astype(object)
+                seen.update(column.dropna().unique())
+                if column.isna().any():
+                    seen.add(CATEGORICAL_FILL_VALUE)
+            n_rows += len(y)
+        current.rows_in = n_rows
+
+    assert n_rows > 0, "No training rows with a finish time"
+    assert (count > 0).all(), "Every numeric feature needs at least one value"
+
+    # imputed values sit at the mean, so only present values deviate from it (as in StandardScaler)
+    scale = np.sqrt(m2 / n_rows)
+    scale[scale == 0] = 1.0
+    powers = PolynomialFeatures(degree=degree).fit(np.zeros((1, n_numeric))).powers_
+
+    parameters = {
+        "numeric_features": list(NUMERIC_FEATURES),
+        "numeric_means": mean.tolist(),
+        "numeric_center": mean.tolist() if standardize else [0.0] * n_numeric,
+        "numeric_scale": scale.tolist() if standardize else [1.0] * n_numeric,
+        "powers": powers.tolist(),
+        "categorical_features": list(CATEGORICAL_FEATURES),
+        "categorical_fill_value": CATEGORICAL_FILL_VALUE,
+        "categories": [sorted(seen) for seen in categories],
+    }
+    return parameters, n_rows
+
+
+def n_design_columns(parameters):
+    return len(parameters["powers"]) + sum(len(c) for c in parameters["categories"])
+
+
+def accumulate_gram(filepath, parameters, n_rows, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Expands a wrangled data set chunk by chunk and accumulates its Gram statistics.
+
+    Returns:
+    --------
+    gram.GramAccumulator
+    """
+    accumulator = GramAccumulator(n_design_columns(parameters))
+
+    with stage("accumulate_gram", rows_in=n_rows):
+        for X, y in model_chunks(filepath, chunksize):
+            accumulator.update(design_matrix(parameters, X), y)
+    return accumulator
+
+
+def stream_regularized_fit(filepath, alpha, l1_ratio, chunksize=DEFAULT_CHUNKSIZE, degree=DEFAULT_DEGREE,
+                           standardize=False):
+    """
+    Fits a ridge, lasso or elastic net model (see regularized.py) out of core: the
+    preprocessing and the model, from statistics accumulated over chunks of the data set.
+
+    Arguments:
+    ----------
+    filepath
+        (str) - the wrangled training data set
+    alpha, l1_ratio
+        (float, float) - penalty and its share on the l1 norm (see regularized.model_l1_ratio())
+    chunksize
+        (int) - rows read at a time
+    degree
+        (int) - degree of the polynomial expansion of the numeric features
+    standardize
+        (bool) - standardize the numeric features before the polynomial expansion
+
+    Returns:
+    --------
+    parameters, support, coef, intercept
+        the preprocessing (see feature_parameters()), the mask of the columns with
+        nonzero coefficients, and the coefficients of those columns and intercept,
+        ready for model_artifact.save_artifact()
+    """
+    parameters, n_rows = feature_parameters(filepath, chunksize, degree, standardize)
+    accumulator = accumulate_gram(filepath, parameters, n_rows, chunksize)
+
+    with stage("fit", rows_in=n_rows, alpha=alpha, l1_ratio=l1_ratio):
+        coef = statistics_path(*accumulator.statistics(), n_rows, np.array([alpha]), l1_ratio)[0]
+        support = coef != 0
+    return parameters, support, coef[support], accumulator.y_mean - coef @ accumulator.X_mean
@@ -6,26 +6,52 @@
 
 """This script imports raw .csv files for horse-racing data in Hong Kong from user-defined file-path,
 performs pre-preprocessing, merges the files together, and writes them to a user-specified location 
-on the local machine as data_train.csv and data_test.csv. This script takes the filepath where the raw
-data is saved and the location where the user would like the compiled data to be written to locally.
+on the local machine as data_train and data_test (.csv and/or typed .parquet). This script takes the
+filepath where the raw data is saved and the location where the user would like the compiled data to be
+written to locally. With --chunksize, results and barrier trials are streamed through the merge in
+chunks, so memory stays bounded however many seasons of results there are. With --incremental, only
+results and barrier trials dated after the last run are merged and appended to the existing data.
+Each row's train/test assignment is decided by a hash of its horse, date, race number and dataset,
+so it is the same in every mode and never changes once made.
 
-Usage: wrangle_data.py <file_path_in> <file_path_out>
+Usage: wrangle_data.py <file_path_in> <file_path_out> [--formats=<formats>] [--chunksize=<chunksize>] [--incremental] [--trace=<trace_file_path>] [--profile=<profile_dir>]
 
 Arguments:
 <file_path_in>   Path where the raw data exists.
 <file_path_out>  Path where the compiled data is to be written to locally.
+
+Options:
+--formats=<formats>      Comma separated output formats, "csv" and/or "parquet" [default: csv,parquet]
+--chunksize=<chunksize>  Stream results.csv and barrier.csv this many rows at a time instead of loading
+                         every table in memory. Peak memory is about the horse_info and comments
+                         lookups plus a few chunks.
+--incremental            Append the race days newer than those already in <file_path_out> (streamed,
+                         with --chunksize or 100000 rows at a time)
+--trace=<trace_file_path>  Append the time, CPU time, peak memory and rows of each stage to this
+                         JSON lines file (see instrument.py)
+--profile=<profile_dir>  Write a cProfile profile of each stage to this directory
 """
 
+import json
 import os
 import numpy as np
 import pandas as pd
 from docopt import docopt
-from sklearn.model_selection import train_test_split
 
-opt = docopt(__doc__)
+from data_store import DatasetAppender, dataset_columns, find_dataset, read_dataset, write_dataset
+from instrument import configure, stage
+from raw_schema import raw_dtypes, read_raw
+
+# share of rows in the test set
+TEST_SIZE = 0.2
+# comments are matched to results on these columns
+COMMENT_KEYS = ["horseno", "date", "raceno", "plc"]
+# last ingested date per dataset and number of rows written, kept next to the wrangled data
+INGEST_STATE_NAME = ".ingest_state.json"
+DEFAULT_CHUNKSIZE = 100000
 
 
-def main(file_path_in, file_path_out):
+def main(file_path_in, file_path_out, formats=("csv", "parquet"), chunksize=None, incremental=False):
     """
     entry point for script. take in raw data file_path and output file_path from commandline,
      and warngles data for downstream use.
@@ -40,20 +66,34 @@ def main(file_path_in, file_path_out):
             - comments.csv
     file_path_out
         - the desired filepath to put the wrangled data into.
+    formats
+        - the output formats, any of "csv" and "parquet".
+    chunksize
+        - if given, stream results and barrier trials through the merge this many rows at
+        a time (see stream_wrangle()), otherwise load every table in memory.
+    incremental
+        - only merge and append the rows dated after those already in file_path_out.
 
     Returns
     -------
         None if executed successfully, otherwise raises Exception.
     """
+    if chunksize is not None or incremental:
+        stream_wrangle(file_path_in, file_path_out, formats, chunksize or DEFAULT_CHUNKSIZE, incremental)
+        print(f"successfully written data to {file_path_out}!\n")
+        return
+
     horse_info, results, comments, trackwork, barrier = import_files(file_path_in)
     complete_dataset = merge_results(horse_info, results, comments, trackwork, barrier)
-    split_and_write_data(complete_dataset, file_path_out)
+    split_and_write_data(complete_dataset, file_path_out, formats)
+    write_ingest_state(file_path_out, ingest_state(complete_dataset))
     print(f"successfully written data to {file_path_out}!\n")
 
 
 def import_files(filepath):
     """
-    imports the relevant csvs from the filepath specified.
+    imports the relevant csvs from the filepath specified, reading only the columns and
+    dtypes declared in raw_schema.py.
     Parameters
     ----------
     filepath
@@ -70,11 +110,13 @@ def import_files(filepath):
 
     """
     print("==========\nstarting import...\n")
-    horse_info = pd.read_csv(f"{filepath}/horse_info.csv", index_col=0)
-    results = pd.read_csv(f"{filepath}/results.csv", index_col=0)
-    comments = pd.read_csv(f"{filepath}/comments.csv", index_col=0)
-    trackwork = pd.read_csv(f"{filepath}/trackwork.csv", index_col=0)
-    barrier = pd.read_csv(f"{filepath}/barrier.csv", index_col=0)
+    with stage("import_files") as current:
+        horse_info = read_raw(filepath, "horse_info")
+        results = read_raw(filepath, "results")
+        comments = read_raw(filepath, "comments")
+        trackwork = read_raw(filepath, "trackwork")
+        barrier = read_raw(filepath, "barrier")
+        current.rows_out = len(horse_info) + len(results) + len(comments) + len(trackwork) + len(barrier)
     print("==========\nsuccessfully imported CSV data!\n")
     return horse_info, results, comments, trackwork, barrier
 
@@ -101,57 +143,290 @@ def merge_results(horse_info, results, comments, trackwork, barrier):
 
     """
     print("==========\nstarting merge...\n")
-    # Merge comments onto results
+    with stage("merge_results", rows_in=len(results) + len(barrier)) as current:
+        results_comments = merge_comments(results, comments)
+        barrier = prepare_barrier(barrier)
+        # Merge barrier onto results_comments
+        barrier_binded = pd.concat([results_comments, barrier], axis = 0, ignore_index=False, sort=False)
+        final_data = merge_horse_info(barrier_binded, horse_info)
+        current.rows_out = len(final_data)
+    print("==========\ncompleted merge!\n")
+
+    return final_data
+
+
+def merge_comments(results, comments):
+    """
+    labels race results and left-merges the race comments onto them.
+    """
     results['dataset'] = 'results'
-    results_comments = pd.merge(results, comments, how="left", on=["horseno", "date", "raceno", "plc"])
+    return pd.merge(results, comments, how="left", on=COMMENT_KEYS)
+
+
+def prepare_barrier(barrier):
+    """
+    labels barrier trial results and renames their columns to match race results.
+    """
     # Rename barrier time which is the same as finish time in results
     barrier.rename(columns={'time': 'finishtime'}, inplace=True)
     barrier['dataset'] = 'barrier'
-    # Merge barrier onto results_comments
-    barrier_binded = pd.concat([results_comments, barrier], axis = 0, ignore_index=False, sort=False)
+    return barrier
+
+
+def merge_horse_info(data, horse_info):
+    """
+    left-merges horse_info onto results and/or barrier trials, then drops the Chinese
+    and repeated columns and parses dates. Categoricals from the raw tables are turned
+    back into text; the stored dtypes are decided by data_store.apply_dtypes().
+    """
     # Merge horse_info onto data frame
-    merged_data = pd.merge(barrier_binded, horse_info, how='left', on=['horse'])
+    merged_data = pd.merge(data, horse_info, how='left', on=['horse'])
     # Removed the columns with _ch as this indicated Chinese.
     final_data = merged_data[merged_data.columns[~merged_data.columns.str.contains('.*_ch')]]
     # Drop repeated columns and unnessary indexes
     final_data = final_data.drop(['trainer_y'], axis=1)
     final_data['date'] = pd.to_datetime(final_data['date'])
-    print("==========\ncompleted merge!\n")
-
+    final_data = final_data.astype({column: object for column in final_data.select_dtypes("category").columns})
     return final_data
 
-def split_and_write_data(final_data, filepath):
+
+def stream_wrangle(file_path_in, file_path_out, formats=("csv", "parquet"), chunksize=DEFAULT_CHUNKSIZE,
+                   incremental=False):
+    """
+    wrangles the raw data without loading results or barrier trials in memory: both are
+    read chunksize rows at a time, merged against in-memory comments and horse_info
+    lookups, split into train and test rows (see is_test_row()) and appended to the
+    output files. Rows are written in input order, results first, with the index the
+    in-memory merge would give them.
+
+    With incremental=True, only results and barrier trials dated on or after the last
+    ingested date of their dataset are merged, without the rows of that date an earlier
+    ingest already merged (by their key, see row_keys()), and they are appended to the
+    existing wrangled data with the following index values (all of them, if there is no
+    wrangled data yet). The raw files are still scanned, but the merge and the writes only
+    cost time for the new rows. The train and test sets then hold the same rows as a full
+    run over the same raw data, but not in the same order or with the same index: each
+    ingest's rows follow those of the earlier ingests.
+    Parameters
+    ----------
+    file_path_in
+        the location of the raw data (see main()); trackwork.csv is not needed.
+    file_path_out
+        the desired filepath to put the wrangled data into.
+    formats
+        the output formats, any of "csv" and "parquet".
+    chunksize
+        the number of raw rows read at a time.
+    incremental
+        whether to append only the new race days to the existing wrangled data.
+
+    Returns
+    -------
+        None
+    """
+    state = read_ingest_state(file_path_out) if incremental else {"last_date": {}, "last_keys": {}, "n_rows": 0}
+    print("==========\nstarting streaming merge...\n")
+    # the lookups are joined against every chunk, so they are loaded whole
+    with stage("import_lookups") as current:
+        horse_info = read_raw(file_path_in, "horse_info")
+        comments = read_raw(file_path_in, "comments")
+        current.rows_out = len(horse_info) + len(comments)
+
+    binded_template, template = merged_templates(comments, horse_info)
+    last_date = dict(state["last_date"])
+    last_keys = {source: set(keys) for source, keys in state.get("last_keys", {}).items()}
+    n_rows = n_new = state["n_rows"]
+    with DatasetAppender(file_path_out, "data_train", template, formats, append=incremental) as train, \
+         DatasetAppender(file_path_out, "data_test", template, formats, append=incremental) as test:
+        for source in ["results", "barrier"]:
+            since = state["last_date"].get(source)
+            ingested = set(last_keys.get(source, ())) if since is not None else set()
+            for chunk in read_raw(file_path_in, source, categorical=False, chunksize=chunksize):
+                if since is not None:
+                    # rows of the last ingested date can arrive with a later drop
+                    chunk = chunk[chunk["date"] >= pd.Timestamp(since)]
+                if len(chunk) == 0:
+                    continue
+
+                with stage("merge_chunk", rows_in=len(chunk), source=source) as current:
+                    if source == "results":
+                        chunk = merge_comments(chunk, comments)
+                    else:
+                        chunk = prepare_barrier(chunk)
+                    # as in the in-memory concat, rows get the columns of both sources
+                    chunk = chunk.reindex(columns=binded_template.columns)
+                    chunk = chunk.astype({column: dtype for column, dtype in binded_template.dtypes.items()
+                                          if chunk[column].dtype != dtype})
+                    chunk = merge_horse_info(chunk, horse_info)
+                    keys = row_keys(chunk)
+                    if since is not None:
+                        new = ~(chunk["date"].eq(pd.Timestamp(since)) & keys.isin(ingested)).to_numpy()
+                        chunk, keys = chunk[new], keys[new]
+                    current.rows_out = len(chunk)
+                if len(chunk) == 0:
+                    continue
+
+                # the keys of the rows on the last date, to recognise them in the next ingest
+                chunk_last = chunk["date"].max()
+                if source not in last_date or chunk_last > pd.Timestamp(last_date[source]):
+                    last_date[source], last_keys[source] = chunk_last.isoformat(), set()
+                if chunk_last == pd.Timestamp(last_date[source]):
+                    last_keys[source].update(keys[(chunk["date"] == chunk_last).to_numpy()])
+                chunk.index = pd.RangeIndex(n_rows, n_rows + len(chunk))
+                n_rows += len(chunk)
+
+                with stage("write_chunk", rows_in=len(chunk), source=source):
+                    is_test = is_test_row(chunk)
+                    train.append(chunk[~is_test])
+                    test.append(chunk[is_test])
+
+    write_ingest_state(file_path_out, {"last_date": last_date,
+                                       "last_keys": {source: sorted(keys) for source, keys in last_keys.items()},
+                                       "n_rows": n_rows})
+    print(f"==========\ncompleted streaming merge of {n_rows - n_new} rows!\n")
+
+
+def row_keys(data):
+    """
+    returns the natural key of each row of merged results and/or barrier trials, its
+    horse, date, raceno and dataset, as a string such as "A001|2019-07-14|3|results".
     """
-    splits the data into a train and test sets with a 8/2 split, then writes them to the specified file path.
+    # results rows keep their own horse name as horse_x when the comments also have one
+    horse = data["horse"]
+    if "horse_x" in data.columns:
+        horse = horse.fillna(data["horse_x"])
+    return (horse.astype(str) + "|" + pd.to_datetime(data["date"]).dt.strftime("%Y-%m-%d") + "|" +
+            data["raceno"].astype("Int64").astype(str) + "|" + data["dataset"].astype(str))
+
+
+def is_test_row(data):
+    """
+    assigns rows to the test set by a hash of their natural key (horse, date, raceno and
+    dataset): a row is in the test set if the hash falls in the lowest TEST_SIZE of its
+    range. The assignment depends on nothing but the row, so it is stable across runs,
+    chunk sizes and incremental ingests.
+    Parameters
+    ----------
+    data
+        merged results and/or barrier trials
+
+    Returns
+    -------
+        np.array of bool, True for test rows
+    """
+    hashes = pd.util.hash_array(row_keys(data).to_numpy(dtype=object))
+    return hashes < np.uint64(TEST_SIZE * 2**64)
+
+
+def ingest_state(data):
+    """
+    returns the ingest state of a wrangled data set: the last date of each dataset
+    (results, barrier), the keys of the rows on that date (see row_keys()) and the
+    number of rows.
+    """
+    dates, datasets = pd.to_datetime(data["date"]), data["dataset"].astype(str)
+    last_date = dates.groupby(datasets).max().dropna()
+    keys = row_keys(data)
+    return {"last_date": {dataset: date.isoformat() for dataset, date in last_date.items()},
+            "last_keys": {dataset: sorted(keys[((datasets == dataset) & (dates == date)).to_numpy()])
+                          for dataset, date in last_date.items()},
+            "n_rows": len(data)}
+
+
+def write_ingest_state(filepath, state):
+    with open(f"{filepath}/{INGEST_STATE_NAME}", "w") as f:
+        json.dump(state, f, indent=2)
+
+
+def read_ingest_state(filepath):
+    """
+    returns the ingest state saved next to the wrangled data in filepath, or derives it from
+    the wrangled data if it was written before states (or their last keys) were saved. If
+    there is no wrangled data yet, the state is empty, so an incremental ingest merges every row.
+    """
+    if os.path.exists(f"{filepath}/{INGEST_STATE_NAME}"):
+        with open(f"{filepath}/{INGEST_STATE_NAME}") as f:
+            state = json.load(f)
+        if "last_keys" in state:
+            return state
+
+    paths = [find_dataset(filepath, name) for name in ["data_train", "data_test"]]
+    paths = [path for path in paths if os.path.exists(path)]
+    if not paths:
+        return {"last_date": {}, "last_keys": {}, "n_rows": 0}
+    # results rows keep their horse name as horse_x when the raw comments have one too
+    key_columns = ["horse", "horse_x", "date", "raceno", "dataset"]
+    return ingest_state(pd.concat([read_dataset(path, [c for c in key_columns if c in dataset_columns(path)])
+                                   for path in paths]))
+
+
+def merged_templates(comments, horse_info):
+    """
+    returns empty data frames with the columns and dtypes the in-memory merge gives
+    results and barrier trials once concatenated, and once horse_info is merged on.
+    Numeric columns from the comments and horse_info lookups are float64, since rows
+    without a match are missing them.
+    """
+    def empty(dtypes):
+        return pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in dtypes.items()})
+
+    def widen_lookup_columns(merged, left):
+        lookup_columns = [column for column in merged.columns
+                          if column not in left.columns and not column.endswith("_x")]
+        return merged.astype({column: "float64" for column in lookup_columns
+                              if pd.api.types.is_numeric_dtype(merged[column].dtype)})
+
+    results = empty(raw_dtypes("results", categorical=False))
+    barrier = empty(raw_dtypes("barrier", categorical=False))
+    results_comments = widen_lookup_columns(merge_comments(results.copy(), comments.iloc[:0]), results)
+    barrier_binded = pd.concat([results_comments, prepare_barrier(barrier)], axis=0, ignore_index=False, sort=False)
+    merged = widen_lookup_columns(merge_horse_info(barrier_binded, horse_info.iloc[:0]), barrier_binded)
+    return barrier_binded, merged
+
+def split_and_write_data(final_data, filepath, formats=("csv", "parquet")):
+    """
+    splits the data into a train and test sets with a 8/2 split (see is_test_row()), then writes them to the specified file path.
     Parameters
     ----------
     final_data
         the dataframe containing the merged data
     filepath
         the user-specified filepath
+    formats
+        the output formats, any of "csv" and "parquet"
 
     Returns
     -------
         None
     """
     print("==========\nstarting to split data into test and train sets\n")
-    # shuffle and split the data.
-    data_train, data_test = train_test_split(final_data,
-                                             random_state=1,
-                                             test_size=0.2,
-                                             shuffle=True)
+    with stage("split_data", rows_in=len(final_data)) as current:
+        # split the data by a hash of each row's natural key, as incremental ingests do
+        is_test = is_test_row(final_data)
+        data_train, data_test = final_data[~is_test], final_data[is_test]
+        current.set(rows_train=len(data_train), rows_test=len(data_test))
     print("==========\ndata is split, writing to file\n")
-    data_train.to_csv(f"{filepath}/data_train.csv")
-    data_test.to_csv(f"{filepath}/data_test.csv")
+    with stage("write_data", rows_in=len(final_data), formats=list(formats)):
+        write_dataset(data_train, filepath, "data_train", formats)
+        write_dataset(data_test, filepath, "data_test", formats)
 
-def path_validation():
-    if (os.path.exists(opt["<file_path_in>"])) and (os.path.exists(opt["<file_path_out>"])):
+def path_validation(file_path_in, file_path_out):
+    if (os.path.exists(file_path_in)) and (os.path.exists(file_path_out)):
         pass
     else:
         raise ValueError("File paths do not exist")
 
-path_validation()
+def cli(argv=None):
+    """
+    Runs the script with command line arguments (sys.argv[1:] if argv is None).
+    """
+    opt = docopt(__doc__, argv=argv)
+    path_validation(opt["<file_path_in>"], opt["<file_path_out>"])
+    configure(opt["--trace"], opt["--profile"], script="wrangle_data")
+    with stage("wrangle_data"):
+        main(opt["<file_path_in>"], opt["<file_path_out>"], opt["--formats"].split(","),
+             int(opt["--chunksize"]) if opt["--chunksize"] else None, opt["--incremental"])
 
 # script entry point
 if __name__ == '__main__':
-    main(opt["<file_path_in>"], opt["<file_path_out>"])
+    cli()
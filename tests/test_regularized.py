@@ -0,0 +1,65 @@
+"""Checks the regularization paths of src/regularized.py against sklearn's Ridge,
+Lasso and ElasticNet fitted on the standardized design matrix with an intercept.
+
+Run from the project root with: python -m pytest tests
+"""
+import os
+import sys
+
+import numpy as np
+import pytest
+from sklearn.linear_model import ElasticNet, Lasso, Ridge
+from sklearn.preprocessing import StandardScaler
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from regularized import parse_alphas, regularization_path
+
+ALPHAS = parse_alphas("-3:0:4")
+
+
+@pytest.fixture
+def design():
+    """
+    A design matrix whose columns differ in offset and scale by orders of magnitude,
+    as the polynomial columns do, with correlated columns and a sparse true model.
+    """
+    rng = np.random.default_rng(0)
+    n_rows, n_columns = 500, 12
+    Z = rng.normal(size=(n_rows, n_columns))
+    Z[:, 1] += 0.8 * Z[:, 0]
+    X = Z * np.logspace(-4, 4, n_columns) + np.linspace(-50, 50, n_columns)
+    y = 3.0 + Z[:, :4] @ np.array([2.0, -1.0, 0.5, 1.5]) + rng.normal(scale=0.5, size=n_rows)
+    return X, y
+
+
+def reference_fit(model, X, y):
+    """
+    Fits an sklearn model on the standardized columns of X and returns its coefficients
+    and intercept in the units of X.
+    """
+    scaler = StandardScaler().fit(X)
+    model.fit(scaler.transform(X), y)
+    coef = model.coef_ / scaler.scale_
+    return coef, model.intercept_ - coef @ scaler.mean_
+
+
+def test_ridge_matches_sklearn(design):
+    X, y = design
+    coef_path, intercept_path = regularization_path(X, y, ALPHAS, 0.0)
+    for coef, intercept, alpha in zip(coef_path, intercept_path, ALPHAS):
+        # Ridge penalizes alpha ||w||^2 against the sum of squares, not its mean over rows
+        expected_coef, expected_intercept = reference_fit(Ridge(alpha=alpha * len(y)), X, y)
+        np.testing.assert_allclose(coef, expected_coef, rtol=1e-8, atol=1e-12)
+        np.testing.assert_allclose(intercept, expected_intercept, rtol=1e-8)
+
+
+@pytest.mark.parametrize("l1_ratio", [0.5, 1.0])
+def test_elastic_net_matches_sklearn(design, l1_ratio):
+    X, y = design
+    coef_path, intercept_path = regularization_path(X, y, ALPHAS, l1_ratio)
+    for coef, intercept, alpha in zip(coef_path, intercept_path, ALPHAS):
+        model = Lasso(alpha=alpha, tol=1e-12, max_iter=100000) if l1_ratio == 1.0 else \
+            ElasticNet(alpha=alpha, l1_ratio=l1_ratio, tol=1e-12, max_iter=100000)
+        expected_coef, expected_intercept = reference_fit(model, X, y)
+        np.testing.assert_array_equal(coef != 0, expected_coef != 0)
+        np.testing.assert_allclose(X @ coef + intercept, X @ expected_coef + expected_intercept, rtol=0, atol=1e-4)